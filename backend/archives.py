@@ -0,0 +1,42 @@
+from typing import Iterator, Tuple
+import zipfile
+
+# ZIP-архивы документов из нескольких файлов (листы SVG, PNG) отдаются потоком:
+# каждый файл уходит клиенту сразу после записи, архив целиком в памяти не собирается
+
+# Постоянная дата файлов: одинаковые листы - одинаковые байты архива
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+class ZipSink:
+    """Приёмник для zipfile без seek: записанные байты забираются методом take"""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def iter_zip(files: Iterator[Tuple[str, bytes]], compression: int = zipfile.ZIP_DEFLATED) -> Iterator[bytes]:
+    """ZIP-архив из (имя, содержимое) по частям: файл за файлом, в конце - оглавление"""
+    sink = ZipSink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        for name, data in files:
+            info = zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME)
+            info.compress_type = compression
+            archive.writestr(info, data)
+            yield sink.take()
+    yield sink.take()
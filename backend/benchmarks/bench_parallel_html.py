@@ -0,0 +1,72 @@
+"""
+Бенчмарк: почему листы HTML рендерятся в одном процессе, а пул процессов
+(render_pool) остался только у PNG.
+
+Каждая карточка рендерится один раз на документ, копии - повтор готовой строки,
+поэтому рендер листов почти ничего не стоит. Пул не может быть быстрее того, что
+он делает в родительском процессе и что не параллелится: собрать задачи
+(карточки с разметкой картинок и листы, по 16 листов на задачу), передать их
+через pickle и принять обратно готовые листы. Если одна эта передача не дешевле
+рендера в одном процессе, пул не выигрывает ни при каком числе ядер.
+
+Запуск из каталога backend:
+    python benchmarks/bench_parallel_html.py
+"""
+import os
+import pickle
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from label_generator import PlanImages, fragment_cache, iter_pages_html  # noqa: E402
+from render_plan import build_plan  # noqa: E402
+
+from bench_style_profiles import make_candles  # noqa: E402
+
+# Листов в одной задаче пула
+PAGES_PER_TASK = 16
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def transfer(plan, images, pages_html):
+    """Передача в пул и обратно: задачи по PAGES_PER_TASK листов и готовая разметка этих листов"""
+    for start in range(0, len(plan.pages), PAGES_PER_TASK):
+        chunk = plan.pages[start:start + PAGES_PER_TASK]
+        needed = {key for page in chunk for key, _ in page.slots if key is not None}
+        cards = {key: (plan.cards[key], *images.card(plan.cards[key])[:2]) for key in needed}
+        pickle.loads(pickle.dumps((cards, chunk)))
+        pickle.loads(pickle.dumps(''.join(pages_html[start:start + PAGES_PER_TASK])))
+
+
+def bench(candles):
+    plan = build_plan(candles)
+    images = PlanImages(plan, 'shared')
+    row = {}
+    # Холодный кэш фрагментов - худший случай для одного процесса
+    fragment_cache.clear()
+    pages_html, row['serial'] = timed(lambda: list(iter_pages_html(plan, plan.pages, images)))
+    _, row['transfer'] = timed(lambda: transfer(plan, images, pages_html))
+    return plan, row
+
+
+if __name__ == "__main__":
+    # Прогрев: подбор текста, шрифты и картинки считаются один раз на процесс
+    bench(make_candles(40))
+
+    print(f"{'unique':>7} {'cards':>7} {'pages':>6} {'serial, ms':>11} {'transfer, ms':>13}")
+    for unique, copies in ((300, 10), (1000, 1), (1000, 3), (3000, 1), (10000, 1), (40000, 1)):
+        candles = make_candles(unique)
+        for candle in candles:
+            candle.quantity = copies
+        plan, row = bench(candles)
+        # Свеча даёт этикетку и инструкцию
+        print(f"{unique:>7} {unique * copies * 2:>7} {len(plan.pages):>6} "
+              f"{row['serial'] * 1000:>11.0f} {row['transfer'] * 1000:>13.0f}")
@@ -0,0 +1,136 @@
+"""
+Бенчмарк: профиль оформления print-fast против standard (style_profiles).
+
+Замеряется генерация документа (HTML и PDF) и то, что происходит при печати:
+- HTML печатается через браузер: время headless Chromium --print-to-pdf (спул печати)
+  и растеризация получившегося файла в 300 dpi, как это делает принтер;
+- PDF растеризуется в 300 dpi напрямую.
+Chromium (переменная CHROME или chromium/google-chrome в PATH) и PyMuPDF необязательны:
+без них соответствующие колонки пропускаются.
+
+Запуск из каталога backend:
+    python benchmarks/bench_style_profiles.py
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from label_generator import generate_labels_html  # noqa: E402
+from pdf_generator import iter_labels_pdf  # noqa: E402
+from style_profiles import STYLE_PROFILES  # noqa: E402
+
+try:
+    import pymupdf
+except ImportError:
+    pymupdf = None
+
+RASTER_DPI = 300
+# Растеризуются первые листы: для сравнения профилей этого достаточно
+RASTER_PAGES = 6
+
+
+def make_candles(count):
+    candles = []
+    for i in range(count):
+        candles.append(SimpleNamespace(
+            id=i,
+            sequence_number=i + 1,
+            name=f"СВЕЧА {'ОЧИЩЕНИЯ ' * (i % 4)}{i}",
+            display_name=None,
+            category=SimpleNamespace(name="Ритуальные свечи") if i % 2 else None,
+            tagline="Путь к чистоте" if i % 3 else None,
+            description="Свеча для глубокого очищения ауры и пространства. " * (1 + i % 4),
+            practice="Зажгите свечу в тихом месте. Сосредоточьтесь на намерении. " * (1 + i % 3),
+            ritual_text="Огонь горит - очищает.\nСвет сияет - защищает." if i % 2 else None,
+            brand_name="АРТ-СВЕЧИ",
+            website="art-svechi.ligardi.ru",
+            logo_image=None,
+            qr_image=None,
+            qr_data="https://vk.com/art_svechi",
+            quantity=1,
+            text_fit=None,
+            text_fit_version=None,
+        ))
+    return candles
+
+
+def find_chrome():
+    for name in (os.environ.get("CHROME"), "chromium", "chromium-browser", "google-chrome"):
+        if name and shutil.which(name):
+            return shutil.which(name)
+    return None
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def rasterize(pdf_path):
+    document = pymupdf.open(pdf_path)
+    for page in list(document)[:RASTER_PAGES]:
+        page.get_pixmap(dpi=RASTER_DPI)
+
+
+def print_with_chrome(chrome, html_path, pdf_path):
+    subprocess.run(
+        [chrome, "--headless", "--disable-gpu", "--no-sandbox", "--no-pdf-header-footer",
+         f"--print-to-pdf={pdf_path}", f"file://{html_path}"],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def bench_profile(candles, profile, workdir, chrome):
+    row = {}
+    html, row['html'] = timed(lambda: generate_labels_html(candles, style_profile=profile))
+    pdf, row['pdf'] = timed(lambda: b''.join(iter_labels_pdf(candles, style_profile=profile)))
+
+    html_path = os.path.join(workdir, f"{profile}.html")
+    pdf_path = os.path.join(workdir, f"{profile}.pdf")
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(html)
+    with open(pdf_path, 'wb') as f:
+        f.write(pdf)
+
+    if chrome:
+        spool_path = os.path.join(workdir, f"{profile}.spool.pdf")
+        _, row['spool'] = timed(print_with_chrome, chrome, html_path, spool_path)
+        if pymupdf:
+            _, row['spool_raster'] = timed(rasterize, spool_path)
+    if pymupdf:
+        _, row['pdf_raster'] = timed(rasterize, pdf_path)
+    return row
+
+
+def cell(row, key):
+    return f"{row[key] * 1000:>12.0f}" if key in row else f"{'-':>12}"
+
+
+if __name__ == "__main__":
+    chrome = find_chrome()
+    if not chrome:
+        print("Chromium не найден (CHROME): спул печати HTML не замеряется")
+    if not pymupdf:
+        print("PyMuPDF не установлен: растеризация не замеряется")
+
+    columns = ('html', 'pdf', 'spool', 'spool_raster', 'pdf_raster')
+    print(f"{'cards':>6} {'profile':>11} " + ' '.join(f"{name + ', ms':>12}" for name in columns))
+    with tempfile.TemporaryDirectory() as workdir:
+        # Прогрев: подбор текста, шрифты и стили профилей считаются один раз на процесс
+        for profile in STYLE_PROFILES:
+            bench_profile(make_candles(9), profile, workdir, chrome)
+
+        for count in (90, 450, 900):
+            candles = make_candles(count)
+            for profile in STYLE_PROFILES:
+                row = bench_profile(candles, profile, workdir, chrome)
+                print(f"{count:>6} {profile:>11} " + ' '.join(cell(row, name) for name in columns))
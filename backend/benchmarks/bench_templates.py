@@ -0,0 +1,198 @@
+"""
+Бенчмарк: рендер карточек через предкомпилированные шаблоны (label_templates)
+против прежнего кода на вложенных f-строках.
+
+Запуск из каталога backend:
+    python benchmarks/bench_templates.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from label_generator import label_card_html, instruction_card_html  # noqa: E402
+from render_plan import label_card, instruction_card  # noqa: E402
+
+LOGO = '<img src="data:image/png;base64,AAAA" alt="АРТ-СВЕЧИ">'
+QR = '<img src="data:image/png;base64,BBBB" alt="QR код">'
+
+
+def make_candles(count):
+    candles = []
+    for i in range(count):
+        candles.append(SimpleNamespace(
+            id=i,
+            sequence_number=i + 1,
+            name=f"СВЕЧА {'ОЧИЩЕНИЯ ' * (i % 4)}{i}",
+            display_name=None,
+            category=SimpleNamespace(name="Ритуальные свечи") if i % 2 else None,
+            tagline="Путь к чистоте" if i % 3 else None,
+            description="Свеча для глубокого очищения ауры и пространства. " * (1 + i % 8),
+            practice="Зажгите свечу в тихом месте. Сосредоточьтесь на намерении. " * (1 + i % 6),
+            ritual_text="Огонь горит - очищает.\nСвет сияет - защищает." if i % 2 else None,
+            brand_name="АРТ-СВЕЧИ",
+            website="art-svechi.ligardi.ru",
+            text_fit=None,
+            text_fit_version=None,
+        ))
+    return candles
+
+
+# Прежний подбор классов по длине текста (заменён метриками шрифтов в text_fitting)
+def get_text_size_class(text, thresholds):
+    text_len = len(text) if text else 0
+    if text_len == 0:
+        return 'text-empty'
+    elif text_len < thresholds.get('short', 50):
+        return 'text-short'
+    elif text_len < thresholds.get('medium', 150):
+        return 'text-medium'
+    elif text_len < thresholds.get('long', 300):
+        return 'text-long'
+    elif text_len < thresholds.get('very_long', 500):
+        return 'text-very-long'
+    else:
+        return 'text-extra-long'
+
+
+# Прежняя реализация карточек (вложенные f-строки внутри цикла страниц)
+def legacy_label_card(candle, logo_html, qr_html):
+    category_name = candle.category.name if candle.category else "Магическая свеча"
+    name_len = len(candle.name)
+    if name_len > 30:
+        name_class = "label-name very-long-title"
+    elif name_len > 15:
+        name_class = "label-name long-title"
+    else:
+        name_class = "label-name"
+    desc_size_class = get_text_size_class(candle.description, {'short': 100, 'medium': 200, 'long': 300, 'very_long': 400})
+    return f"""
+        <div class="label">
+            <div class="label-header">
+                <div class="label-category">{category_name}</div>
+                <div class="{name_class}">{candle.sequence_number or ''}. {candle.display_name or candle.name}</div>
+                {f'<div class="label-tagline">{candle.tagline}</div>' if candle.tagline else ''}
+            </div>
+            <div class="label-logo-area">
+                {logo_html}
+            </div>
+            <div class="label-description {desc_size_class}">
+                {candle.description}
+            </div>
+            <div class="divider"></div>
+            <div class="label-footer">
+                <div class="label-brand">
+                    <div class="label-brand-name">{candle.brand_name}</div>
+                    <div class="label-website">{candle.website}</div>
+                </div>
+                <div class="label-qr-row">
+                    <div class="label-qr">
+                        {qr_html}
+                    </div>
+                    <div class="label-qr-text">
+                        Группа<br>ВК
+                    </div>
+                </div>
+            </div>
+        </div>
+"""
+
+
+def legacy_instruction_card(candle, logo_html, qr_html):
+    title_len = len(candle.name)
+    if title_len > 30:
+        title_class = "very-long-title"
+    elif title_len > 20:
+        title_class = "long-title"
+    else:
+        title_class = ""
+    desc_class = get_text_size_class(candle.description, {'short': 100, 'medium': 200, 'long': 300, 'very_long': 400})
+    practice_class = get_text_size_class(candle.practice or '', {'short': 150, 'medium': 250, 'long': 350, 'very_long': 450})
+    ritual_class = get_text_size_class(candle.ritual_text or '', {'short': 100, 'medium': 200, 'long': 280, 'very_long': 350})
+    return f"""
+        <div class="instruction-card">
+            <div class="instruction-header">
+                <div class="instruction-logo">
+                    {logo_html}
+                </div>
+                <div class="instruction-title">
+                    <h2 class="{title_class}">{candle.display_name or candle.name}</h2>
+                    {f'<div class="instruction-subtitle">{candle.tagline}</div>' if candle.tagline else ''}
+                </div>
+                <div class="instruction-qr">
+                    {qr_html}
+                </div>
+            </div>
+            <div class="instruction-content">
+                {f'''<div class="instruction-section {desc_class}">
+                    <h3>Описание</h3>
+                    <p>{candle.description}</p>
+                </div>''' if candle.description else ''}
+                {f'''<div class="instruction-section {practice_class}">
+                    <h3>Как работать</h3>
+                    <p>{candle.practice}</p>
+                </div>''' if candle.practice else ''}
+                {f'''<div class="instruction-spell {ritual_class}">
+                    <h3>Заговор</h3>
+                    <p>{candle.ritual_text}</p>
+                </div>''' if candle.ritual_text else ''}
+            </div>
+            <div class="instruction-footer">
+                <div class="instruction-brand">{candle.brand_name}</div>
+                <div class="instruction-website">{candle.website}</div>
+            </div>
+        </div>
+"""
+
+
+def legacy_render(candles):
+    # Прежний код наращивал весь документ через +=
+    html = ''
+    for candle in candles:
+        html += legacy_label_card(candle, LOGO, QR)
+    for candle in candles:
+        html += legacy_instruction_card(candle, LOGO, QR)
+    return len(html)
+
+
+def make_cards(candles):
+    # Карточки плана (render_plan) строятся заранее: подбор текста в замер не входит
+    labels = [label_card(candle, 'logo', 'qr') for candle in candles]
+    instructions = [instruction_card(candle, 'logo', 'qr') for candle in candles]
+    return labels, instructions
+
+
+def compiled_render(cards):
+    # Новый код отдаёт документ листами (9 этикеток / 4 инструкции), как в потоке ответа
+    labels, instructions = cards
+    size = 0
+    for i in range(0, len(labels), 9):
+        size += len(''.join(label_card_html(card, LOGO, QR) for card in labels[i:i + 9]))
+    for i in range(0, len(instructions), 4):
+        size += len(''.join(instruction_card_html(card, LOGO, QR) for card in instructions[i:i + 4]))
+    return size
+
+
+def best_of(func, data, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == "__main__":
+    print(f"{'cards':>8} {'legacy, ms':>12} {'compiled, ms':>14} {'speedup':>9}")
+    for count in (100, 1000, 10000):
+        candles = make_candles(count)
+        cards = make_cards(candles)
+        # Классы размеров теперь подбираются по метрикам, поэтому разметка уже не совпадает побайтно
+        assert legacy_render(candles) and compiled_render(cards)
+        legacy = best_of(legacy_render, candles)
+        compiled = best_of(compiled_render, cards)
+        print(f"{count:>8} {legacy * 1000:>12.2f} {compiled * 1000:>14.2f} {legacy / compiled:>8.2f}x")
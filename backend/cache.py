@@ -0,0 +1,77 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Optional
+import sys
+
+
+def byte_size(value: Any) -> int:
+    """
+    Примерный размер значения или ключа в памяти. Строки - по sys.getsizeof:
+    len() считает символы, а кириллица в str занимает 2 байта на символ.
+    Кортежи (в том числе карточки плана) - сумма элементов
+    """
+    if isinstance(value, tuple):
+        return sys.getsizeof(value) + sum(byte_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограничением по суммарному размеру ключей и значений в байтах.
+    Используется для кэширования картинок, фрагментов и готовых документов.
+    sizeof - размер значения (по умолчанию byte_size), ключи считаются через byte_size
+    """
+
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int] = byte_size):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._sizes: Dict[Hashable, int] = {}
+        self._lock = Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        size = self._sizeof(value) + byte_size(key)
+        with self._lock:
+            if key in self._data:
+                self.current_bytes -= self._sizes.pop(key)
+                del self._data[key]
+            # Значение больше всего бюджета не кэшируем
+            if size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                old_key, _ = self._data.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
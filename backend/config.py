@@ -8,8 +8,30 @@ class Settings(BaseSettings):
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     upload_path: str = "/var/www/labels/uploads"
+    fonts_path: str = "/var/www/labels/fonts"
     frontend_url: str = "http://192.168.0.95:3200"
     port: int = 8201
+    image_cache_max_bytes: int = 32 * 1024 * 1024
+    fragment_cache_max_bytes: int = 64 * 1024 * 1024
+    document_cache_max_bytes: int = 128 * 1024 * 1024
+    render_workers: int = 0  # Процессов для параллельного рендера PNG; 0 - по числу ядер
+    public_base_url: str = ""  # Внешний адрес backend для ссылок из документов; пусто - из запроса
+    job_workers: int = 2  # Сколько фоновых задач генерации выполняется одновременно
+    jobs_path: str = "/var/www/labels/jobs"  # Готовые документы фоновых задач
+    job_retention_hours: int = 72  # Сколько хранить завершённые задачи и их документы
+    preview_cache_max_bytes: int = 64 * 1024 * 1024  # Планы документов, открытых в режиме предпросмотра
+    preview_ttl_minutes: int = 120  # Сколько живёт ссылка на листы предпросмотра
+    raster_dpi: int = 300  # Разрешение листов PNG по умолчанию
+    raster_max_dpi: int = 600  # Наибольшее разрешение листов PNG в запросе
+    raster_card_cache_max_bytes: int = 128 * 1024 * 1024  # Готовые карточки PNG в каждом процессе рендера
+    # Оценка документа (/api/generate-labels/estimate), пока нет выполненных задач того же формата
+    estimate_html_sheet_ms: float = 0.5  # Рендер листа HTML
+    estimate_pdf_sheet_ms: float = 5.0  # Рендер листа PDF
+    estimate_pdf_sheet_bytes: int = 2048  # Размер листа PDF
+    estimate_svg_sheet_ms: float = 3.0  # Рендер листа SVG
+    estimate_svg_sheet_bytes: int = 8192  # Лист SVG в архиве без встроенных шрифтов
+    estimate_png_sheet_ms: float = 300.0  # Рендер листа PNG при raster_dpi (на процесс пула)
+    estimate_png_sheet_bytes: int = 768 * 1024  # Лист PNG при raster_dpi
 
     class Config:
         env_file = ".env"
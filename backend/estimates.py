@@ -0,0 +1,169 @@
+from typing import Dict, Optional
+import math
+import os
+from sqlalchemy.orm import Session
+from models import GenerationJob
+from config import settings
+from generation import LabelDocument
+from image_processing import derivative_candidates
+from label_generator import DEFAULT_IMAGES, PlanImages, image_source_path, plan_html_size
+from qr_codes import qr_data_url
+from render_plan import ImageRef, RenderPlan, check_overflow, plan_card_count
+from svg_generator import font_styles
+import schemas
+
+# Оценка документа без рендера (/api/generate-labels/estimate): листы и предупреждения -
+# из плана и сохранённого подбора текста, размер HTML - по шаблонам плана с картинками
+# нужной длины (файлы не читаются), размер других форматов и время - по выполненным задачам
+
+# Сколько байт помещается в QR код версии 1, 2, ... (уровень коррекции M, байтовый режим)
+QR_CAPACITY = (14, 26, 42, 62, 84, 106, 122, 152, 180, 213, 251, 287, 331, 362, 412, 450, 504, 560, 624, 666)
+
+# По скольким последним выполненным задачам считается скорость рендера
+HISTORY_JOBS = 20
+
+# Пока задач формата не было: миллисекунд на лист и байт на лист (размер HTML считается по плану)
+DEFAULT_SHEET_MS = {
+    'html': settings.estimate_html_sheet_ms,
+    'pdf': settings.estimate_pdf_sheet_ms,
+    'svg': settings.estimate_svg_sheet_ms,
+    'png': settings.estimate_png_sheet_ms,
+}
+DEFAULT_SHEET_BYTES = {
+    'pdf': settings.estimate_pdf_sheet_bytes,
+    'svg': settings.estimate_svg_sheet_bytes,
+    'png': settings.estimate_png_sheet_bytes,
+}
+
+def qr_size(payload: str) -> int:
+    """
+    Примерная длина data URL QR кода (qr_codes.qr_data_url): SVG растёт с площадью матрицы,
+    а сторона матрицы определяется версией QR. Длинные данные - честный рендер
+    """
+    length = len(payload.encode('utf-8'))
+    for version, capacity in enumerate(QR_CAPACITY, start=1):
+        if length <= capacity:
+            modules = 17 + 4 * version + 2  # с тихой зоной в 1 модуль
+            return 150 + math.ceil(2.25 * modules * modules)
+    return len(qr_data_url(payload))
+
+def file_image_size(path: Optional[str], kind: str) -> int:
+    """
+    Длина data URL картинки по размеру файла: печатная копия, если она уже есть и свежая,
+    иначе оригинал (копия будет меньше). Нет файла - в документе окажется сам путь
+    """
+    image_path = path or DEFAULT_IMAGES[kind]
+    abs_path = image_source_path(image_path, kind)
+    try:
+        source = os.stat(abs_path)
+    except OSError:
+        return len(image_path)
+
+    file_path, size = abs_path, source.st_size
+    for candidate in derivative_candidates(abs_path):
+        try:
+            stat = os.stat(candidate)
+        except OSError:
+            continue
+        if stat.st_mtime_ns >= source.st_mtime_ns:
+            file_path, size = candidate, stat.st_size
+            break
+
+    ext = os.path.splitext(file_path)[1].lower()
+    mime_type = 'image/png' if ext == '.png' else 'image/jpeg' if ext in ['.jpg', '.jpeg'] else 'image/svg+xml'
+    return len(f"data:{mime_type};base64,") + 4 * math.ceil(size / 3)
+
+def image_size(ref: ImageRef) -> int:
+    if ref.qr_data:
+        return qr_size(ref.qr_data)
+    return file_image_size(ref.path, ref.kind)
+
+class EstimatedImages(PlanImages):
+    """Картинки плана как заглушки той же длины: разметка совпадает с документом по размеру"""
+
+    def __init__(self, plan: RenderPlan, image_mode: str, minify: bool = False):
+        super().__init__(plan, image_mode, minify)
+        self.sizes: Dict[ImageRef, int] = {}
+
+    def src(self, ref: ImageRef) -> str:
+        # Заглушки разных картинок различаются: в режиме shared у каждой свой класс
+        if ref not in self.sizes:
+            self.sizes[ref] = image_size(ref)
+        return ref.key.ljust(self.sizes[ref], '=')
+
+def pixel_scale(dpi: Optional[int]) -> float:
+    """
+    Во сколько раз лист PNG с разрешением dpi больше листа при raster_dpi:
+    время и размер листа растут с числом пикселей. None (не PNG или разрешение по умолчанию) - 1
+    """
+    return (dpi / settings.raster_dpi) ** 2 if dpi else 1
+
+def job_rates(db: Session, output_format: str) -> Optional[Dict[str, float]]:
+    """
+    Секунд и байт на лист по последним выполненным задачам того же формата;
+    листы PNG приведены к raster_dpi (см. pixel_scale). None - таких задач ещё не было
+    """
+    jobs = db.query(GenerationJob.started_at, GenerationJob.finished_at, GenerationJob.pages_total,
+                    GenerationJob.result_size, GenerationJob.request).filter(
+        GenerationJob.status == "done",
+        GenerationJob.output_format == output_format,
+        GenerationJob.pages_total > 0,
+        GenerationJob.started_at.isnot(None),
+        GenerationJob.finished_at.isnot(None),
+    ).order_by(GenerationJob.finished_at.desc()).limit(HISTORY_JOBS).all()
+    if not jobs:
+        return None
+
+    pages = sum(job.pages_total * pixel_scale((job.request or {}).get('dpi')) for job in jobs)
+    return {
+        'seconds': sum((job.finished_at - job.started_at).total_seconds() for job in jobs) / pages,
+        'bytes': sum(job.result_size or 0 for job in jobs) / pages,
+    }
+
+def estimate_document(db: Session, document: LabelDocument) -> schemas.GenerationEstimate:
+    """Оценка документа: листы, предупреждения, размер и время рендера"""
+    plan = document.plan()
+    page_count = len(plan.pages)
+    rates = job_rates(db, document.output_format)
+    # Настройки и история PNG даны для raster_dpi: время и размер листа растут с числом пикселей
+    pixels = pixel_scale(document.dpi)
+
+    if document.output_format == 'html':
+        images = EstimatedImages(plan, document.image_mode, document.minify)
+        estimated_bytes = plan_html_size(plan, images, document.stylesheet_url)
+    else:
+        sheet_bytes = (rates['bytes'] if rates else DEFAULT_SHEET_BYTES[document.output_format]) * pixels
+        if not rates and document.output_format == 'svg':
+            # Шрифты встроены в каждый лист SVG, WOFF в архиве почти не сжимается
+            sheet_bytes += len(font_styles())
+        estimated_bytes = round(sheet_bytes * page_count)
+    sheet_seconds = (rates['seconds'] if rates else DEFAULT_SHEET_MS[document.output_format] / 1000) * pixels
+
+    usage = document.sheet_usage()
+    label_sheets, label_free_slots = usage.get('label', (None, None))
+    instruction_sheets, instruction_free_slots = usage.get('instruction', (None, None))
+
+    warnings = []
+    for candle in document.candles:
+        candle_warnings = check_overflow(candle)
+        if candle_warnings:
+            warnings.append(schemas.OverflowReportItem(
+                id=candle.id,
+                sequence_number=candle.sequence_number,
+                name=candle.display_name or candle.name,
+                warnings=candle_warnings,
+            ))
+
+    return schemas.GenerationEstimate(
+        output_format=document.output_format,
+        candle_count=plan.candle_count,
+        card_count=plan_card_count(plan),
+        label_sheets=label_sheets,
+        label_free_slots=label_free_slots,
+        instruction_sheets=instruction_sheets,
+        instruction_free_slots=instruction_free_slots,
+        warnings=warnings,
+        estimated_bytes=estimated_bytes,
+        estimated_seconds=round(sheet_seconds * page_count, 3),
+        timing_basis="jobs" if rates else "default",
+    )
@@ -0,0 +1,64 @@
+from functools import lru_cache
+from typing import Optional
+import hashlib
+import logging
+import os
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Каталоги со шрифтами: сначала собственные файлы проекта, затем системные DejaVu
+# (DejaVu покрывает кириллицу и используется как запасной вариант)
+SYSTEM_FONT_DIRS = [
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/usr/share/fonts/TTF",
+]
+
+# Начертания, которые использует дизайн этикеток, и файлы для них по приоритету.
+# Cormorant Garamond и Montserrat (Google Fonts, OFL) кладутся в settings.fonts_path, см. README;
+# без них используется DejaVu
+FONT_FILES = {
+    'serif-bold': ["CormorantGaramond-Bold.ttf", "DejaVuSerif-Bold.ttf"],
+    'serif-semibold': ["CormorantGaramond-SemiBold.ttf", "DejaVuSerif-Bold.ttf"],
+    'serif-italic': ["CormorantGaramond-MediumItalic.ttf", "CormorantGaramond-Italic.ttf",
+                     "DejaVuSerif-Italic.ttf", "DejaVuSerif.ttf"],
+    'sans': ["Montserrat-Regular.ttf", "DejaVuSans.ttf"],
+    'sans-medium': ["Montserrat-Medium.ttf", "DejaVuSans.ttf"],
+    'sans-semibold': ["Montserrat-SemiBold.ttf", "DejaVuSans-Bold.ttf"],
+    'sans-italic': ["Montserrat-MediumItalic.ttf", "Montserrat-Italic.ttf",
+                    "DejaVuSans-Oblique.ttf", "DejaVuSans.ttf"],
+}
+
+# Запасные шрифты: ими можно печатать, но это не шрифт дизайна
+FALLBACK_FONT_PREFIX = "DejaVu"
+
+@lru_cache(maxsize=None)
+def font_file(role: str) -> Optional[str]:
+    """Путь к файлу шрифта для начертания role или None, если ничего не найдено"""
+    for filename in FONT_FILES[role]:
+        for directory in [settings.fonts_path] + SYSTEM_FONT_DIRS:
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                if filename.startswith(FALLBACK_FONT_PREFIX):
+                    logger.warning("Font for %s not found in %s, using fallback %s", role, settings.fonts_path, path)
+                return path
+    logger.warning("No font found for %s, text widths are approximated", role)
+    return None
+
+def is_fallback_font(role: str) -> bool:
+    """Начертание role печатается запасным шрифтом (или шрифта нет вовсе)"""
+    path = font_file(role)
+    return path is None or os.path.basename(path).startswith(FALLBACK_FONT_PREFIX)
+
+@lru_cache(maxsize=None)
+def font_digest(role: str) -> Optional[str]:
+    """
+    Хэш содержимого файла шрифта начертания role (None - шрифта нет).
+    Не зависит от каталога: тот же файл в другом месте даёт тот же хэш
+    """
+    path = font_file(role)
+    if path is None:
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
@@ -0,0 +1,157 @@
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from sqlalchemy.orm import Session, joinedload
+from models import Candle
+from label_generator import iter_labels_html, document_fingerprint, minify_saved_bytes
+from render_plan import PRINT_TYPES, RenderPlan, build_plan, candle_quantity
+from pdf_generator import iter_labels_pdf
+from svg_generator import iter_labels_svg
+from raster_generator import iter_labels_png
+from layouts import SheetLayout, resolve_layout
+from sheet_packing import PACKING_MODES, sheet_usage
+from style_profiles import STYLE_PROFILES
+from config import settings
+import schemas
+
+OUTPUT_FORMATS = ('html', 'pdf', 'svg', 'png')
+
+# Наименьшее разрешение листов PNG
+MIN_RASTER_DPI = 72
+
+MEDIA_TYPES = {
+    'html': "text/html; charset=utf-8",
+    'pdf': "application/pdf",
+    'svg': "application/zip",  # лист - отдельный SVG, все листы в архиве
+    'png': "application/zip",  # лист - отдельный PNG
+}
+
+# Расширение готового файла документа
+FILE_EXTENSIONS = {'html': 'html', 'pdf': 'pdf', 'svg': 'zip', 'png': 'zip'}
+
+class LabelDocument(NamedTuple):
+    """
+    Проверенный запрос на генерацию: свечи и разрешённые параметры печати.
+    Общий для /api/generate-labels и фоновых задач (jobs.py)
+    """
+    candles: List[Candle]
+    output_format: str
+    print_type: str
+    image_mode: str
+    stylesheet_url: Optional[str]
+    label_layout: SheetLayout
+    instruction_layout: SheetLayout
+    label_start_slot: int
+    instruction_start_slot: int
+    packing: str
+    style_profile: str
+    minify: bool
+    dpi: Optional[int]  # только у PNG
+
+    @property
+    def media_type(self) -> str:
+        return MEDIA_TYPES[self.output_format]
+
+    @property
+    def plan_options(self) -> Dict:
+        return dict(
+            label_start_slot=self.label_start_slot,
+            instruction_start_slot=self.instruction_start_slot,
+            packing=self.packing,
+            style_profile=self.style_profile,
+        )
+
+    def fingerprint(self) -> str:
+        if self.output_format != 'html':
+            # PDF, SVG и PNG не зависят от image_mode и CSS
+            return document_fingerprint(self.candles, self.label_layout, self.print_type, output_format=self.output_format,
+                                        instruction_layout=self.instruction_layout, dpi=self.dpi, **self.plan_options)
+        return document_fingerprint(self.candles, self.label_layout, self.print_type, self.image_mode, self.stylesheet_url,
+                                    instruction_layout=self.instruction_layout, minify=self.minify, **self.plan_options)
+
+    def plan(self) -> RenderPlan:
+        """План документа (render_plan): листы, карточки и картинки без разметки"""
+        return build_plan(self.candles, self.label_layout, self.print_type, self.instruction_layout, **self.plan_options)
+
+    def chunks(self, on_pages: Optional[Callable[[int], None]] = None) -> Iterator[Union[str, bytes]]:
+        """Документ по частям: строки HTML или байты PDF и ZIP с листами SVG или PNG"""
+        if self.output_format == 'pdf':
+            return iter_labels_pdf(self.candles, self.print_type, self.label_layout, self.instruction_layout,
+                                   **self.plan_options, on_pages=on_pages)
+        if self.output_format == 'svg':
+            return iter_labels_svg(self.candles, self.print_type, self.label_layout, self.instruction_layout,
+                                   **self.plan_options, on_pages=on_pages)
+        if self.output_format == 'png':
+            return iter_labels_png(self.candles, self.print_type, self.label_layout, self.instruction_layout,
+                                   **self.plan_options, dpi=self.dpi, on_pages=on_pages)
+        return iter_labels_html(self.candles, self.label_layout, self.print_type, self.image_mode, self.stylesheet_url,
+                                self.instruction_layout, **self.plan_options, minify=self.minify, on_pages=on_pages)
+
+    def minify_saved_bytes(self) -> int:
+        """На сколько байт минифицированный HTML меньше обычного (см. label_generator.minify_saved_bytes)"""
+        return minify_saved_bytes(self.plan(), self.image_mode, self.stylesheet_url)
+
+    def sheet_usage(self) -> Dict[str, Tuple[int, int]]:
+        """(листов, свободных ячеек) по видам листов; считается по количеству, до рендера"""
+        card_count = sum(candle_quantity(candle) for candle in self.candles)
+        usage = {}
+        if self.print_type in ('labels', 'both'):
+            usage['label'] = sheet_usage(card_count, self.label_layout.per_page, self.label_start_slot)
+        if self.print_type in ('instructions', 'both'):
+            usage['instruction'] = sheet_usage(card_count, self.instruction_layout.per_page, self.instruction_start_slot)
+        return usage
+
+    @property
+    def page_count(self) -> int:
+        """Листов карточек в документе (без страницы предупреждений)"""
+        return sum(sheets for sheets, _ in self.sheet_usage().values())
+
+def prepare_document(db: Session, request: schemas.GenerateLabelsRequest, stylesheet_url: Optional[str]) -> LabelDocument:
+    """
+    Загружает свечи и проверяет параметры запроса.
+    LookupError - свечей нет, ValueError - неверные параметры
+    """
+    if request.format not in OUTPUT_FORMATS:
+        raise ValueError("Unsupported format")
+    if request.print_type not in PRINT_TYPES:
+        raise ValueError("Unsupported print type")
+    if request.image_mode not in ("shared", "inline"):
+        raise ValueError("Unsupported image mode")
+    if request.packing not in PACKING_MODES:
+        raise ValueError("Unsupported packing mode")
+    if request.style_profile not in STYLE_PROFILES:
+        raise ValueError("Unsupported style profile")
+    if request.preview and request.format != 'html':
+        raise ValueError("Preview is only available for HTML")
+    if request.minify and request.format != 'html':
+        raise ValueError("Minified output is only available for HTML")
+    if request.dpi is not None and request.format != 'png':
+        raise ValueError("DPI is only available for PNG")
+    if request.dpi is not None and not MIN_RASTER_DPI <= request.dpi <= settings.raster_max_dpi:
+        raise ValueError(f"dpi must be between {MIN_RASTER_DPI} and {settings.raster_max_dpi}")
+
+    label_layout = resolve_layout('label', request.label_layout, request.labels_per_page)
+    instruction_layout = resolve_layout('instruction', request.instruction_layout)
+    if not 0 <= request.label_start_slot < label_layout.per_page:
+        raise ValueError(f"label_start_slot must be between 0 and {label_layout.per_page - 1}")
+    if not 0 <= request.instruction_start_slot < instruction_layout.per_page:
+        raise ValueError(f"instruction_start_slot must be between 0 and {instruction_layout.per_page - 1}")
+
+    # Категорию загружаем сразу: документ отдаётся потоком уже после закрытия сессии
+    candles = db.query(Candle).options(joinedload(Candle.category)).filter(Candle.id.in_(request.candle_ids)).all()
+    if not candles:
+        raise LookupError("No candles found")
+
+    return LabelDocument(
+        candles=candles,
+        output_format=request.format,
+        print_type=request.print_type,
+        image_mode=request.image_mode,
+        stylesheet_url=None if request.format != 'html' else stylesheet_url,
+        label_layout=label_layout,
+        instruction_layout=instruction_layout,
+        label_start_slot=request.label_start_slot,
+        instruction_start_slot=request.instruction_start_slot,
+        packing=request.packing,
+        style_profile=request.style_profile,
+        minify=request.minify,
+        dpi=(request.dpi or settings.raster_dpi) if request.format == 'png' else None,
+    )
@@ -0,0 +1,114 @@
+from typing import Optional
+from PIL import Image, ImageOps
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Физический размер картинок на этикетке и разрешение печати
+PRINT_DPI = 300
+PRINT_SIZES_MM = {
+    'logo': 15,
+    'qr': 10,
+}
+
+def mm_to_px(mm: float, dpi: int = PRINT_DPI) -> int:
+    """Перевод миллиметров в пиксели при заданном DPI"""
+    return round(mm / 25.4 * dpi)
+
+def derivative_candidates(image_path: str):
+    """Возможные пути печатной копии рядом с оригиналом"""
+    base, _ = os.path.splitext(image_path)
+    return [f"{base}.print.png", f"{base}.print.jpg"]
+
+def qr_module_px(image: Image.Image) -> Optional[float]:
+    """
+    Размер модуля QR-кода в пикселях по ширине углового маркера (7 модулей)
+    в первой тёмной строке. None, если маркер не найден
+    """
+    gray = image.convert('L')
+    box = gray.point(lambda value: 255 if value < 128 else 0).getbbox()
+    if not box:
+        return None
+    left, top, right, _ = box
+    run = 0
+    for x in range(left, right):
+        if gray.getpixel((x, top)) >= 128:
+            break
+        run += 1
+    return run / 7 if run >= 7 else None
+
+def qr_print_size(image: Image.Image, target_px: int) -> int:
+    """
+    Ширина печатного QR не больше target_px с целым числом пикселей на модуль:
+    при NEAREST все модули одного размера, края остаются резкими
+    """
+    module_px = qr_module_px(image)
+    if not module_px:
+        return target_px
+    modules = max(1, round(image.width / module_px))
+    return modules * max(1, target_px // modules)
+
+def create_print_derivative(image_path: str, kind: str) -> str:
+    """
+    Создаёт печатную копию картинки рядом с оригиналом:
+    декодирует один раз, убирает метаданные, уменьшает до размера печати
+    (logo - 15мм, qr - 10мм при 300 DPI) и сохраняет с оптимизацией.
+    QR уменьшается без сглаживания (NEAREST) до целого числа пикселей на модуль.
+    Возвращает путь к копии. Ошибки Pillow пробрасываются вызывающему коду.
+    """
+    target_px = mm_to_px(PRINT_SIZES_MM[kind])
+
+    with Image.open(image_path) as src:
+        # JPEG можно сразу декодировать в уменьшенном масштабе; QR - без размытия модулей
+        if kind != 'qr':
+            src.draft('RGB', (target_px, target_px))
+        image = ImageOps.exif_transpose(src)
+        has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    if kind == 'qr':
+        size = qr_print_size(image, target_px)
+        if image.width > size:
+            image = image.resize((size, max(1, round(image.height * size / image.width))), Image.NEAREST)
+    else:
+        image.thumbnail((target_px, target_px), Image.LANCZOS)
+
+    # Убираем EXIF/ICC и прочие метаданные - при сохранении Pillow берёт их из info
+    image.info = {}
+
+    png_path, jpg_path = derivative_candidates(image_path)
+    if has_alpha or kind == 'qr':
+        image.save(png_path, 'PNG', optimize=True)
+        stale_path, out_path = jpg_path, png_path
+    else:
+        image.save(jpg_path, 'JPEG', quality=90, optimize=True, progressive=True)
+        stale_path, out_path = png_path, jpg_path
+
+    # Удаляем копию другого формата от прошлой версии файла
+    if os.path.exists(stale_path):
+        os.remove(stale_path)
+    return out_path
+
+def get_print_derivative(image_path: str, kind: str) -> Optional[str]:
+    """
+    Возвращает путь к актуальной печатной копии картинки.
+    Если копии нет или оригинал новее - создаёт её. None, если оригинал не читается.
+    """
+    try:
+        source_mtime = os.stat(image_path).st_mtime_ns
+    except OSError:
+        return None
+
+    for candidate in derivative_candidates(image_path):
+        try:
+            if os.stat(candidate).st_mtime_ns >= source_mtime:
+                return candidate
+        except OSError:
+            continue
+
+    try:
+        return create_print_derivative(image_path, kind)
+    except Exception as e:
+        logger.warning("Error creating print derivative for %s: %s", image_path, e)
+        return None
@@ -0,0 +1,165 @@
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+import logging
+import os
+import threading
+import time
+import uuid
+from database import SessionLocal
+from models import GenerationJob
+from generation import FILE_EXTENSIONS, prepare_document
+from config import settings
+import schemas
+
+logger = logging.getLogger(__name__)
+
+# Как часто прогресс выполняющейся задачи записывается в базу (секунды)
+PROGRESS_INTERVAL = 0.5
+
+# Как часто при создании задач удаляются устаревшие (секунды)
+PURGE_INTERVAL = 3600
+
+_purged_at: Optional[float] = None
+_purge_lock = threading.Lock()
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+def get_job_executor() -> Executor:
+    """
+    Потоки фоновых задач (settings.job_workers). Сам рендер больших документов
+    всё равно уходит в пул процессов (render_pool), поток задачи только пишет результат
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(settings.job_workers, 1), thread_name_prefix="label-job")
+        return _executor
+
+def shutdown_job_executor():
+    """Остановка при выключении: невыполненные задачи остаются в базе и продолжатся после запуска"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+def job_result_path(job: GenerationJob) -> str:
+    return os.path.join(settings.jobs_path, f"{job.id}.{FILE_EXTENSIONS[job.output_format]}")
+
+def update_job(db, job_id: str, **fields):
+    """Запись состояния задачи; коммит сразу, чтобы опрос и SSE видели прогресс"""
+    db.query(GenerationJob).filter(GenerationJob.id == job_id).update(fields, synchronize_session=False)
+    db.commit()
+
+def create_job(db, request: schemas.GenerateLabelsRequest, stylesheet_url: Optional[str]) -> GenerationJob:
+    """Ставит генерацию в очередь: задача сохраняется в базе и отдаётся пулу"""
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        status="queued",
+        request=request.model_dump(),
+        stylesheet_url=stylesheet_url,
+        output_format=request.format,
+        pages_done=0,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    get_job_executor().submit(run_job, job.id)
+    purge_jobs_periodically(db)
+    return job
+
+def run_job(job_id: str):
+    """Выполняет задачу из очереди: документ пишется во временный файл и переименовывается по готовности"""
+    # Свечи нужны и после коммитов прогресса: без expire_on_commit они не перечитываются из базы,
+    # а между коммитами сессия не держит транзакцию
+    db = SessionLocal(expire_on_commit=False)
+    try:
+        # Захват задачи: выполняет только тот, кто перевёл её из queued
+        claimed = db.query(GenerationJob).filter(
+            GenerationJob.id == job_id, GenerationJob.status == "queued"
+        ).update({"status": "running", "started_at": datetime.now(), "pages_done": 0}, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            return
+
+        job = db.get(GenerationJob, job_id)
+        path = job_result_path(job)
+        try:
+            document = prepare_document(db, schemas.GenerateLabelsRequest(**job.request), job.stylesheet_url)
+            update_job(db, job_id, pages_total=document.page_count)
+
+            pages_done = 0
+            flushed_at = time.monotonic()
+
+            def on_pages(count: int):
+                nonlocal pages_done, flushed_at
+                pages_done += count
+                if time.monotonic() - flushed_at >= PROGRESS_INTERVAL:
+                    update_job(db, job_id, pages_done=pages_done)
+                    flushed_at = time.monotonic()
+
+            os.makedirs(settings.jobs_path, exist_ok=True)
+            partial_path = f"{path}.part"
+            with open(partial_path, 'wb') as f:
+                for chunk in document.chunks(on_pages):
+                    f.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+            os.replace(partial_path, path)
+
+            update_job(db, job_id, status="done", pages_done=pages_done, result_size=os.path.getsize(path),
+                       minify_saved_bytes=document.minify_saved_bytes() if document.minify else None,
+                       finished_at=datetime.now())
+        except Exception as e:
+            logger.exception("Label generation job %s failed", job_id)
+            db.rollback()
+            update_job(db, job_id, status="failed", error=str(e) or e.__class__.__name__, finished_at=datetime.now())
+            if os.path.exists(f"{path}.part"):
+                os.remove(f"{path}.part")
+    finally:
+        db.close()
+
+def resume_jobs():
+    """
+    При запуске: задачи, прерванные остановкой backend, возвращаются в очередь,
+    очередь отдаётся пулу по порядку создания; старые завершённые задачи удаляются
+    """
+    db = SessionLocal()
+    try:
+        purge_jobs(db)
+        db.query(GenerationJob).filter(GenerationJob.status == "running").update(
+            {"status": "queued", "pages_done": 0}, synchronize_session=False
+        )
+        db.commit()
+        queued = db.query(GenerationJob.id).filter(GenerationJob.status == "queued").order_by(GenerationJob.created_at).all()
+    finally:
+        db.close()
+
+    for (job_id,) in queued:
+        get_job_executor().submit(run_job, job_id)
+
+def purge_jobs_periodically(db):
+    """
+    purge_jobs не чаще раза в PURGE_INTERVAL: вызывается при создании задач,
+    чтобы устаревшие документы не копились до перезапуска backend
+    """
+    global _purged_at
+    with _purge_lock:
+        now = time.monotonic()
+        if _purged_at is not None and now - _purged_at < PURGE_INTERVAL:
+            return
+        _purged_at = now
+    purge_jobs(db)
+
+def purge_jobs(db):
+    """Удаляет завершённые задачи старше settings.job_retention_hours вместе с документами"""
+    cutoff = datetime.now() - timedelta(hours=settings.job_retention_hours)
+    expired = db.query(GenerationJob).filter(
+        GenerationJob.status.in_(("done", "failed")), GenerationJob.finished_at < cutoff
+    ).all()
+    for job in expired:
+        path = job_result_path(job)
+        if os.path.exists(path):
+            os.remove(path)
+        db.delete(job)
+    db.commit()
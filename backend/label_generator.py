@@ -1,853 +1,475 @@
-from typing import List, Dict
+from types import SimpleNamespace
+from typing import Callable, List, Dict, Iterator, Optional, Union
 from models import Candle
+from cache import LRUCache
+from config import settings
+from image_processing import get_print_derivative
+from qr_codes import qr_data_url
+from text_fitting import FIT_VERSION
+from render_plan import (
+    Card, ImageRef, InstructionCard, LabelCard, PagePlan, RenderPlan, build_plan, candle_quantity, card_digest,
+)
+import label_templates as tpl
+from layouts import LAYOUTS, SheetLayout, DEFAULT_LAYOUTS, layouts_css
+from web_fonts import fonts_stylesheet, embedded_fonts_css
+from style_profiles import profile_css
+from urllib.parse import urljoin
 import base64
+import hashlib
 import os
 
+DEFAULT_IMAGES = {
+    'logo': "/uploads/logo/logo.png",
+    'qr': "/uploads/qr/qr.png",
+}
+
+# Общий кэш data URL картинок: ключ - путь, mtime и размер файла,
+# поэтому изменённый на диске файл автоматически перечитывается
+image_cache = LRUCache(max_bytes=settings.image_cache_max_bytes)
+
+# Кэш готовой разметки карточек: ключ - отпечаток карточки плана (тексты и классы размеров),
+# версия шаблонов и разметка картинок
+fragment_cache = LRUCache(max_bytes=settings.fragment_cache_max_bytes)
+
+# Кэш целых документов по отпечатку запроса (см. document_fingerprint)
+document_cache = LRUCache(max_bytes=settings.document_cache_max_bytes)
+
 def image_to_base64(image_path: str) -> str:
-    """Convert image file to base64 data URL"""
+    """Convert image file to base64 data URL (cached by path, mtime and size)"""
     try:
-        if os.path.exists(image_path):
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
-                base64_data = base64.b64encode(image_data).decode('utf-8')
-                ext = os.path.splitext(image_path)[1].lower()
-                mime_type = 'image/png' if ext == '.png' else 'image/jpeg' if ext in ['.jpg', '.jpeg'] else 'image/svg+xml'
-                return f"data:{mime_type};base64,{base64_data}"
+        stat = os.stat(image_path)
+    except OSError:
+        return ""
+
+    key = (image_path, stat.st_mtime_ns, stat.st_size)
+    data_url = image_cache.get(key)
+    if data_url is not None:
+        return data_url
+
+    try:
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+            base64_data = base64.b64encode(image_data).decode('utf-8')
+            ext = os.path.splitext(image_path)[1].lower()
+            mime_type = 'image/png' if ext == '.png' else 'image/jpeg' if ext in ['.jpg', '.jpeg'] else 'image/svg+xml'
+            data_url = f"data:{mime_type};base64,{base64_data}"
     except Exception as e:
         print(f"Error converting image {image_path}: {e}")
-    return ""
+        return ""
+
+    image_cache.put(key, data_url)
+    return data_url
+
+def image_source_path(path: Optional[str], kind: str) -> str:
+    """Путь к оригиналу картинки свечи на диске; пустой путь - картинка по умолчанию"""
+    image_path = path or DEFAULT_IMAGES[kind]
+    return image_path if image_path.startswith('/var/www') else f"/var/www/labels{image_path}"
 
-def get_text_size_class(text: str, thresholds: Dict[str, int]) -> str:
+def image_file_path(path: str, kind: str) -> Optional[str]:
+    """Путь к печатной копии картинки свечи на диске (None, если файла нет)"""
+    abs_path = image_source_path(path, kind)
+    print_path = get_print_derivative(abs_path, kind)
+    if print_path:
+        return print_path
+    return abs_path if os.path.isfile(abs_path) else None
+
+def resolve_image(path: str, kind: str, resolved: Dict[str, str]) -> str:
     """
-    Определяет CSS класс для текста в зависимости от длины
-    thresholds: {'short': 50, 'medium': 150, 'long': 300, 'very_long': 500}
+    Возвращает data URL печатной копии картинки свечи (или исходный путь, если файла нет).
+    kind - 'logo' или 'qr'; resolved - словарь в рамках одного документа,
+    чтобы не делать stat на каждую карточку
     """
-    text_len = len(text) if text else 0
-
-    if text_len == 0:
-        return 'text-empty'
-    elif text_len < thresholds.get('short', 50):
-        return 'text-short'
-    elif text_len < thresholds.get('medium', 150):
-        return 'text-medium'
-    elif text_len < thresholds.get('long', 300):
-        return 'text-long'
-    elif text_len < thresholds.get('very_long', 500):
-        return 'text-very-long'
-    else:
-        return 'text-overflow'
+    image_path = path or DEFAULT_IMAGES[kind]
+    if image_path not in resolved:
+        file_path = image_file_path(image_path, kind)
+        resolved[image_path] = (file_path and image_to_base64(file_path)) or image_path
+    return resolved[image_path]
 
-def check_overflow(candle: Candle) -> List[str]:
+def image_version(path: Optional[str], kind: str, versions: Dict[str, tuple]) -> tuple:
+    """
+    Версия картинки для отпечатка документа: путь, размер и mtime оригинала (печатная копия
+    строится из него). Файл не читается; versions - словарь в рамках одного отпечатка
+    """
+    image_path = path or DEFAULT_IMAGES[kind]
+    if image_path not in versions:
+        try:
+            stat = os.stat(image_source_path(image_path, kind))
+            versions[image_path] = (image_path, stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            versions[image_path] = (image_path, None, None)
+    return versions[image_path]
+
+def resolve_qr(candle: Candle, resolved: Dict[str, str]) -> str:
+    """QR код свечи: генерируется из qr_data (SVG, без диска) или берётся из загруженной картинки"""
+    if candle.qr_data:
+        return qr_data_url(candle.qr_data)
+    return resolve_image(candle.qr_image, 'qr', resolved)
+
+class ImageRegistry:
+    """
+    Реестр картинок документа для режима image_mode='shared':
+    каждая уникальная картинка попадает в документ один раз как CSS-класс,
+    а карточки ссылаются на этот класс
+    """
+
+    def __init__(self):
+        self.classes: Dict[str, str] = {}
+
+    def add(self, src: str) -> str:
+        if src not in self.classes:
+            digest = hashlib.sha1(src.encode('utf-8')).hexdigest()[:10]
+            self.classes[src] = f"img-{digest}"
+        return self.classes[src]
+
+    def css(self, templates: SimpleNamespace = tpl.STANDARD) -> str:
+        rules = ''.join(
+            templates.IMAGE_RULE.render(css_class=css_class, src=src)
+            for src, css_class in self.classes.items()
+        )
+        return templates.IMAGE_STYLES.render(rules=rules)
+
+def image_tag(src: str, alt: str, image_mode: str, registry: ImageRegistry,
+              templates: SimpleNamespace = tpl.STANDARD) -> str:
+    """Разметка картинки: <img> с data URL или ссылка на общий CSS-класс"""
+    if image_mode == 'shared':
+        return templates.IMAGE_SHARED.render(css_class=registry.add(src), alt=alt)
+    return templates.IMAGE_INLINE.render(src=src, alt=alt)
+
+def label_card_html(card: LabelCard, logo: str, qr: str, templates: SimpleNamespace = tpl.STANDARD) -> str:
+    """HTML одной этикетки; logo и qr - уже готовая разметка картинок, templates - tpl.STANDARD или tpl.MINIFIED"""
+    return templates.LABEL_CARD.render(
+        category=card.category,
+        name_class=card.name_class,
+        number=card.number,
+        title=card.title,
+        tagline=templates.LABEL_TAGLINE.render(tagline=card.tagline) if card.tagline else '',
+        logo=logo,
+        description_class=card.description_class,
+        description=card.description,
+        brand_name=card.brand_name,
+        website=card.website,
+        qr=qr,
+    )
+
+def instruction_card_html(card: InstructionCard, logo: str, qr: str, templates: SimpleNamespace = tpl.STANDARD) -> str:
+    """HTML одной карточки-инструкции; logo и qr - уже готовая разметка картинок"""
+    return templates.INSTRUCTION_CARD.render(
+        logo=logo,
+        title_class=card.title_class,
+        title=card.title,
+        tagline=templates.INSTRUCTION_TAGLINE.render(tagline=card.tagline) if card.tagline else '',
+        qr=qr,
+        description=templates.INSTRUCTION_DESCRIPTION.render(size_class=card.description_class, text=card.description) if card.description else '',
+        practice=templates.INSTRUCTION_PRACTICE.render(size_class=card.practice_class, text=card.practice) if card.practice else '',
+        ritual=templates.INSTRUCTION_RITUAL.render(size_class=card.ritual_class, text=card.ritual) if card.ritual else '',
+        brand_name=card.brand_name,
+        website=card.website,
+    )
+
+def markup_digest(*parts: str) -> str:
+    """Короткий отпечаток разметки для ключей кэша (длинные data URL в ключах не храним)"""
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def cached_card_html(card: Card, logo: str, qr: str, images_key: str, templates: SimpleNamespace = tpl.STANDARD) -> str:
+    """
+    Карточка из кэша фрагментов или свежий рендер. Ключ - отпечаток карточки плана
+    (тексты и классы, см. card_digest), поэтому изменения свечи не требуют отдельной версии.
+    images_key - отпечаток разметки logo и qr (см. markup_digest)
     """
-    Проверяет переполнение текста в свече
-    Возвращает список предупреждений
+    key = (card_digest(card), tpl.TEMPLATE_VERSION, templates.minify, images_key)
+    html = fragment_cache.get(key)
+    if html is None:
+        html = card_html(card, logo, qr, templates)
+        fragment_cache.put(key, html)
+    return html
+
+def card_html(card: Card, logo: str, qr: str, templates: SimpleNamespace = tpl.STANDARD) -> str:
+    render = label_card_html if isinstance(card, LabelCard) else instruction_card_html
+    return render(card, logo, qr, templates)
+
+def page_html(page: PagePlan, cards: Dict[Optional[str], str], templates: SimpleNamespace = tpl.STANDARD,
+              content: Optional[str] = None) -> str:
     """
-    warnings = []
-
-    # Проверка названия
-    if len(candle.name) > 30:
-        warnings.append(f"Название слишком длинное ({len(candle.name)} символов, рекомендуется до 30)")
-
-    # Проверка описания для этикетки (с учётом адаптивных размеров)
-    desc_len = len(candle.description)
-    if desc_len > 450:
-        warnings.append(f"Описание критически длинное ({desc_len} символов, рекомендуется до 450)")
-    elif desc_len > 400:
-        warnings.append(f"Описание очень длинное ({desc_len} символов, будет использован минимальный шрифт 5.5pt)")
-
-    # Проверка практики для инструкции
-    if candle.practice and len(candle.practice) > 450:
-        warnings.append(f"Практика слишком длинная ({len(candle.practice)} символов, рекомендуется до 450)")
-
-    # Проверка заговора
-    if candle.ritual_text and len(candle.ritual_text) > 350:
-        warnings.append(f"Заговор слишком длинный ({len(candle.ritual_text)} символов, рекомендуется до 350)")
-
-    # Общая проверка для инструкции
-    total_instruction_length = (
-        len(candle.description) +
-        len(candle.practice or '') +
-        len(candle.ritual_text or '')
+    Лист плана; cards - готовая разметка карточек по ключам, None - занятая ячейка.
+    content - готовое содержимое листа вместо карточек
+    """
+    page_template = templates.LABELS_PAGE if page.kind == 'label' else templates.INSTRUCTIONS_PAGE
+    return page_template.render(
+        page_number=page.number,
+        layout_class=LAYOUTS[page.layout].css_class,
+        cards=''.join(cards[key] * count for key, count in page.slots) if content is None else content,
     )
-    if total_instruction_length > 900:
-        warnings.append(f"Общий объём текста инструкции критический ({total_instruction_length} символов, может не поместиться на карточке)")
 
-    return warnings
+def warnings_page_html(plan: RenderPlan, templates: SimpleNamespace = tpl.STANDARD) -> str:
+    """Страница предупреждений о переполнении текста ('' если проблем нет)"""
+    if not plan.warnings:
+        return ''
+
+    items = [
+        templates.WARNING_ITEM.render(
+            name=name,
+            warnings=''.join(templates.WARNING_LINE.render(warning=warning) for warning in warnings),
+        )
+        for name, warnings in plan.warnings
+    ]
+    return templates.WARNINGS_PAGE.render(
+        problem_count=len(items),
+        candle_count=plan.candle_count,
+        items=''.join(items),
+    )
 
-def generate_labels_html(candles: List[Candle], labels_per_page: int = 6, print_type: str = 'both') -> str:
+def image_src(ref: ImageRef, resolved: Dict[str, str]) -> str:
+    """data URL картинки плана (см. resolve_image, qr_data_url)"""
+    if ref.qr_data:
+        return qr_data_url(ref.qr_data)
+    return resolve_image(ref.path, ref.kind, resolved)
+
+def iter_labels_html(candles: List[Candle], label_layout: SheetLayout = DEFAULT_LAYOUTS['label'], print_type: str = 'both',
+                     image_mode: str = 'shared', stylesheet_url: Optional[str] = None,
+                     instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                     label_start_slot: int = 0, instruction_start_slot: int = 0,
+                     packing: str = 'sequential', style_profile: str = 'standard', minify: bool = False,
+                     on_pages: Optional[Callable[[int], None]] = None) -> Iterator[str]:
     """
-    Generate HTML for printing labels with rich magical design
+    Generate HTML for printing labels with rich magical design, chunk by chunk:
+    the <head>, the warnings page, then every sheet as soon as it is built
 
     Args:
         candles: List of candles to print
-        labels_per_page: Number of labels per page (default 6, max 9)
+        label_layout: Label sheet layout (see layouts.LAYOUTS, default 9 per A4)
         print_type: Type of pages to print - 'labels', 'instructions', or 'both' (default)
+        image_mode: 'shared' - each distinct image is emitted once as a CSS class (default),
+                    'inline' - data URL in every <img>
+        stylesheet_url: URL of the versioned stylesheet to link (the fonts stylesheet is linked
+                        next to it); None embeds the CSS and the subset fonts
+        instruction_layout: Instruction sheet layout (default 4 per A4)
+        label_start_slot: Cells already used on the first label sheet (printing starts after them)
+        instruction_start_slot: Cells already used on the first instruction sheet
+        packing: 'sequential' - copies in candle order (default),
+                 'compact' - copies of one candle kept together on as few sheets as possible
+        style_profile: 'standard' - full design (default), 'print-fast' - same layout with flat fills
+                       and pre-rendered sparkles (see style_profiles); stylesheet_url must match it
+        minify: Use the minified templates and stylesheets (label_templates.MINIFIED): the same
+                markup without comments and indentation; stylesheet_url must match it
+        on_pages: Called with the number of sheets as they are built (progress of background jobs)
     """
+    plan = build_plan(candles, label_layout, print_type, instruction_layout,
+                      label_start_slot, instruction_start_slot, packing, style_profile)
+    yield from iter_plan_html(plan, image_mode, stylesheet_url, on_pages, minify)
 
-    html_template = """
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Этикетки для свечей - АРТ-СВЕЧИ Мастерская Чародейки</title>
-    <link href="https://fonts.googleapis.com/css2?family=Cormorant+Garamond:wght@400;500;600;700&family=Montserrat:wght@300;400;500;600&display=swap" rel="stylesheet">
-    <style>
-        * {
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }
-
-        @page {
-            size: A4;
-            margin: 5mm;
-        }
-
-        @media print {
-            body {
-                -webkit-print-color-adjust: exact !important;
-                print-color-adjust: exact !important;
-                background: white !important;
-            }
-            .page {
-                page-break-after: always;
-                margin: 0;
-            }
-            .page:last-child {
-                page-break-after: avoid;
-            }
-        }
-
-        body {
-            font-family: 'Montserrat', sans-serif;
-            background: #1a1a2e;
-            margin: 0;
-            padding: 0;
-        }
-
-        /* Страница с этикетками - 9 на A4 */
-        .page-labels {
-            width: 210mm;
-            height: 297mm;
-            background: white;
-            margin: 20px auto;
-            padding: 0;
-            display: grid;
-            grid-template-columns: repeat(3, 70mm);
-            grid-template-rows: repeat(3, 99mm);
-            gap: 0;
-        }
-
-        /* Светлый дизайн этикетки для лучшей печати */
-        .label {
-            width: 70mm;
-            height: 99mm;
-            background: linear-gradient(160deg, #f8f0ff 0%, #f3e5ff 30%, #ffe0f5 60%, #ffd4e8 100%);
-            border: 3px solid #5d1a75;
-            border-radius: 10px;
-            position: relative;
-            overflow: hidden;
-            display: flex;
-            flex-direction: column;
-            padding: 3.5mm;
-            color: #2d0a3d;
-        }
-
-        /* Звезды-искры */
-        .label::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background-image:
-                radial-gradient(1px 1px at 10% 20%, rgba(255,255,255,0.8) 0%, transparent 100%),
-                radial-gradient(1.5px 1.5px at 30% 10%, rgba(255,255,255,0.6) 0%, transparent 100%),
-                radial-gradient(1px 1px at 50% 30%, rgba(255,255,255,0.7) 0%, transparent 100%),
-                radial-gradient(2px 2px at 70% 15%, rgba(255,215,0,0.8) 0%, transparent 100%),
-                radial-gradient(1px 1px at 85% 25%, rgba(255,255,255,0.5) 0%, transparent 100%),
-                radial-gradient(1.5px 1.5px at 20% 80%, rgba(255,255,255,0.6) 0%, transparent 100%),
-                radial-gradient(1px 1px at 60% 85%, rgba(255,215,0,0.7) 0%, transparent 100%),
-                radial-gradient(2px 2px at 90% 70%, rgba(255,255,255,0.5) 0%, transparent 100%);
-            pointer-events: none;
-        }
-
-        .label-header {
-            text-align: center;
-            margin-bottom: 1.5mm;
-            position: relative;
-            z-index: 1;
-        }
-
-        .label-category {
-            font-size: 7pt;
-            letter-spacing: 3px;
-            text-transform: uppercase;
-            color: #5d1a75;
-            margin-bottom: 1mm;
-            font-weight: 600;
-        }
-
-        .label-name {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 15pt;
-            font-weight: 700;
-            color: #2d0a3d;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-            line-height: 1.1;
-        }
-
-        .label-name.long-title {
-            font-size: 11pt;
-        }
-
-        .label-name.very-long-title {
-            font-size: 9pt;
-            line-height: 1.0;
-        }
-
-        .label-tagline {
-            font-size: 7pt;
-            font-style: italic;
-            color: #8b2c5f;
-            margin-top: 0.5mm;
-            margin-bottom: 1mm;
-            font-weight: 500;
-            line-height: 1.1;
-        }
-
-        .label-logo-area {
-            width: 15mm;
-            height: 15mm;
-            margin: 2mm auto;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            background: rgba(255,255,255,0.1);
-            position: relative;
-            z-index: 1;
-            overflow: hidden;
-        }
-
-        .label-logo-area img {
-            width: 100%;
-            height: 100%;
-            object-fit: contain;
-        }
-
-        .label-description {
-            flex: 1;
-            font-size: 6.5pt;
-            line-height: 1.2;
-            color: #3d0a4d;
-            text-align: center;
-            padding: 0 1.5mm;
-            position: relative;
-            z-index: 1;
-            overflow: hidden;
-            display: -webkit-box;
-            -webkit-line-clamp: 9;
-            -webkit-box-orient: vertical;
-            font-weight: 500;
-        }
-
-        /* Адаптивные размеры для разной длины текста */
-        .label-description.text-short {
-            font-size: 8.5pt;
-            line-height: 1.3;
-            -webkit-line-clamp: 6;
-        }
-
-        .label-description.text-medium {
-            font-size: 7.5pt;
-            line-height: 1.25;
-            -webkit-line-clamp: 7;
-        }
-
-        .label-description.text-long {
-            font-size: 6.5pt;
-            line-height: 1.2;
-            -webkit-line-clamp: 9;
-        }
-
-        .label-description.text-very-long {
-            font-size: 6pt;
-            line-height: 1.15;
-            -webkit-line-clamp: 10;
-        }
-
-        .label-description.text-overflow {
-            font-size: 5.5pt;
-            line-height: 1.1;
-            -webkit-line-clamp: 11;
-        }
-
-        .label-footer {
-            margin-top: auto;
-            position: relative;
-            z-index: 1;
-        }
-
-        .label-brand {
-            text-align: center;
-            margin-bottom: 1mm;
-        }
-
-        .label-brand-name {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 10pt;
-            font-weight: 600;
-            color: #8b4513;
-            letter-spacing: 1.5px;
-        }
-
-        .label-website {
-            font-size: 6.5pt;
-            color: #5d1a75;
-            letter-spacing: 0.5px;
-        }
-
-        .label-qr-row {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            gap: 2mm;
-        }
-
-        .label-qr {
-            width: 10mm;
-            height: 10mm;
-            background: white;
-            border-radius: 2px;
-            padding: 0.5mm;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-
-        .label-qr img {
-            width: 100%;
-            height: 100%;
-            object-fit: cover;
-        }
-
-        .label-qr-text {
-            font-size: 6pt;
-            color: #5d1a75;
-            text-align: left;
-            font-weight: 500;
-        }
-
-        .divider {
-            width: 60%;
-            height: 1px;
-            background: linear-gradient(90deg, transparent, rgba(139,44,95,0.5), transparent);
-            margin: 1mm auto;
-        }
-
-        /* Страница с инструкциями - 4 на A4 */
-        .page-instructions {
-            width: 210mm;
-            height: 297mm;
-            background: white;
-            margin: 20px auto;
-            padding: 10mm;
-            display: grid;
-            grid-template-columns: repeat(2, 1fr);
-            grid-template-rows: repeat(2, 1fr);
-            gap: 5mm;
-        }
-
-        .instruction-card {
-            background: linear-gradient(135deg, #f8f0ff 0%, #f3e5ff 50%, #ffe0f5 100%);
-            border-radius: 10px;
-            padding: 12px;
-            display: flex;
-            flex-direction: column;
-            position: relative;
-            overflow: hidden;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
-        }
-
-        /* Звезды для инструкций */
-        .instruction-card::before {
-            content: '';
-            position: absolute;
-            top: 0;
-            left: 0;
-            right: 0;
-            bottom: 0;
-            background-image:
-                radial-gradient(1px 1px at 15% 25%, rgba(255,255,255,0.6) 0%, transparent 100%),
-                radial-gradient(1.5px 1.5px at 85% 15%, rgba(255,215,0,0.7) 0%, transparent 100%),
-                radial-gradient(1px 1px at 50% 80%, rgba(255,255,255,0.5) 0%, transparent 100%);
-            pointer-events: none;
-        }
-
-        .instruction-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-            margin-bottom: 8px;
-            padding-bottom: 8px;
-            border-bottom: 1px solid rgba(232,185,35,0.3);
-            position: relative;
-            z-index: 1;
-        }
-
-        .instruction-logo {
-            width: 45px;
-            height: 45px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            overflow: hidden;
-            background: rgba(255,255,255,0.1);
-        }
-
-        .instruction-logo img {
-            width: 100%;
-            height: 100%;
-            object-fit: contain;
-        }
-
-        .instruction-title {
-            flex: 1;
-            text-align: center;
-            padding: 0 8px;
-        }
-
-        .instruction-title h2 {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 18pt;
-            font-weight: 700;
-            color: #2d0a3d;
-            margin: 0 0 3px 0;
-            text-transform: uppercase;
-        }
-
-        .instruction-title h2.long-title {
-            font-size: 14pt;
-        }
-
-        .instruction-title h2.very-long-title {
-            font-size: 11pt;
-            line-height: 1.1;
-        }
-
-        .instruction-subtitle {
-            font-size: 10pt;
-            color: #8b2c5f;
-            font-style: italic;
-            font-weight: 500;
-        }
-
-        .instruction-qr {
-            width: 45px;
-            height: 45px;
-            border-radius: 4px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            overflow: hidden;
-            background: white;
-            padding: 2px;
-        }
-
-        .instruction-qr img {
-            width: 100%;
-            height: 100%;
-            object-fit: cover;
-        }
-
-        .instruction-content {
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-            gap: 8px;
-            position: relative;
-            z-index: 1;
-        }
-
-        .instruction-section {
-            padding: 6px 8px;
-            background: rgba(255,255,255,0.08);
-            border-radius: 6px;
-            backdrop-filter: blur(5px);
-        }
-
-        .instruction-section h3 {
-            font-size: 11pt;
-            font-weight: 600;
-            color: #8b4513;
-            margin-bottom: 4px;
-            text-transform: uppercase;
-            letter-spacing: 1px;
-        }
-
-        .instruction-section p {
-            font-size: 9pt;
-            line-height: 1.3;
-            color: #3d0a4d;
-            text-align: justify;
-            margin: 0;
-            font-weight: 400;
-        }
-
-        .instruction-section.text-long p {
-            font-size: 8pt;
-            line-height: 1.2;
-        }
-
-        .instruction-section.text-very-long p {
-            font-size: 7pt;
-            line-height: 1.15;
-        }
-
-        .instruction-section.text-overflow p {
-            font-size: 6.5pt;
-            line-height: 1.1;
-        }
-
-        .instruction-spell {
-            background: rgba(139,44,95,0.08);
-            border-left: 2px solid #8b2c5f;
-            padding: 8px;
-            border-radius: 6px;
-            margin-top: 4px;
-        }
-
-        .instruction-spell h3 {
-            font-size: 10pt;
-            font-weight: 600;
-            color: #8b4513;
-            margin-bottom: 4px;
-            text-transform: uppercase;
-        }
-
-        .instruction-spell p {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 8.5pt;
-            line-height: 1.3;
-            color: #2d0a3d;
-            font-style: italic;
-            white-space: pre-line;
-            text-align: center;
-            font-weight: 500;
-        }
-
-        .instruction-spell.text-long p {
-            font-size: 7.5pt;
-            line-height: 1.2;
-        }
-
-        .instruction-spell.text-very-long p {
-            font-size: 6.5pt;
-            line-height: 1.15;
-        }
-
-        .instruction-spell.text-overflow p {
-            font-size: 6pt;
-            line-height: 1.1;
-        }
-
-        .instruction-footer {
-            margin-top: auto;
-            padding-top: 6px;
-            border-top: 1px solid rgba(232,185,35,0.2);
-            text-align: center;
-            position: relative;
-            z-index: 1;
-        }
-
-        .instruction-brand {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 11pt;
-            color: #8b4513;
-            letter-spacing: 2px;
-            margin-bottom: 2px;
-        }
-
-        .instruction-website {
-            font-size: 8pt;
-            color: #5d1a75;
-        }
-
-        /* Страница с предупреждениями */
-        .warnings-page {
-            width: 210mm;
-            height: 297mm;
-            background: white;
-            margin: 20px auto;
-            padding: 20mm;
-        }
-
-        .warnings-header {
-            text-align: center;
-            margin-bottom: 15mm;
-            padding-bottom: 5mm;
-            border-bottom: 3px solid #ff6b6b;
-        }
-
-        .warnings-header h1 {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 28pt;
-            color: #c92a2a;
-            margin-bottom: 5mm;
-        }
-
-        .warnings-header p {
-            font-size: 12pt;
-            color: #666;
-        }
-
-        .warning-item {
-            background: linear-gradient(135deg, #fff5f5 0%, #ffe3e3 100%);
-            border-left: 4px solid #ff6b6b;
-            border-radius: 8px;
-            padding: 10px 15px;
-            margin-bottom: 10px;
-        }
-
-        .warning-candle-name {
-            font-family: 'Cormorant Garamond', serif;
-            font-size: 14pt;
-            font-weight: 700;
-            color: #c92a2a;
-            margin-bottom: 5px;
-        }
-
-        .warning-list {
-            list-style: none;
-            padding-left: 0;
-        }
-
-        .warning-list li {
-            font-size: 10pt;
-            color: #333;
-            padding: 3px 0;
-            padding-left: 20px;
-            position: relative;
-        }
-
-        .warning-list li:before {
-            content: '⚠';
-            position: absolute;
-            left: 0;
-            color: #ff922b;
-        }
-
-        @media screen {
-            .page-labels, .page-instructions, .warnings-page {
-                margin: 20px auto;
-                box-shadow: 0 0 20px rgba(0,0,0,0.5);
-            }
-        }
-    </style>
-</head>
-<body>
-"""
-
-    # Собираем предупреждения для всех свечей
-    all_warnings = {}
-    for candle in candles:
-        warnings = check_overflow(candle)
-        if warnings:
-            all_warnings[candle.id] = {
-                'name': candle.display_name or candle.name,
-                'warnings': warnings
-            }
-
-    # Генерируем страницу предупреждений если есть проблемы
-    if all_warnings:
-        html_template += '    <!-- СТРАНИЦА ПРЕДУПРЕЖДЕНИЙ -->\n'
-        html_template += '    <div class="page warnings-page">\n'
-        html_template += '        <div class="warnings-header">\n'
-        html_template += '            <h1>⚠ Предупреждения о переполнении текста</h1>\n'
-        html_template += f'            <p>Найдено проблем в {len(all_warnings)} свечах из {len(candles)}</p>\n'
-        html_template += '        </div>\n'
-
-        for candle_id, data in all_warnings.items():
-            html_template += f'''
-        <div class="warning-item">
-            <div class="warning-candle-name">{data['name']}</div>
-            <ul class="warning-list">
-'''
-            for warning in data['warnings']:
-                html_template += f'                <li>{warning}</li>\n'
-
-            html_template += '''            </ul>
-        </div>
-'''
-
-        html_template += '    </div>\n\n'
-
-    # Создаём расширенный список свечей с учётом количества копий
-    expanded_candles = []
+class PlanImages:
+    """
+    Разметка картинок плана для одного документа или фрагмента предпросмотра:
+    data URL разрешаются один раз, классы режима shared одинаковы во всех документах плана
+    """
+
+    def __init__(self, plan: RenderPlan, image_mode: str, minify: bool = False):
+        self.plan = plan
+        self.image_mode = image_mode
+        self.templates = tpl.templates(minify)
+        self.resolved: Dict[str, str] = {}
+        self.registry = ImageRegistry()
+        self.markup: Dict[tuple, tuple] = {}
+
+    def styles(self) -> str:
+        """В режиме shared все картинки нужны до <body>, чтобы вывести их один раз"""
+        if self.image_mode != 'shared':
+            return ''
+        for ref in self.plan.images.values():
+            self.registry.add(self.src(ref))
+        return self.registry.css(self.templates)
+
+    def src(self, ref: ImageRef) -> str:
+        return image_src(ref, self.resolved)
+
+    def card(self, card: Card) -> tuple:
+        """(logo_html, qr_html, отпечаток) - один раз на пару картинок"""
+        key = (card.logo, card.qr)
+        if key not in self.markup:
+            logo_html = image_tag(self.src(self.plan.images[card.logo]), "АРТ-СВЕЧИ",
+                                  self.image_mode, self.registry, self.templates)
+            qr_html = image_tag(self.src(self.plan.images[card.qr]), "QR код",
+                                self.image_mode, self.registry, self.templates)
+            self.markup[key] = (logo_html, qr_html, markup_digest(logo_html, qr_html))
+        return self.markup[key]
+
+def document_head_html(plan: RenderPlan, images: PlanImages, stylesheet_url: Optional[str]) -> str:
+    """<head> документа: стили, шрифты, сетки макетов плана и картинки режима shared"""
+    image_styles = images.styles()
+    templates = images.templates
+
+    # Шрифты - рядом с файлом стилей или встроены в автономный документ
+    if stylesheet_url:
+        fonts = templates.STYLESHEET_LINK.render(url=urljoin(stylesheet_url, fonts_stylesheet()[0]))
+        stylesheet = templates.STYLESHEET_LINK.render(url=stylesheet_url)
+    else:
+        fonts = templates.STYLESHEET_INLINE.render(css=embedded_fonts_css(templates.minify))
+        stylesheet = templates.STYLESHEET_INLINE.render(css=profile_css(plan.style_profile, templates.minify))
+
+    return templates.DOCUMENT_HEAD.render(
+        fonts=fonts,
+        stylesheet=stylesheet,
+        layout_styles=layouts_css(*(LAYOUTS[name] for name in plan.layouts.values()), minify=templates.minify),
+        image_styles=image_styles,
+    )
+
+def iter_pages_html(plan: RenderPlan, pages: List[PagePlan], images: PlanImages,
+                    on_pages: Optional[Callable[[int], None]] = None) -> Iterator[str]:
+    """Листы плана в одном процессе"""
+    # Каждая карточка рендерится один раз на документ, копии - повтор готовой строки
+    cards = {None: images.templates.USED_SLOT.render()}
+    for page in pages:
+        for key, _ in page.slots:
+            if key not in cards:
+                card = plan.cards[key]
+                cards[key] = cached_card_html(card, *images.card(card), images.templates)
+        yield page_html(page, cards, images.templates)
+        if on_pages:
+            on_pages(1)
+
+def iter_plan_html(plan: RenderPlan, image_mode: str = 'shared', stylesheet_url: Optional[str] = None,
+                   on_pages: Optional[Callable[[int], None]] = None, minify: bool = False) -> Iterator[str]:
+    """HTML-документ по плану (см. iter_labels_html)"""
+    images = PlanImages(plan, image_mode, minify)
+    yield document_head_html(plan, images, stylesheet_url)
+
+    # Страница предупреждений, если есть проблемы
+    warnings_html = warnings_page_html(plan, images.templates)
+    if warnings_html:
+        yield warnings_html
+
+    # Листы в одном процессе: каждая карточка рендерится один раз, и передача карточек в пул
+    # и листов обратно дороже самого рендера (benchmarks/bench_parallel_html.py)
+    yield from iter_pages_html(plan, plan.pages, images, on_pages)
+
+    yield images.templates.DOCUMENT_TAIL.render()
+
+# Сколько листов приходит в одном фрагменте предпросмотра
+PREVIEW_PAGES_PER_FRAGMENT = 4
+
+def iter_preview_html(plan: RenderPlan, image_mode: str, stylesheet_url: Optional[str], fragment_url: str,
+                      minify: bool = False) -> Iterator[str]:
+    """
+    Лёгкая оболочка предпросмотра: <head> и страница предупреждений как в документе,
+    вместо листов - заглушки нужного размера. Скрипт подгружает листы с fragment_url
+    (см. plan_pages_html) по мере прокрутки; картинки режима inline приходят только с листами.
+    Учётные данные в оболочку не пишутся: её сохраняют и пересылают, доступ к листам даёт токен в fragment_url
+    """
+    images = PlanImages(plan, image_mode, minify)
+    templates = images.templates
+    yield document_head_html(plan, images, stylesheet_url)
+    yield templates.PREVIEW_NOTICE.render(page_count=len(plan.pages))
+
+    warnings_html = warnings_page_html(plan, templates)
+    if warnings_html:
+        yield warnings_html
+
+    yield ''.join(
+        templates.PREVIEW_PAGE.render(
+            page_class='page-labels' if page.kind == 'label' else 'page-instructions',
+            layout_class=LAYOUTS[page.layout].css_class,
+            page_number=page.number,
+        )
+        for page in plan.pages
+    )
+    yield templates.PREVIEW_SCRIPT.render(fragment_url=tpl.script_string(fragment_url),
+                                          pages_per_fragment=PREVIEW_PAGES_PER_FRAGMENT)
+    yield templates.DOCUMENT_TAIL.render()
+
+def plan_pages_html(plan: RenderPlan, image_mode: str, start: int, count: int, minify: bool = False) -> str:
+    """Фрагмент предпросмотра: листы плана с номерами от start, не больше count"""
+    pages = plan.pages[start - 1:start - 1 + count]
+    return ''.join(iter_pages_html(plan, pages, PlanImages(plan, image_mode, minify)))
+
+def html_size(html: str) -> int:
+    return len(html.encode('utf-8'))
+
+def plan_html_size(plan: RenderPlan, images: PlanImages, stylesheet_url: Optional[str] = None) -> int:
+    """
+    Размер HTML-документа плана в байтах без рендера документа: <head>, предупреждения,
+    обёртки листов и каждая уникальная карточка, умноженная на число её копий
+    """
+    templates = images.templates
+    size = html_size(document_head_html(plan, images, stylesheet_url))
+    size += html_size(warnings_page_html(plan, templates)) + html_size(templates.DOCUMENT_TAIL.render())
+
+    cards = {None: html_size(templates.USED_SLOT.render())}
+    for page in plan.pages:
+        size += html_size(page_html(page, {}, templates, ''))
+        for key, count in page.slots:
+            if key not in cards:
+                card = plan.cards[key]
+                cards[key] = html_size(card_html(card, *images.card(card)[:2], templates))
+            size += cards[key] * count
+    return size
+
+def minify_saved_bytes(plan: RenderPlan, image_mode: str = 'shared', stylesheet_url: Optional[str] = None) -> int:
+    """На сколько байт минифицированный документ плана меньше обычного (см. plan_html_size)"""
+    return (plan_html_size(plan, PlanImages(plan, image_mode), stylesheet_url)
+            - plan_html_size(plan, PlanImages(plan, image_mode, minify=True), stylesheet_url))
+
+def generate_labels_html(candles: List[Candle], label_layout: SheetLayout = DEFAULT_LAYOUTS['label'], print_type: str = 'both',
+                         image_mode: str = 'shared', stylesheet_url: Optional[str] = None,
+                         instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                         label_start_slot: int = 0, instruction_start_slot: int = 0,
+                         packing: str = 'sequential', style_profile: str = 'standard', minify: bool = False) -> str:
+    """Generate the whole labels document as one string (see iter_labels_html)"""
+    return ''.join(iter_labels_html(candles, label_layout, print_type, image_mode, stylesheet_url, instruction_layout,
+                                    label_start_slot, instruction_start_slot, packing, style_profile, minify))
+
+def document_fingerprint(candles: List[Candle], label_layout: SheetLayout = DEFAULT_LAYOUTS['label'], print_type: str = 'both',
+                         image_mode: str = 'shared', stylesheet_url: Optional[str] = None,
+                         output_format: str = 'html',
+                         instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                         label_start_slot: int = 0, instruction_start_slot: int = 0,
+                         packing: str = 'sequential', style_profile: str = 'standard', minify: bool = False,
+                         dpi: Optional[int] = None) -> str:
+    """
+    Отпечаток документа: свечи с версиями и количеством, параметры печати,
+    версия шаблонов и версии картинок (image_version - без чтения файлов, поэтому проверка
+    ETag дешевле рендера). Одинаковый отпечаток - одинаковый документ
+    """
+    digest = hashlib.sha256()
+    digest.update(repr((
+        output_format, label_layout, instruction_layout, label_start_slot, instruction_start_slot, packing,
+        style_profile, minify, dpi, print_type, image_mode, stylesheet_url, tpl.TEMPLATE_VERSION, FIT_VERSION, fonts_stylesheet()[0],
+    )).encode('utf-8'))
+
+    image_versions = {}
     for candle in candles:
-        quantity = getattr(candle, 'quantity', 1) or 1
-        for _ in range(quantity):
-            expanded_candles.append(candle)
-
-    # Group candles into label pages (9 per page)
-    labels_per_page_count = 9
-    label_pages = []
-    for i in range(0, len(expanded_candles), labels_per_page_count):
-        label_pages.append(expanded_candles[i:i + labels_per_page_count])
-
-    # Group candles into instruction pages (4 per page)
-    instructions_per_page_count = 4
-    instruction_pages = []
-    for i in range(0, len(expanded_candles), instructions_per_page_count):
-        instruction_pages.append(expanded_candles[i:i + instructions_per_page_count])
-
-    # Generate label pages
-    if print_type in ('labels', 'both'):
-        for page_num, page_candles in enumerate(label_pages):
-            html_template += f'    <!-- СТРАНИЦА {page_num + 1}: Этикетки -->\n'
-            html_template += f'    <div class="page page-labels">\n'
-
-            for candle in page_candles:
-                category_name = candle.category.name if candle.category else "Магическая свеча"
-
-                # Convert paths to base64 data URLs
-                logo_path = candle.logo_image or "/uploads/logo/logo.png"
-                qr_path = candle.qr_image or "/uploads/qr/qr.png"
-
-                # Convert to absolute paths and then to base64
-                logo_abs = logo_path if logo_path.startswith('/var/www') else f"/var/www/labels{logo_path}"
-                qr_abs = qr_path if qr_path.startswith('/var/www') else f"/var/www/labels{qr_path}"
-
-                logo_base64 = image_to_base64(logo_abs) or logo_path
-                qr_base64 = image_to_base64(qr_abs) or qr_path
-
-                # Check if name is long - адаптивный размер
-                name_len = len(candle.name)
-                if name_len > 30:
-                    name_class = "label-name very-long-title"
-                elif name_len > 15:
-                    name_class = "label-name long-title"
-                else:
-                    name_class = "label-name"
-
-                # Адаптивный размер для описания
-                desc_size_class = get_text_size_class(candle.description, {
-                    'short': 100,
-                    'medium': 200,
-                    'long': 300,
-                    'very_long': 400
-                })
-
-                html_template += f"""
-        <div class="label">
-            <div class="label-header">
-                <div class="label-category">{category_name}</div>
-                <div class="{name_class}">{candle.sequence_number or ''}. {candle.display_name or candle.name}</div>
-                {f'<div class="label-tagline">{candle.tagline}</div>' if candle.tagline else ''}
-            </div>
-            <div class="label-logo-area">
-                <img src="{logo_base64}" alt="АРТ-СВЕЧИ">
-            </div>
-            <div class="label-description {desc_size_class}">
-                {candle.description}
-            </div>
-            <div class="divider"></div>
-            <div class="label-footer">
-                <div class="label-brand">
-                    <div class="label-brand-name">{candle.brand_name}</div>
-                    <div class="label-website">{candle.website}</div>
-                </div>
-                <div class="label-qr-row">
-                    <div class="label-qr">
-                        <img src="{qr_base64}" alt="QR код">
-                    </div>
-                    <div class="label-qr-text">
-                        Группа<br>ВК
-                    </div>
-                </div>
-            </div>
-        </div>
-"""
-
-            html_template += '    </div>\n\n'
-
-    # Generate instruction pages
-    if print_type in ('instructions', 'both'):
-        for page_num, page_candles in enumerate(instruction_pages):
-            html_template += f'    <!-- СТРАНИЦА {len(label_pages) + page_num + 1}: Инструкции -->\n'
-            html_template += f'    <div class="page page-instructions">\n'
-
-            for candle in page_candles:
-                # Convert paths to base64 data URLs
-                logo_path = candle.logo_image or "/uploads/logo/logo.png"
-                qr_path = candle.qr_image or "/uploads/qr/qr.png"
-
-                # Convert to absolute paths and then to base64
-                logo_abs = logo_path if logo_path.startswith('/var/www') else f"/var/www/labels{logo_path}"
-                qr_abs = qr_path if qr_path.startswith('/var/www') else f"/var/www/labels{qr_path}"
-
-                logo_base64 = image_to_base64(logo_abs) or logo_path
-                qr_base64 = image_to_base64(qr_abs) or qr_path
-
-                # Адаптивные классы для заголовка
-                title_len = len(candle.name)
-                if title_len > 30:
-                    title_class = "very-long-title"
-                elif title_len > 20:
-                    title_class = "long-title"
-                else:
-                    title_class = ""
-
-                # Адаптивные классы для текстов
-                desc_class = get_text_size_class(candle.description, {'short': 100, 'medium': 200, 'long': 300, 'very_long': 400})
-                practice_class = get_text_size_class(candle.practice or '', {'short': 150, 'medium': 250, 'long': 350, 'very_long': 450})
-                ritual_class = get_text_size_class(candle.ritual_text or '', {'short': 100, 'medium': 200, 'long': 280, 'very_long': 350})
-
-                html_template += f"""
-        <div class="instruction-card">
-            <div class="instruction-header">
-                <div class="instruction-logo">
-                    <img src="{logo_base64}" alt="АРТ-СВЕЧИ">
-                </div>
-                <div class="instruction-title">
-                    <h2 class="{title_class}">{candle.display_name or candle.name}</h2>
-                    {f'<div class="instruction-subtitle">{candle.tagline}</div>' if candle.tagline else ''}
-                </div>
-                <div class="instruction-qr">
-                    <img src="{qr_base64}" alt="QR код">
-                </div>
-            </div>
-            <div class="instruction-content">
-                {f'''<div class="instruction-section {desc_class}">
-                    <h3>Описание</h3>
-                    <p>{candle.description}</p>
-                </div>''' if candle.description else ''}
-                {f'''<div class="instruction-section {practice_class}">
-                    <h3>Как работать</h3>
-                    <p>{candle.practice}</p>
-                </div>''' if candle.practice else ''}
-                {f'''<div class="instruction-spell {ritual_class}">
-                    <h3>Заговор</h3>
-                    <p>{candle.ritual_text}</p>
-                </div>''' if candle.ritual_text else ''}
-            </div>
-            <div class="instruction-footer">
-                <div class="instruction-brand">{candle.brand_name}</div>
-                <div class="instruction-website">{candle.website}</div>
-            </div>
-        </div>
-"""
-
-            html_template += '    </div>\n\n'
-
-    html_template += """
-</body>
-</html>
-"""
-
-    return html_template
\ No newline at end of file
+        digest.update(repr((
+            candle.id,
+            str(candle.last_modified_at),
+            candle_quantity(candle),
+            candle.category.name if candle.category else None,
+        )).encode('utf-8'))
+        digest.update(repr((
+            image_version(candle.logo_image, 'logo', image_versions),
+            candle.qr_data or image_version(candle.qr_image, 'qr', image_versions),
+        )).encode('utf-8'))
+
+    return digest.hexdigest()[:32]
+
+def cache_document(fingerprint: str, chunks: Iterator[Union[str, bytes]]) -> Iterator[Union[str, bytes]]:
+    """
+    Пропускает чанки документа (HTML-строки или байты PDF) дальше и по завершении
+    кладёт документ в document_cache. Документы больше бюджета кэша не накапливаются в памяти
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        if parts is not None:
+            data = chunk.encode('utf-8') if isinstance(chunk, str) else chunk
+            size += len(data)
+            if size > document_cache.max_bytes:
+                parts = None
+            else:
+                parts.append(data)
+        yield chunk
+
+    if parts is not None:
+        document_cache.put(fingerprint, b''.join(parts))
@@ -0,0 +1,970 @@
+from string import Formatter
+from types import SimpleNamespace
+from typing import Callable, Optional, Tuple
+import hashlib
+import json
+import re
+
+class Template:
+    """
+    Шаблон разметки с плейсхолдерами {name}.
+    Разбирается и компилируется в f-строку один раз при загрузке модуля,
+    так что render(**context) - это один вызов функции без разбора шаблона.
+    """
+
+    def __init__(self, source: str, fields: Optional[Tuple[str, ...]] = None):
+        self.source = source
+        code = []
+        used = []
+        for literal, field, _, _ in Formatter().parse(source):
+            code.append(literal.replace('{', '{{').replace('}', '}}'))
+            if field is not None:
+                code.append('{' + field + '}')
+                used.append(field)
+        # fields - поля исходного шаблона для минифицированного: поля из удалённых комментариев
+        # по-прежнему принимаются, просто не выводятся
+        self.fields = fields or tuple(dict.fromkeys(used))
+        self.render = self._compile(''.join(code))
+
+    def _compile(self, fstring_body: str) -> Callable[..., str]:
+        params = f"*, {', '.join(self.fields)}" if self.fields else ''
+        return eval(f"lambda {params}: f{fstring_body!r}", {})
+
+
+LABELS_CSS = """        * {
+            margin: 0;
+            padding: 0;
+            box-sizing: border-box;
+        }
+
+        @page {
+            size: A4;
+            margin: 5mm;
+        }
+
+        @media print {
+            body {
+                -webkit-print-color-adjust: exact !important;
+                print-color-adjust: exact !important;
+                background: white !important;
+            }
+            .page {
+                page-break-after: always;
+                margin: 0;
+            }
+            .page:last-child {
+                page-break-after: avoid;
+            }
+        }
+
+        body {
+            font-family: 'Montserrat', sans-serif;
+            background: #1a1a2e;
+            margin: 0;
+            padding: 0;
+        }
+
+        /* Страница с этикетками; сетка листа задаётся макетом (layouts.py) */
+        .page-labels {
+            width: 210mm;
+            height: 297mm;
+            background: white;
+            margin: 20px auto;
+            padding: 0;
+            display: grid;
+        }
+
+        /* Светлый дизайн этикетки для лучшей печати */
+        .label {
+            width: 70mm;
+            height: 99mm;
+            background: linear-gradient(160deg, #f8f0ff 0%, #f3e5ff 30%, #ffe0f5 60%, #ffd4e8 100%);
+            border: 3px solid #5d1a75;
+            border-radius: 10px;
+            position: relative;
+            overflow: hidden;
+            display: flex;
+            flex-direction: column;
+            padding: 3.5mm;
+            color: #2d0a3d;
+        }
+
+        /* Звезды-искры */
+        .label::before {
+            content: '';
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            bottom: 0;
+            background-image:
+                radial-gradient(1px 1px at 10% 20%, rgba(255,255,255,0.8) 0%, transparent 100%),
+                radial-gradient(1.5px 1.5px at 30% 10%, rgba(255,255,255,0.6) 0%, transparent 100%),
+                radial-gradient(1px 1px at 50% 30%, rgba(255,255,255,0.7) 0%, transparent 100%),
+                radial-gradient(2px 2px at 70% 15%, rgba(255,215,0,0.8) 0%, transparent 100%),
+                radial-gradient(1px 1px at 85% 25%, rgba(255,255,255,0.5) 0%, transparent 100%),
+                radial-gradient(1.5px 1.5px at 20% 80%, rgba(255,255,255,0.6) 0%, transparent 100%),
+                radial-gradient(1px 1px at 60% 85%, rgba(255,215,0,0.7) 0%, transparent 100%),
+                radial-gradient(2px 2px at 90% 70%, rgba(255,255,255,0.5) 0%, transparent 100%);
+            pointer-events: none;
+        }
+
+        .label-header {
+            text-align: center;
+            margin-bottom: 1.5mm;
+            position: relative;
+            z-index: 1;
+        }
+
+        .label-category {
+            font-size: 7pt;
+            letter-spacing: 3px;
+            text-transform: uppercase;
+            color: #5d1a75;
+            margin-bottom: 1mm;
+            font-weight: 600;
+        }
+
+        .label-name {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 15pt;
+            font-weight: 700;
+            color: #2d0a3d;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+            line-height: 1.1;
+        }
+
+        .label-name.long-title {
+            font-size: 11pt;
+        }
+
+        .label-name.very-long-title {
+            font-size: 9pt;
+            line-height: 1.0;
+        }
+
+        .label-tagline {
+            font-size: 7pt;
+            font-style: italic;
+            color: #8b2c5f;
+            margin-top: 0.5mm;
+            margin-bottom: 1mm;
+            font-weight: 500;
+            line-height: 1.1;
+        }
+
+        .label-logo-area {
+            width: 15mm;
+            height: 15mm;
+            margin: 2mm auto;
+            border-radius: 50%;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            background: rgba(255,255,255,0.1);
+            position: relative;
+            z-index: 1;
+            overflow: hidden;
+        }
+
+        .label-logo-area img {
+            width: 100%;
+            height: 100%;
+            object-fit: contain;
+        }
+
+        /* Общие картинки (image_mode=shared) */
+        .img-ref {
+            display: block;
+            width: 100%;
+            height: 100%;
+            background-position: center;
+            background-repeat: no-repeat;
+            background-size: contain;
+        }
+
+        .label-qr .img-ref,
+        .instruction-qr .img-ref {
+            background-size: cover;
+        }
+
+        .label-description {
+            flex: 1;
+            font-size: 6.5pt;
+            line-height: 1.2;
+            color: #3d0a4d;
+            text-align: center;
+            padding: 0 1.5mm;
+            position: relative;
+            z-index: 1;
+            overflow: hidden;
+            display: -webkit-box;
+            -webkit-line-clamp: 9;
+            -webkit-box-orient: vertical;
+            font-weight: 500;
+        }
+
+        /* Адаптивные размеры для разной длины текста */
+        .label-description.text-short {
+            font-size: 8.5pt;
+            line-height: 1.3;
+            -webkit-line-clamp: 6;
+        }
+
+        .label-description.text-medium {
+            font-size: 7.5pt;
+            line-height: 1.25;
+            -webkit-line-clamp: 7;
+        }
+
+        .label-description.text-long {
+            font-size: 6.5pt;
+            line-height: 1.2;
+            -webkit-line-clamp: 9;
+        }
+
+        .label-description.text-very-long {
+            font-size: 6pt;
+            line-height: 1.15;
+            -webkit-line-clamp: 10;
+        }
+
+        .label-description.text-overflow {
+            font-size: 5.5pt;
+            line-height: 1.1;
+            -webkit-line-clamp: 11;
+        }
+
+        .label-footer {
+            margin-top: auto;
+            position: relative;
+            z-index: 1;
+        }
+
+        .label-brand {
+            text-align: center;
+            margin-bottom: 1mm;
+        }
+
+        .label-brand-name {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 10pt;
+            font-weight: 600;
+            color: #8b4513;
+            letter-spacing: 1.5px;
+        }
+
+        .label-website {
+            font-size: 6.5pt;
+            color: #5d1a75;
+            letter-spacing: 0.5px;
+        }
+
+        .label-qr-row {
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            gap: 2mm;
+        }
+
+        .label-qr {
+            width: 10mm;
+            height: 10mm;
+            background: white;
+            border-radius: 2px;
+            padding: 0.5mm;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+
+        .label-qr img {
+            width: 100%;
+            height: 100%;
+            object-fit: cover;
+        }
+
+        .label-qr-text {
+            font-size: 6pt;
+            color: #5d1a75;
+            text-align: left;
+            font-weight: 500;
+        }
+
+        .divider {
+            width: 60%;
+            height: 1px;
+            background: linear-gradient(90deg, transparent, rgba(139,44,95,0.5), transparent);
+            margin: 1mm auto;
+        }
+
+        /* Страница с инструкциями; сетка листа задаётся макетом (layouts.py) */
+        .page-instructions {
+            width: 210mm;
+            height: 297mm;
+            background: white;
+            margin: 20px auto;
+            display: grid;
+        }
+
+        .instruction-card {
+            background: linear-gradient(135deg, #f8f0ff 0%, #f3e5ff 50%, #ffe0f5 100%);
+            border-radius: 10px;
+            padding: 12px;
+            display: flex;
+            flex-direction: column;
+            position: relative;
+            overflow: hidden;
+            box-shadow: 0 2px 5px rgba(0,0,0,0.1);
+        }
+
+        /* Звезды для инструкций */
+        .instruction-card::before {
+            content: '';
+            position: absolute;
+            top: 0;
+            left: 0;
+            right: 0;
+            bottom: 0;
+            background-image:
+                radial-gradient(1px 1px at 15% 25%, rgba(255,255,255,0.6) 0%, transparent 100%),
+                radial-gradient(1.5px 1.5px at 85% 15%, rgba(255,215,0,0.7) 0%, transparent 100%),
+                radial-gradient(1px 1px at 50% 80%, rgba(255,255,255,0.5) 0%, transparent 100%);
+            pointer-events: none;
+        }
+
+        .instruction-header {
+            display: flex;
+            justify-content: space-between;
+            align-items: flex-start;
+            margin-bottom: 8px;
+            padding-bottom: 8px;
+            border-bottom: 1px solid rgba(232,185,35,0.3);
+            position: relative;
+            z-index: 1;
+        }
+
+        .instruction-logo {
+            width: 45px;
+            height: 45px;
+            border-radius: 50%;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            overflow: hidden;
+            background: rgba(255,255,255,0.1);
+        }
+
+        .instruction-logo img {
+            width: 100%;
+            height: 100%;
+            object-fit: contain;
+        }
+
+        .instruction-title {
+            flex: 1;
+            text-align: center;
+            padding: 0 8px;
+        }
+
+        .instruction-title h2 {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 18pt;
+            font-weight: 700;
+            color: #2d0a3d;
+            margin: 0 0 3px 0;
+            text-transform: uppercase;
+        }
+
+        .instruction-title h2.long-title {
+            font-size: 14pt;
+        }
+
+        .instruction-title h2.very-long-title {
+            font-size: 11pt;
+            line-height: 1.1;
+        }
+
+        .instruction-subtitle {
+            font-size: 10pt;
+            color: #8b2c5f;
+            font-style: italic;
+            font-weight: 500;
+        }
+
+        .instruction-qr {
+            width: 45px;
+            height: 45px;
+            border-radius: 4px;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            overflow: hidden;
+            background: white;
+            padding: 2px;
+        }
+
+        .instruction-qr img {
+            width: 100%;
+            height: 100%;
+            object-fit: cover;
+        }
+
+        .instruction-content {
+            flex: 1;
+            display: flex;
+            flex-direction: column;
+            gap: 8px;
+            position: relative;
+            z-index: 1;
+        }
+
+        .instruction-section {
+            padding: 6px 8px;
+            background: rgba(255,255,255,0.08);
+            border-radius: 6px;
+            backdrop-filter: blur(5px);
+        }
+
+        .instruction-section h3 {
+            font-size: 11pt;
+            font-weight: 600;
+            color: #8b4513;
+            margin-bottom: 4px;
+            text-transform: uppercase;
+            letter-spacing: 1px;
+        }
+
+        .instruction-section p {
+            font-size: 9pt;
+            line-height: 1.3;
+            color: #3d0a4d;
+            text-align: justify;
+            margin: 0;
+            font-weight: 400;
+        }
+
+        .instruction-section.text-long p {
+            font-size: 8pt;
+            line-height: 1.2;
+        }
+
+        .instruction-section.text-very-long p {
+            font-size: 7pt;
+            line-height: 1.15;
+        }
+
+        .instruction-section.text-overflow p {
+            font-size: 6.5pt;
+            line-height: 1.1;
+        }
+
+        .instruction-spell {
+            background: rgba(139,44,95,0.08);
+            border-left: 2px solid #8b2c5f;
+            padding: 8px;
+            border-radius: 6px;
+            margin-top: 4px;
+        }
+
+        .instruction-spell h3 {
+            font-size: 10pt;
+            font-weight: 600;
+            color: #8b4513;
+            margin-bottom: 4px;
+            text-transform: uppercase;
+        }
+
+        .instruction-spell p {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 8.5pt;
+            line-height: 1.3;
+            color: #2d0a3d;
+            font-style: italic;
+            white-space: pre-line;
+            text-align: center;
+            font-weight: 500;
+        }
+
+        .instruction-spell.text-long p {
+            font-size: 7.5pt;
+            line-height: 1.2;
+        }
+
+        .instruction-spell.text-very-long p {
+            font-size: 6.5pt;
+            line-height: 1.15;
+        }
+
+        .instruction-spell.text-overflow p {
+            font-size: 6pt;
+            line-height: 1.1;
+        }
+
+        .instruction-footer {
+            margin-top: auto;
+            padding-top: 6px;
+            border-top: 1px solid rgba(232,185,35,0.2);
+            text-align: center;
+            position: relative;
+            z-index: 1;
+        }
+
+        .instruction-brand {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 11pt;
+            color: #8b4513;
+            letter-spacing: 2px;
+            margin-bottom: 2px;
+        }
+
+        .instruction-website {
+            font-size: 8pt;
+            color: #5d1a75;
+        }
+
+        /* Страница с предупреждениями */
+        .warnings-page {
+            width: 210mm;
+            height: 297mm;
+            background: white;
+            margin: 20px auto;
+            padding: 20mm;
+        }
+
+        .warnings-header {
+            text-align: center;
+            margin-bottom: 15mm;
+            padding-bottom: 5mm;
+            border-bottom: 3px solid #ff6b6b;
+        }
+
+        .warnings-header h1 {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 28pt;
+            color: #c92a2a;
+            margin-bottom: 5mm;
+        }
+
+        .warnings-header p {
+            font-size: 12pt;
+            color: #666;
+        }
+
+        .warning-item {
+            background: linear-gradient(135deg, #fff5f5 0%, #ffe3e3 100%);
+            border-left: 4px solid #ff6b6b;
+            border-radius: 8px;
+            padding: 10px 15px;
+            margin-bottom: 10px;
+        }
+
+        .warning-candle-name {
+            font-family: 'Cormorant Garamond', serif;
+            font-size: 14pt;
+            font-weight: 700;
+            color: #c92a2a;
+            margin-bottom: 5px;
+        }
+
+        .warning-list {
+            list-style: none;
+            padding-left: 0;
+        }
+
+        .warning-list li {
+            font-size: 10pt;
+            color: #333;
+            padding: 3px 0;
+            padding-left: 20px;
+            position: relative;
+        }
+
+        .warning-list li:before {
+            content: '⚠';
+            position: absolute;
+            left: 0;
+            color: #ff922b;
+        }
+
+        /* Уже занятая ячейка начатого листа: место в сетке без содержимого */
+        .slot-used {
+            visibility: hidden;
+        }
+
+        /* Предпросмотр: листы-заглушки до загрузки и плашка о том, что это не документ для печати */
+        .page-preview {
+            background: #f4f0f7;
+        }
+
+        .preview-notice {
+            position: sticky;
+            top: 0;
+            z-index: 10;
+            padding: 10px 20px;
+            background: #2d0a3d;
+            color: #f3e5ff;
+            font-size: 10pt;
+            text-align: center;
+        }
+
+        @media print {
+            .preview-notice {
+                display: none;
+            }
+        }
+
+        @media screen {
+            .page-labels, .page-instructions, .warnings-page {
+                margin: 20px auto;
+                box-shadow: 0 0 20px rgba(0,0,0,0.5);
+            }
+        }
+"""
+
+# Профиль print-fast (style_profiles.py): дописывается после LABELS_CSS и сохраняет геометрию.
+# Градиенты заменены их средним цветом, тени и размытие убраны, искры - одна готовая картинка
+# вместо слоёв radial-gradient в ::before
+PRINT_FAST_CSS = Template("""
+        /* print-fast */
+        .label {{
+            background: #fae2f7 url("{label_sparkles}") 0 0 / 100% 100% no-repeat;
+        }}
+
+        .label::before,
+        .instruction-card::before {{
+            display: none;
+        }}
+
+        .divider {{
+            background: #d3a3c1;
+        }}
+
+        .instruction-card {{
+            background: #f7e7fc url("{instruction_sparkles}") 0 0 / 100% 100% no-repeat;
+            box-shadow: none;
+        }}
+
+        .instruction-section {{
+            background: #f8e9fc;
+            backdrop-filter: none;
+        }}
+
+        .instruction-spell {{
+            background: #eed8ef;
+        }}
+
+        .warning-item {{
+            background: #fff0f0;
+        }}
+
+        @media screen {{
+            .page-labels, .page-instructions, .warnings-page {{
+                box-shadow: none;
+            }}
+        }}
+""")
+
+# Версия стилей по содержимому - входит в TEMPLATE_VERSION
+LABELS_CSS_HASH = hashlib.sha256(LABELS_CSS.encode('utf-8')).hexdigest()[:12]
+
+DOCUMENT_HEAD = Template("""
+<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Этикетки для свечей - АРТ-СВЕЧИ Мастерская Чародейки</title>
+{fonts}{stylesheet}{layout_styles}{image_styles}</head>
+<body>
+""")
+
+# Стили документа: встроенные (автономный файл) или ссылка на кэшируемый файл
+STYLESHEET_INLINE = Template("""    <style>
+{css}    </style>
+""")
+
+STYLESHEET_LINK = Template("""    <link href="{url}" rel="stylesheet">
+""")
+
+DOCUMENT_TAIL = Template("""
+</body>
+</html>
+""")
+
+# Страница предупреждений
+WARNINGS_PAGE = Template("""    <!-- СТРАНИЦА ПРЕДУПРЕЖДЕНИЙ -->
+    <div class="page warnings-page">
+        <div class="warnings-header">
+            <h1>⚠ Предупреждения о переполнении текста</h1>
+            <p>Найдено проблем в {problem_count} свечах из {candle_count}</p>
+        </div>
+{items}    </div>
+
+""")
+
+WARNING_ITEM = Template("""
+        <div class="warning-item">
+            <div class="warning-candle-name">{name}</div>
+            <ul class="warning-list">
+{warnings}            </ul>
+        </div>
+""")
+
+WARNING_LINE = Template("""                <li>{warning}</li>
+""")
+
+# Листы
+LABELS_PAGE = Template("""    <!-- СТРАНИЦА {page_number}: Этикетки -->
+    <div class="page page-labels {layout_class}">
+{cards}    </div>
+
+""")
+
+INSTRUCTIONS_PAGE = Template("""    <!-- СТРАНИЦА {page_number}: Инструкции -->
+    <div class="page page-instructions {layout_class}">
+{cards}    </div>
+
+""")
+
+# Ячейка, занятая на начатом листе (start_slot)
+USED_SLOT = Template("""
+        <div class="slot-used"></div>
+""")
+
+# Предпросмотр: пустые листы с номерами, разметку листов скрипт подгружает фрагментами при прокрутке
+PREVIEW_NOTICE = Template("""    <div class="preview-notice">Предпросмотр: {page_count} листов, они загружаются при прокрутке. Для печати откройте полный документ.</div>
+
+""")
+
+PREVIEW_PAGE = Template("""    <div class="page {page_class} {layout_class} page-preview" data-page="{page_number}"></div>
+""")
+
+PREVIEW_SCRIPT = Template("""
+    <script>
+    (function () {{
+        var fragmentUrl = {fragment_url};
+        var pagesPerFragment = {pages_per_fragment};
+        var requested = {{}};
+
+        function placeholder(number) {{
+            return document.querySelector('.page-preview[data-page="' + number + '"]');
+        }}
+
+        function load(number) {{
+            var start = number - (number - 1) % pagesPerFragment;
+            if (requested[start]) return;
+            requested[start] = true;
+            fetch(fragmentUrl + "?start=" + start + "&count=" + pagesPerFragment)
+                .then(function (response) {{
+                    if (!response.ok) throw new Error("HTTP " + response.status);
+                    return response.text();
+                }})
+                .then(function (html) {{
+                    var fragment = document.createElement("template");
+                    fragment.innerHTML = html;
+                    fragment.content.querySelectorAll(".page").forEach(function (page, index) {{
+                        var target = placeholder(start + index);
+                        if (target) {{
+                            observer.unobserve(target);
+                            target.replaceWith(page);
+                        }}
+                    }});
+                }})
+                .catch(function (error) {{
+                    // Повтор при следующем появлении листа на экране
+                    requested[start] = false;
+                    console.error("Preview pages " + start + ": " + error.message);
+                }});
+        }}
+
+        var observer = new IntersectionObserver(function (entries) {{
+            entries.forEach(function (entry) {{
+                if (entry.isIntersecting) load(Number(entry.target.dataset.page));
+            }});
+        }}, {{ rootMargin: "100% 0px" }});
+
+        document.querySelectorAll(".page-preview").forEach(function (page) {{
+            observer.observe(page);
+        }});
+    }})();
+    </script>
+""")
+
+# Этикетка
+LABEL_CARD = Template("""
+        <div class="label">
+            <div class="label-header">
+                <div class="label-category">{category}</div>
+                <div class="{name_class}">{number}. {title}</div>
+                {tagline}
+            </div>
+            <div class="label-logo-area">
+                {logo}
+            </div>
+            <div class="label-description {description_class}">
+                {description}
+            </div>
+            <div class="divider"></div>
+            <div class="label-footer">
+                <div class="label-brand">
+                    <div class="label-brand-name">{brand_name}</div>
+                    <div class="label-website">{website}</div>
+                </div>
+                <div class="label-qr-row">
+                    <div class="label-qr">
+                        {qr}
+                    </div>
+                    <div class="label-qr-text">
+                        Группа<br>ВК
+                    </div>
+                </div>
+            </div>
+        </div>
+""")
+
+LABEL_TAGLINE = Template("""<div class="label-tagline">{tagline}</div>""")
+
+# Инструкция
+INSTRUCTION_CARD = Template("""
+        <div class="instruction-card">
+            <div class="instruction-header">
+                <div class="instruction-logo">
+                    {logo}
+                </div>
+                <div class="instruction-title">
+                    <h2 class="{title_class}">{title}</h2>
+                    {tagline}
+                </div>
+                <div class="instruction-qr">
+                    {qr}
+                </div>
+            </div>
+            <div class="instruction-content">
+                {description}
+                {practice}
+                {ritual}
+            </div>
+            <div class="instruction-footer">
+                <div class="instruction-brand">{brand_name}</div>
+                <div class="instruction-website">{website}</div>
+            </div>
+        </div>
+""")
+
+INSTRUCTION_TAGLINE = Template("""<div class="instruction-subtitle">{tagline}</div>""")
+
+INSTRUCTION_DESCRIPTION = Template("""<div class="instruction-section {size_class}">
+                    <h3>Описание</h3>
+                    <p>{text}</p>
+                </div>""")
+
+INSTRUCTION_PRACTICE = Template("""<div class="instruction-section {size_class}">
+                    <h3>Как работать</h3>
+                    <p>{text}</p>
+                </div>""")
+
+INSTRUCTION_RITUAL = Template("""<div class="instruction-spell {size_class}">
+                    <h3>Заговор</h3>
+                    <p>{text}</p>
+                </div>""")
+
+# Шрифты документа (web_fonts.py): файл со ссылками на подмножества или встроенные data URL
+FONT_FACE = Template("""        /* {role} */
+        @font-face {{
+            font-family: '{family}';
+            font-style: {style};
+            font-weight: {weight};
+            font-display: block;
+            src: url({url}) format('woff');
+        }}
+""")
+
+# Сетки листов (см. layouts.layout_css)
+LAYOUT_STYLES = Template("""    <style id="label-layouts">
+{rules}    </style>
+""")
+
+LAYOUT_RULE = Template("""        /* {title} */
+        .{css_class} {{
+            width: {page_width};
+            height: {page_height};
+            padding: {padding};
+            grid-template-columns: repeat({columns}, {card_width});
+            grid-template-rows: repeat({rows}, {card_height});
+            gap: {gap};
+        }}
+        .{css_class} > .{card_class} {{
+            width: {card_width};
+            height: {card_height};
+        }}
+""")
+
+# Картинки
+IMAGE_INLINE = Template("""<img src="{src}" alt="{alt}">""")
+
+IMAGE_SHARED = Template("""<span class="img-ref {css_class}" role="img" aria-label="{alt}"></span>""")
+
+IMAGE_STYLES = Template("""    <style id="label-images">
+{rules}    </style>
+""")
+
+IMAGE_RULE = Template("""        .{css_class} {{ background-image: url("{src}"); }}
+""")
+
+# Версия шаблонов и стилей - часть ключа кэша готовых фрагментов
+TEMPLATE_VERSION = hashlib.sha256(
+    ''.join(t.source for t in list(globals().values()) if isinstance(t, Template)).encode('utf-8')
+    + LABELS_CSS_HASH.encode('utf-8')
+).hexdigest()[:12]
+
+# Минификация (GenerateLabelsRequest.minify): шаблоны и стили сжимаются один раз при загрузке,
+# значения полей не трогаются - поэтому разница в размере зависит только от числа рендеров шаблонов
+
+def minify_html(source: str) -> str:
+    """
+    Без комментариев и отступов: перевод строки с пробелами вокруг убирается на границе тега
+    или поля шаблона, внутри текста заменяется одним пробелом
+    """
+    source = re.sub(r'<!--.*?-->', '', source, flags=re.S)
+    source = re.sub(r'\s*\n\s*', '\n', source.strip())
+    source = re.sub(r'(?<=[>}])\n|\n(?=[<{])', '', source)
+    source = re.sub(r'(?<=})[ \t]+(?=<)', '', source)
+    return source.replace('\n', ' ')
+
+def minify_css(source: str) -> str:
+    """Без комментариев, переводов строк и пробелов вокруг { } ; , > и после двоеточия"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+def script_string(value: str) -> str:
+    """Строка для вставки в <script>: литерал JSON, '<' экранирован, чтобы не закрыть тег"""
+    return json.dumps(value).replace('<', '\\u003c')
+
+def minify_script(source: str) -> str:
+    """В скрипте переводы строк значимы (комментарии //), убираются только отступы"""
+    return re.sub(r'\n\s+', '\n', source.strip())
+
+# Шаблоны со стилями и скриптом сжимаются по своим правилам, остальные - как разметка
+CSS_TEMPLATES = ('FONT_FACE', 'LAYOUT_RULE', 'IMAGE_RULE', 'PRINT_FAST_CSS')
+SCRIPT_TEMPLATES = ('PREVIEW_SCRIPT',)
+
+def _minify_template(name: str, template: Template) -> Template:
+    if name in CSS_TEMPLATES:
+        return Template(minify_css(template.source), template.fields)
+    if name in SCRIPT_TEMPLATES:
+        return Template(minify_script(template.source), template.fields)
+    return Template(minify_html(template.source), template.fields)
+
+_TEMPLATES = {name: value for name, value in list(globals().items()) if isinstance(value, Template)}
+
+# Наборы шаблонов документа: обычный и минифицированный, с одинаковыми именами
+STANDARD = SimpleNamespace(minify=False, **_TEMPLATES)
+MINIFIED = SimpleNamespace(minify=True, **{name: _minify_template(name, value) for name, value in _TEMPLATES.items()})
+
+def templates(minify: bool = False) -> SimpleNamespace:
+    return MINIFIED if minify else STANDARD
@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Tuple
+import label_templates as tpl
+
+class SheetLayout(NamedTuple):
+    """
+    Геометрия листа заготовок: сетка карточек, их размер, поля и промежутки (всё в мм).
+    Дизайн карточек рассчитан на этикетку 70×99 и инструкцию 92.5×136 - подбор текста
+    (text_fitting) ведётся для этих размеров, поэтому карточки других макетов должны быть близки к ним
+    """
+    name: str
+    title: str
+    kind: str  # 'label' или 'instruction'
+    columns: int
+    rows: int
+    card_width: float
+    card_height: float
+    margin_top: float = 0
+    margin_left: float = 0
+    column_gap: float = 0
+    row_gap: float = 0
+    page_width: float = 210
+    page_height: float = 297
+
+    @property
+    def per_page(self) -> int:
+        return self.columns * self.rows
+
+    @property
+    def css_class(self) -> str:
+        return f"layout-{self.name}"
+
+    def card_position(self, index: int) -> Tuple[float, float]:
+        """Левый верхний угол карточки index на листе (мм от левого верхнего угла листа)"""
+        row, column = divmod(index, self.columns)
+        return (
+            self.margin_left + column * (self.card_width + self.column_gap),
+            self.margin_top + row * (self.card_height + self.row_gap),
+        )
+
+# Поддерживаемые заготовки. Новая заготовка - новая запись здесь, без изменений кода
+LAYOUTS: Dict[str, SheetLayout] = {layout.name: layout for layout in [
+    SheetLayout('a4-3x3', "A4, 9 этикеток 70×99 мм", 'label', 3, 3, 70, 99),
+    SheetLayout('a4-3x2', "A4, 6 этикеток 70×99 мм (2 ряда по центру)", 'label', 3, 2, 70, 99,
+                margin_top=49.5),
+    SheetLayout('a4-2x2', "A4, 4 инструкции 92.5×136 мм", 'instruction', 2, 2, 92.5, 136,
+                margin_top=10, margin_left=10, column_gap=5, row_gap=5),
+]}
+
+DEFAULT_LAYOUTS = {
+    'label': LAYOUTS['a4-3x3'],
+    'instruction': LAYOUTS['a4-2x2'],
+}
+
+def resolve_layout(kind: str, name: Optional[str] = None, per_page: Optional[int] = None) -> SheetLayout:
+    """
+    Макет листа вида kind: по имени, по числу карточек на листе или по умолчанию.
+    ValueError, если подходящего макета нет
+    """
+    if name:
+        layout = LAYOUTS.get(name)
+        if layout is None or layout.kind != kind:
+            raise ValueError(f"Unknown {kind} layout: {name}")
+        return layout
+    if per_page:
+        for layout in LAYOUTS.values():
+            if layout.kind == kind and layout.per_page == per_page:
+                return layout
+        raise ValueError(f"No {kind} layout with {per_page} cards per page")
+    return DEFAULT_LAYOUTS[kind]
+
+def _mm(value: float) -> str:
+    return f"{value:g}mm"
+
+@lru_cache(maxsize=None)
+def layout_css(layout: SheetLayout, minify: bool = False) -> str:
+    """CSS сетки листа для макета (считается один раз на макет)"""
+    card_class = 'label' if layout.kind == 'label' else 'instruction-card'
+    return tpl.templates(minify).LAYOUT_RULE.render(
+        title=layout.title,
+        css_class=layout.css_class,
+        card_class=card_class,
+        page_width=_mm(layout.page_width),
+        page_height=_mm(layout.page_height),
+        padding=f"{_mm(layout.margin_top)} {_mm(layout.margin_left)}",
+        columns=layout.columns,
+        rows=layout.rows,
+        card_width=_mm(layout.card_width),
+        card_height=_mm(layout.card_height),
+        gap=f"{_mm(layout.row_gap)} {_mm(layout.column_gap)}",
+    )
+
+def layouts_css(*layouts: SheetLayout, minify: bool = False) -> str:
+    """Блок <style> с сетками макетов документа"""
+    return tpl.templates(minify).LAYOUT_STYLES.render(
+        rules=''.join(layout_css(layout, minify) for layout in dict.fromkeys(layouts))
+    )
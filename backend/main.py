@@ -1,10 +1,13 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, status
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import func, or_
+from contextlib import asynccontextmanager
 from typing import List, Optional
+import asyncio
 import os
 import shutil
 from datetime import datetime
@@ -12,16 +15,70 @@ import csv
 import json
 import io
 
-from database import get_db, engine
-from models import Base, Category, Candle, LabelSet, LabelSetCandle
+from database import get_db, engine, SessionLocal
+from models import Base, Category, Candle, LabelSet, LabelSetCandle, GenerationJob
 import schemas
-from label_generator import generate_labels_html
+from label_generator import (
+    cache_document, document_fingerprint, iter_preview_html, plan_pages_html, PREVIEW_PAGES_PER_FRAGMENT,
+    image_cache, fragment_cache, document_cache,
+)
+from render_plan import compute_text_fit, refresh_text_fit
+from text_fitting import FIT_VERSION
+from generation import LabelDocument, MEDIA_TYPES, FILE_EXTENSIONS, prepare_document
+from jobs import create_job, resume_jobs, shutdown_job_executor, job_result_path
+from estimates import estimate_document
+from previews import create_preview, get_preview, preview_cache
+from layouts import LAYOUTS, DEFAULT_LAYOUTS
+from web_fonts import fonts_stylesheet, find_web_font, embedded_fonts_css
+from image_processing import create_print_derivative
+from qr_codes import qr_svg
+from style_profiles import STYLE_PROFILES, profile_stylesheet, find_profile_stylesheet
+from config import settings
 from auth import authenticate_user, get_current_user
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Labels Generator API", version="1.0.0")
+def refresh_stale_text_fits():
+    """
+    Пересчитывает подбор текста у свечей без него или с другой версией подбора
+    (после миграции, смены шрифтов или геометрии карточек)
+    """
+    db = SessionLocal()
+    try:
+        stale = db.query(Candle).filter(
+            or_(Candle.text_fit_version.is_(None), Candle.text_fit_version != FIT_VERSION)
+        ).all()
+        for candle in stale:
+            text_fit = compute_text_fit(candle)
+            # Даты изменения не трогаем: сама свеча не менялась. Явное присваивание отменяет onupdate
+            # модели, триггер update_timestamps в PostgreSQL такие обновления тоже пропускает
+            db.query(Candle).filter(Candle.id == candle.id).update({
+                Candle.text_fit: text_fit,
+                Candle.text_fit_version: FIT_VERSION,
+                Candle.has_overflow: bool(text_fit['warnings']),
+                Candle.updated_at: Candle.updated_at,
+                Candle.last_modified_at: Candle.last_modified_at,
+            }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresh_stale_text_fits()
+    # Подмножества шрифтов готовятся при запуске, а не на первом документе
+    fonts_stylesheet()
+    # Стили профилей - обычные и минифицированные: статика минифицируется один раз на процесс
+    for profile in STYLE_PROFILES:
+        for minify in (False, True):
+            profile_stylesheet(profile, minify)
+    embedded_fonts_css(minify=True)
+    resume_jobs()
+    yield
+    shutdown_job_executor()
+
+app = FastAPI(title="Labels Generator API", version="1.0.0", lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -30,6 +87,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Расход листов из /api/generate-labels читает фронтенд
+    expose_headers=["X-Label-Sheets", "X-Label-Free-Slots", "X-Instruction-Sheets", "X-Instruction-Free-Slots",
+                    "X-Minify-Saved-Bytes"],
 )
 
 # Root endpoint
@@ -105,6 +165,30 @@ def get_candles(
     candles = query.offset(skip).limit(limit).all()
     return candles
 
+@app.get("/api/candles/overflow-report", response_model=schemas.OverflowReport)
+def get_overflow_report(
+    is_active: Optional[bool] = True,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Свечи, текст которых не помещается на карточках (по сохранённому подбору, без рендера)"""
+    query = db.query(
+        Candle.id, Candle.sequence_number, Candle.name, Candle.display_name, Candle.text_fit
+    ).filter(Candle.has_overflow.is_(True))
+    if is_active is not None:
+        query = query.filter(Candle.is_active == is_active)
+
+    candles = [
+        schemas.OverflowReportItem(
+            id=row.id,
+            sequence_number=row.sequence_number,
+            name=row.display_name or row.name,
+            warnings=row.text_fit['warnings'],
+        )
+        for row in query.order_by(Candle.sequence_number.asc()).all()
+    ]
+    return schemas.OverflowReport(total=len(candles), candles=candles)
+
 @app.get("/api/candles/{candle_id}", response_model=schemas.Candle)
 def get_candle(
     candle_id: int,
@@ -133,6 +217,7 @@ def create_candle(
         candle_data['sequence_number'] = (max_seq or 0) + 1
 
     db_candle = Candle(**candle_data)
+    refresh_text_fit(db_candle)
     db.add(db_candle)
 
     try:
@@ -161,6 +246,7 @@ def update_candle(
 
     for field, value in update_data.items():
         setattr(db_candle, field, value)
+    refresh_text_fit(db_candle)
 
     try:
         db.commit()
@@ -260,7 +346,18 @@ async def upload_logo(
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    return {"filename": filename, "url": f"/uploads/logos/{filename}"}
+    # Печатная копия: без метаданных, уменьшенная до размера на этикетке
+    try:
+        print_path = create_print_derivative(file_path, "logo")
+    except Exception:
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail="Файл не является корректным изображением")
+
+    return {
+        "filename": filename,
+        "url": f"/uploads/logos/{filename}",
+        "print_url": f"/uploads/logos/{os.path.basename(print_path)}",
+    }
 
 @app.post("/api/upload/qr")
 async def upload_qr(
@@ -287,25 +384,362 @@ async def upload_qr(
     with open(file_path, "wb") as buffer:
         shutil.copyfileobj(file.file, buffer)
 
-    return {"filename": filename, "url": f"/uploads/qr/{filename}"}
+    # Печатная копия: без метаданных, уменьшенная до размера на этикетке
+    try:
+        print_path = create_print_derivative(file_path, "qr")
+    except Exception:
+        os.remove(file_path)
+        raise HTTPException(status_code=400, detail="Файл не является корректным изображением")
+
+    return {
+        "filename": filename,
+        "url": f"/uploads/qr/{filename}",
+        "print_url": f"/uploads/qr/{os.path.basename(print_path)}",
+    }
+
+# QR code endpoint
+@app.get("/api/qr")
+def get_qr_code(
+    data: str,
+    current_user: str = Depends(get_current_user)
+):
+    """Векторный QR код (SVG) для предпросмотра поля qr_data"""
+    if not data or len(data) > 500:
+        raise HTTPException(status_code=400, detail="Некорректные данные для QR кода")
+
+    return Response(
+        content=qr_svg(data),
+        media_type="image/svg+xml",
+        headers={"Cache-Control": "private, max-age=86400"}
+    )
 
 # Generate labels endpoint
+def etag_matches(if_none_match: Optional[str], fingerprint: str) -> bool:
+    """
+    Проверка заголовка If-None-Match (список ETag, слабые W/). '*' не подходит:
+    он для условной записи, а не для проверки кэша сгенерированного документа
+    """
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.removeprefix("W/") == f'"{fingerprint}"':
+            return True
+    return False
+
+def public_base_url(http_request: Request) -> str:
+    """Внешний адрес backend: документ открывается из blob: URL, поэтому ссылки должны быть абсолютными"""
+    return (settings.public_base_url or str(http_request.base_url)).rstrip("/")
+
+def document_stylesheet_url(http_request: Request, request: schemas.GenerateLabelsRequest) -> Optional[str]:
+    """Ссылка на стили профиля оформления; None - стили встраиваются в документ"""
+    if request.inline_css or request.style_profile not in STYLE_PROFILES:
+        return None
+    return f"{public_base_url(http_request)}/api/styles/{profile_stylesheet(request.style_profile, request.minify)[0]}"
+
+# Versioned stylesheets for generated documents (one per style profile, plain and minified)
+@app.get("/api/styles/labels.{css_hash}.css")
+def get_labels_stylesheet(css_hash: str):
+    """Стили этикеток; URL зависит от содержимого, поэтому кэшируется бессрочно"""
+    css = find_profile_stylesheet(f"labels.{css_hash}.css")
+    if css is None:
+        raise HTTPException(status_code=404, detail="Stylesheet not found")
+
+    return Response(
+        content=css,
+        media_type="text/css; charset=utf-8",
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{css_hash}"',
+        }
+    )
+
+# Self-hosted fonts for generated documents
+@app.get("/api/styles/fonts.{css_hash}.css")
+def get_fonts_stylesheet(css_hash: str):
+    """@font-face шрифтов документа; как и стили этикеток, кэшируется бессрочно"""
+    filename, css = fonts_stylesheet()
+    if filename != f"fonts.{css_hash}.css":
+        raise HTTPException(status_code=404, detail="Stylesheet not found")
+
+    return Response(
+        content=css,
+        media_type="text/css; charset=utf-8",
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{css_hash}"',
+        }
+    )
+
+@app.get("/api/styles/fonts/{filename}")
+def get_web_font(filename: str):
+    """Подмножество шрифта (кириллица и пунктуация); имя файла содержит хэш содержимого"""
+    font = find_web_font(filename)
+    if font is None:
+        raise HTTPException(status_code=404, detail="Font not found")
+
+    return Response(
+        content=font.data,
+        media_type="font/woff",
+        headers={
+            "Cache-Control": "public, max-age=31536000, immutable",
+            "ETag": f'"{filename}"',
+            # @font-face требует CORS; шрифты публичные, документ может быть открыт с любого адреса
+            "Access-Control-Allow-Origin": "*",
+        }
+    )
+
+def prepare_generation(db: Session, request: schemas.GenerateLabelsRequest, stylesheet_url: Optional[str]) -> LabelDocument:
+    """Проверка запроса на генерацию с ответом 404/400"""
+    try:
+        return prepare_document(db, request, stylesheet_url)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def sheet_headers(document: LabelDocument) -> dict:
+    """Расход листов в заголовках ответа: заголовки уходят раньше документа"""
+    headers = {}
+    for kind, (sheets, free_slots) in document.sheet_usage().items():
+        prefix = "X-Label" if kind == "label" else "X-Instruction"
+        headers[f"{prefix}-Sheets"] = str(sheets)
+        headers[f"{prefix}-Free-Slots"] = str(free_slots)
+    return headers
+
 @app.post("/api/generate-labels")
 def generate_labels(
     request: schemas.GenerateLabelsRequest,
+    http_request: Request,
     current_user: str = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    candles = db.query(Candle).filter(Candle.id.in_(request.candle_ids)).all()
+    stylesheet_url = document_stylesheet_url(http_request, request)
+
+    document = prepare_generation(db, request, stylesheet_url)
+    if request.preview:
+        return preview_response(document, http_request)
+
+    # Повторная генерация того же набора: 304 или готовый документ из кэша
+    fingerprint = document.fingerprint()
+    headers = {"ETag": f'"{fingerprint}"', "Cache-Control": "private, no-cache", **sheet_headers(document)}
+    if document.output_format == "pdf":
+        headers["Content-Disposition"] = 'inline; filename="labels.pdf"'
+    elif document.output_format in ("svg", "png"):
+        headers["Content-Disposition"] = f'attachment; filename="labels-{document.output_format}.zip"'
+
+    if etag_matches(http_request.headers.get("if-none-match"), fingerprint):
+        return Response(status_code=304, headers=headers)
+
+    # Экономия минификации считается по плану, не дожидаясь документа
+    if document.minify:
+        headers["X-Minify-Saved-Bytes"] = str(document.minify_saved_bytes())
+
+    cached_document = document_cache.get(fingerprint)
+    if cached_document is not None:
+        return Response(content=cached_document, media_type=document.media_type, headers=headers)
+
+    return StreamingResponse(
+        cache_document(fingerprint, document.chunks()),
+        media_type=document.media_type,
+        headers=headers
+    )
 
-    if not candles:
-        raise HTTPException(status_code=404, detail="No candles found")
+def preview_response(document: LabelDocument, http_request: Request) -> HTMLResponse:
+    """Оболочка предпросмотра: план сохраняется под токеном, листы отдаёт /api/preview/{token}/pages"""
+    plan = document.plan()
+    token = create_preview(plan, document.image_mode, document.minify)
+    fragment_url = f"{public_base_url(http_request)}/api/preview/{token}/pages"
+    return HTMLResponse(
+        content=''.join(iter_preview_html(plan, document.image_mode, document.stylesheet_url, fragment_url,
+                                          document.minify)),
+        headers={"Cache-Control": "no-store", **sheet_headers(document)}
+    )
+
+@app.get("/api/preview/{token}/pages", response_class=HTMLResponse)
+def get_preview_pages(token: str, start: int = 1, count: int = PREVIEW_PAGES_PER_FRAGMENT):
+    """
+    Листы предпросмотра с номера start (не больше count). Без авторизации:
+    оболочка открыта из blob: URL, доступ даёт только токен предпросмотра (см. previews.create_preview)
+    """
+    preview = get_preview(token)
+    if preview is None:
+        raise HTTPException(status_code=404, detail="Preview not found or expired")
+    if not 1 <= start <= len(preview.plan.pages):
+        raise HTTPException(status_code=400, detail=f"start must be between 1 and {len(preview.plan.pages)}")
+    if not 1 <= count <= 4 * PREVIEW_PAGES_PER_FRAGMENT:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {4 * PREVIEW_PAGES_PER_FRAGMENT}")
 
-    if request.format == "html":
-        html_content = generate_labels_html(candles, request.labels_per_page, request.print_type)
-        return HTMLResponse(content=html_content)
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported format")
+    return HTMLResponse(
+        content=plan_pages_html(preview.plan, preview.image_mode, start, count, preview.minify),
+        # План под токеном не меняется
+        headers={"Cache-Control": "private, max-age=3600"}
+    )
+
+@app.post("/api/render-plan")
+def get_render_plan(
+    request: schemas.GenerateLabelsRequest,
+    http_request: Request,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    План документа без разметки (render_plan): листы, ячейки, карточки с классами размеров.
+    Параметры как у /api/generate-labels; format, image_mode и inline_css на план не влияют
+    """
+    document = prepare_generation(db, request, None)
+    fingerprint = document_fingerprint(document.candles, document.label_layout, document.print_type,
+                                       output_format="plan", instruction_layout=document.instruction_layout,
+                                       **document.plan_options)
+    headers = {"ETag": f'"{fingerprint}"', "Cache-Control": "private, no-cache", **sheet_headers(document)}
+    if etag_matches(http_request.headers.get("if-none-match"), fingerprint):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=document.plan().to_dict(), headers=headers)
+
+@app.post("/api/generate-labels/estimate", response_model=schemas.GenerationEstimate)
+def estimate_generation(
+    request: schemas.GenerateLabelsRequest,
+    http_request: Request,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Пробный запуск: листы, предупреждения, размер и время рендера документа
+    по метаданным, без рендера и чтения картинок. Параметры как у /api/generate-labels
+    """
+    document = prepare_generation(db, request, document_stylesheet_url(http_request, request))
+    return estimate_document(db, document)
+
+# Background generation jobs
+@app.post("/api/jobs/generate-labels", response_model=schemas.GenerationJob, status_code=202)
+def create_generation_job(
+    request: schemas.GenerateLabelsRequest,
+    http_request: Request,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Генерация в фоне: параметры как у /api/generate-labels, ответ - задача для опроса"""
+    stylesheet_url = document_stylesheet_url(http_request, request)
+
+    if request.preview:
+        raise HTTPException(status_code=400, detail="Preview is not available for background jobs")
+
+    # Ошибки запроса - сразу, а не в статусе задачи
+    prepare_generation(db, request, stylesheet_url)
+    return create_job(db, request, stylesheet_url)
+
+def get_job_or_404(db: Session, job_id: str) -> GenerationJob:
+    job = db.get(GenerationJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/jobs/{job_id}", response_model=schemas.GenerationJob)
+def get_generation_job(
+    job_id: str,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Состояние задачи и прогресс (листов готово / всего)"""
+    return get_job_or_404(db, job_id)
+
+@app.get("/api/jobs/{job_id}/events")
+def get_generation_job_events(
+    job_id: str,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Прогресс задачи как Server-Sent Events; поток закрывается, когда задача выполнена или упала.
+    Генератор асинхронный: открытый поток не держит поток пула, он нужен только на чтение из базы
+    """
+    get_job_or_404(db, job_id)
+
+    def read_state():
+        with SessionLocal() as session:
+            job = session.get(GenerationJob, job_id)
+            if job is None:
+                return None, True
+            return schemas.GenerationJob.model_validate(job).model_dump_json(), job.status in ("done", "failed")
+
+    async def events():
+        last = None
+        while True:
+            state, finished = await run_in_threadpool(read_state)
+            if state is None:
+                return
+            if state != last:
+                yield f"event: progress\ndata: {state}\n\n"
+                last = state
+            else:
+                # Комментарий не даёт прокси закрыть соединение
+                yield ": keep-alive\n\n"
+            if finished:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.get("/api/jobs/{job_id}/result")
+def get_generation_job_result(
+    job_id: str,
+    current_user: str = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Готовый документ задачи"""
+    job = get_job_or_404(db, job_id)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+
+    path = job_result_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="Job result expired")
+
+    headers = {}
+    if job.minify_saved_bytes is not None:
+        headers["X-Minify-Saved-Bytes"] = str(job.minify_saved_bytes)
+
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[job.output_format],
+        filename=f"labels.{FILE_EXTENSIONS[job.output_format]}",
+        content_disposition_type="inline",
+        headers=headers,
+    )
+
+# Sheet layouts
+@app.get("/api/layouts", response_model=List[schemas.SheetLayoutInfo])
+def get_layouts(
+    current_user: str = Depends(get_current_user)
+):
+    """Поддерживаемые макеты листов этикеток и инструкций"""
+    return [
+        schemas.SheetLayoutInfo(
+            name=layout.name,
+            title=layout.title,
+            kind=layout.kind,
+            columns=layout.columns,
+            rows=layout.rows,
+            per_page=layout.per_page,
+            card_width=layout.card_width,
+            card_height=layout.card_height,
+            is_default=DEFAULT_LAYOUTS[layout.kind] is layout,
+        )
+        for layout in LAYOUTS.values()
+    ]
+
+# Cache statistics endpoint
+@app.get("/api/cache/stats")
+def get_cache_stats(
+    current_user: str = Depends(get_current_user)
+):
+    """Статистика кэшей генератора этикеток"""
+    return {
+        "images": image_cache.stats(),
+        "fragments": fragment_cache.stats(),
+        "documents": document_cache.stats(),
+        "previews": preview_cache.stats(),
+    }
 
 # Bulk import endpoint
 @app.post("/api/candles/import")
@@ -355,11 +789,13 @@ async def import_candles(
                         'brand_name': row.get('brand_name', 'АРТ-СВЕЧИ'),
                         'website': row.get('website', 'art-svechi.ligardi.ru'),
                         'qr_image': row.get('qr_image', ''),
+                        'qr_data': row.get('qr_data') or None,
                         'logo_image': row.get('logo_image', ''),
                         'is_active': row.get('is_active', '1') in ['1', 'true', 'True', 'yes'],
                     }
 
                     db_candle = Candle(**candle_data)
+                    refresh_text_fit(db_candle)
                     db.add(db_candle)
                     db.commit()
                     imported_count += 1
@@ -400,11 +836,13 @@ async def import_candles(
                         'brand_name': item.get('brand_name', 'АРТ-СВЕЧИ'),
                         'website': item.get('website', 'art-svechi.ligardi.ru'),
                         'qr_image': item.get('qr_image', ''),
+                        'qr_data': item.get('qr_data') or None,
                         'logo_image': item.get('logo_image', ''),
                         'is_active': item.get('is_active', True),
                     }
 
                     db_candle = Candle(**candle_data)
+                    refresh_text_fit(db_candle)
                     db.add(db_candle)
                     db.commit()
                     imported_count += 1
@@ -430,8 +868,8 @@ def download_csv_template(
     current_user: str = Depends(get_current_user)
 ):
     """Download CSV template for bulk import"""
-    csv_content = """name,tagline,category,description,practice,ritual_text,color,scent,brand_name,website,qr_image,logo_image,is_active
-СВЕЧА ОЧИЩЕНИЯ,Путь к чистоте,Программная свеча,Свеча для глубокого очищения ауры и пространства,Зажгите свечу в тихом месте. Сосредоточьтесь на намерении очищения.,Огонь горит - очищает. Свет сияет - защищает. Да будет так.,Белый,Лаванда,АРТ-СВЕЧИ,art-svechi.ligardi.ru,/uploads/qr/qr.png,/uploads/logo/logo.png,1"""
+    csv_content = """name,tagline,category,description,practice,ritual_text,color,scent,brand_name,website,qr_image,qr_data,logo_image,is_active
+СВЕЧА ОЧИЩЕНИЯ,Путь к чистоте,Программная свеча,Свеча для глубокого очищения ауры и пространства,Зажгите свечу в тихом месте. Сосредоточьтесь на намерении очищения.,Огонь горит - очищает. Свет сияет - защищает. Да будет так.,Белый,Лаванда,АРТ-СВЕЧИ,art-svechi.ligardi.ru,/uploads/qr/qr.png,https://art-svechi.ligardi.ru,/uploads/logo/logo.png,1"""
 
     return HTMLResponse(
         content=csv_content,
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, func, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, TIMESTAMP, JSON, func, UniqueConstraint
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -29,9 +29,14 @@ class Candle(Base):
     brand_name = Column(String(100), default="АРТ-СВЕЧИ")
     website = Column(String(200), default="art-svechi.ligardi.ru")
     qr_image = Column(String(500))
+    qr_data = Column(String(500))  # Текст/ссылка для генерации QR кода на сервере
     logo_image = Column(String(500))
     quantity = Column(Integer, default=1)
     is_active = Column(Boolean, default=True)
+    # Подбор размеров текста, сохраняется при записи свечи (см. render_plan.refresh_text_fit)
+    text_fit = Column(JSON)
+    text_fit_version = Column(String(20))
+    has_overflow = Column(Boolean, default=False)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
     last_modified_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
@@ -59,3 +64,21 @@ class LabelSetCandle(Base):
 
     label_set = relationship("LabelSet", back_populates="candles")
     candle = relationship("Candle", back_populates="label_sets")
+
+class GenerationJob(Base):
+    """Фоновая генерация документа (см. jobs.py); очередь переживает перезапуск backend"""
+    __tablename__ = "generation_jobs"
+
+    id = Column(String(32), primary_key=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, done, failed
+    request = Column(JSON, nullable=False)  # GenerateLabelsRequest
+    stylesheet_url = Column(String(500))
+    output_format = Column(String(10), nullable=False)
+    pages_done = Column(Integer, default=0)
+    pages_total = Column(Integer)
+    result_size = Column(Integer)
+    minify_saved_bytes = Column(Integer)  # экономия минифицированного HTML, байт
+    error = Column(Text)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    started_at = Column(TIMESTAMP)
+    finished_at = Column(TIMESTAMP)
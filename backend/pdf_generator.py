@@ -0,0 +1,572 @@
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
+from tempfile import SpooledTemporaryFile
+from xml.sax.saxutils import escape
+import hashlib
+import logging
+import math
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.colors import Color, HexColor, white
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Paragraph
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from models import Candle
+from fonts import FONT_FILES, font_file
+from label_generator import image_file_path
+from render_plan import ImageRef, InstructionCard, LabelCard, PagePlan, RenderPlan, build_plan
+from text_fitting import (
+    LABEL_NAME, LABEL_DESCRIPTION, INSTRUCTION_TITLE, INSTRUCTION_SECTION, INSTRUCTION_SPELL, size_option,
+)
+from qr_codes import qr_matrix
+from layouts import LAYOUTS, SheetLayout, DEFAULT_LAYOUTS
+
+logger = logging.getLogger(__name__)
+
+# Карточки рисуются в размере дизайна (макеты по умолчанию), раскладка листа - из макета
+PAGE_WIDTH, PAGE_HEIGHT = A4
+LABEL_WIDTH = DEFAULT_LAYOUTS['label'].card_width * mm
+LABEL_HEIGHT = DEFAULT_LAYOUTS['label'].card_height * mm
+INSTRUCTION_WIDTH = DEFAULT_LAYOUTS['instruction'].card_width * mm
+INSTRUCTION_HEIGHT = DEFAULT_LAYOUTS['instruction'].card_height * mm
+
+PX = 0.2646 * mm  # 1 CSS px
+
+# Цвета дизайна
+PURPLE = HexColor('#5d1a75')
+DARK_PURPLE = HexColor('#2d0a3d')
+TEXT_PURPLE = HexColor('#3d0a4d')
+ROSE = HexColor('#8b2c5f')
+BROWN = HexColor('#8b4513')
+WARNING_RED = HexColor('#c92a2a')
+GOLD = HexColor('#e8b923')
+# Средний тон фона инструкции: прозрачность заменяется смешиванием с ним,
+# так как ExtGState-ресурсы reportlab (как и shading) не переносятся в Form XObject
+CARD_BACKGROUND = HexColor('#f3e5ff')
+# Плоские фоны профиля print-fast - средний цвет градиентов карточек (как в PRINT_FAST_CSS)
+FLAT_LABEL_BACKGROUND = HexColor('#fae2f7')
+FLAT_INSTRUCTION_BACKGROUND = HexColor('#f7e7fc')
+
+MIN_FONT_SIZE = 5
+GRADIENT_STEPS = 48
+
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+_registered_fonts: Dict[str, str] = {}
+
+def blend(color, alpha: float, background=CARD_BACKGROUND):
+    """Цвет color с прозрачностью alpha поверх background"""
+    return Color(
+        background.red + (color.red - background.red) * alpha,
+        background.green + (color.green - background.green) * alpha,
+        background.blue + (color.blue - background.blue) * alpha,
+    )
+
+def pdf_font(role: str) -> str:
+    """Имя шрифта reportlab для начертания (TTF регистрируется один раз на процесс)"""
+    if role not in _registered_fonts:
+        path = font_file(role)
+        if path is None:
+            raise RuntimeError(f"Не найден шрифт для PDF ({', '.join(FONT_FILES[role])})")
+        name = f"labels-{role}"
+        pdfmetrics.registerFont(TTFont(name, path))
+        _registered_fonts[role] = name
+    return _registered_fonts[role]
+
+def paragraph(text: str, role: str, size: float, leading: float, color, alignment=TA_CENTER) -> Paragraph:
+    """Абзац с экранированием текста и переносами строк как в white-space: pre-line"""
+    markup = escape(text).replace('\n', '<br/>')
+    style = ParagraphStyle(
+        name=f"{role}-{size}",
+        fontName=pdf_font(role),
+        fontSize=size,
+        leading=size * leading,
+        textColor=color,
+        alignment=alignment,
+    )
+    return Paragraph(markup, style)
+
+def fit_paragraph(text: str, role: str, size: float, leading: float, color, width: float, height: float,
+                  alignment=TA_CENTER) -> Tuple[Paragraph, float]:
+    """Уменьшает шрифт от size, пока текст не поместится в блок; возвращает абзац и его высоту"""
+    while True:
+        para = paragraph(text, role, size, leading, color, alignment)
+        _, para_height = para.wrap(width, height)
+        if para_height <= height or size <= MIN_FONT_SIZE:
+            return para, para_height
+        size -= 0.5
+
+
+class PdfLabelRenderer:
+    """
+    Рисует листы плана документа (render_plan) на canvas reportlab.
+    Фоны карточек, каждая уникальная картинка/QR и каждая карточка плана
+    оформляются как Form XObject и попадают в файл один раз, копии лишь ссылаются на них.
+    """
+
+    def __init__(self, canvas: Canvas, plan: RenderPlan):
+        self.canvas = canvas
+        self.plan = plan
+        self.forms: Dict[str, Optional[str]] = {}
+        self.cards: Dict[str, str] = {}
+        self._define_backgrounds()
+
+    # --- общие элементы ---
+
+    def _define_backgrounds(self):
+        c = self.canvas
+        # print-fast: одна заливка вместо полос градиента - меньше работы растеризатору принтера
+        flat = self.plan.style_profile == 'print-fast'
+        c.beginForm('label-bg', 0, 0, LABEL_WIDTH, LABEL_HEIGHT)
+        if flat:
+            self._rounded_fill(LABEL_WIDTH, LABEL_HEIGHT, 10 * PX, FLAT_LABEL_BACKGROUND)
+        else:
+            self._rounded_gradient(LABEL_WIDTH, LABEL_HEIGHT, 10 * PX, 160,
+                                   ['#f8f0ff', '#f3e5ff', '#ffe0f5', '#ffd4e8'], [0, 0.3, 0.6, 1])
+        c.setStrokeColor(PURPLE)
+        c.setLineWidth(3 * PX)
+        c.roundRect(1.5 * PX, 1.5 * PX, LABEL_WIDTH - 3 * PX, LABEL_HEIGHT - 3 * PX, 10 * PX, stroke=1, fill=0)
+        c.endForm()
+
+        c.beginForm('instruction-bg', 0, 0, INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT)
+        if flat:
+            self._rounded_fill(INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT, 10 * PX, FLAT_INSTRUCTION_BACKGROUND)
+        else:
+            self._rounded_gradient(INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT, 10 * PX, 135,
+                                   ['#f8f0ff', '#f3e5ff', '#ffe0f5'], [0, 0.5, 1])
+        c.endForm()
+
+    def _rounded_fill(self, width, height, radius, color):
+        c = self.canvas
+        c.setFillColor(color)
+        c.roundRect(0, 0, width, height, radius, stroke=0, fill=1)
+
+    def _rounded_gradient(self, width, height, radius, angle, colors, positions):
+        """
+        CSS linear-gradient(angle) в скруглённом прямоугольнике.
+        Градиент рисуется векторными полосами: shading-ресурсы reportlab
+        не переносятся в Form XObject, а полосы переносятся
+        """
+        c = self.canvas
+        c.saveState()
+        path = c.beginPath()
+        path.roundRect(0, 0, width, height, radius)
+        c.clipPath(path, stroke=0, fill=0)
+
+        # Ось градиента как в CSS: 0deg - вверх, 90deg - вправо, 180deg - вниз
+        radians = math.radians(angle)
+        length = abs(width * math.sin(radians)) + abs(height * math.cos(radians))
+        c.translate(width / 2, height / 2)
+        c.rotate(math.degrees(math.atan2(math.cos(radians), math.sin(radians))))
+
+        stops = [HexColor(color) for color in colors]
+        span = math.hypot(width, height)
+        step = length / GRADIENT_STEPS
+        for i in range(GRADIENT_STEPS):
+            t = (i + 0.5) / GRADIENT_STEPS
+            for k in range(len(positions) - 1):
+                if t <= positions[k + 1] or k == len(positions) - 2:
+                    local = (t - positions[k]) / (positions[k + 1] - positions[k])
+                    break
+            start, end = stops[k], stops[k + 1]
+            c.setFillColorRGB(
+                start.red + (end.red - start.red) * local,
+                start.green + (end.green - start.green) * local,
+                start.blue + (end.blue - start.blue) * local,
+            )
+            # Небольшой нахлёст полос, чтобы не было просветов при растеризации
+            c.rect(-length / 2 + i * step, -span / 2, step * 1.05, span, stroke=0, fill=1)
+        c.restoreState()
+
+    def image_form(self, path: Optional[str], kind: str) -> Optional[str]:
+        """Form XObject для картинки файла (один на документ)"""
+        file_path = image_file_path(path, kind)
+        if file_path is None:
+            return None
+        name = 'img-' + hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:10]
+        if name not in self.forms:
+            c = self.canvas
+            try:
+                reader = ImageReader(file_path)
+                c.beginForm(name, 0, 0, 1, 1)
+                c.drawImage(reader, 0, 0, 1, 1, mask='auto', preserveAspectRatio=True, anchor='c')
+                c.endForm()
+                self.forms[name] = name
+            except Exception as e:
+                logger.warning("Error embedding image %s into PDF: %s", file_path, e)
+                self.forms[name] = None
+        return self.forms[name]
+
+    def ref_form(self, key: str) -> Optional[str]:
+        """Form XObject картинки плана по ключу: QR вектором из qr_data или файл"""
+        ref: ImageRef = self.plan.images[key]
+        if ref.qr_data:
+            return self.qr_form(ref.qr_data)
+        return self.image_form(ref.path, ref.kind)
+
+    def qr_form(self, qr_data: str) -> str:
+        """Form XObject для QR из текста (вектор)"""
+        name = 'qr-' + hashlib.sha1(qr_data.encode('utf-8')).hexdigest()[:10]
+        if name not in self.forms:
+            c = self.canvas
+            matrix = qr_matrix(qr_data)
+            size = len(matrix)
+            c.beginForm(name, 0, 0, 1, 1)
+            c.setFillColor(white)
+            c.rect(0, 0, 1, 1, stroke=0, fill=1)
+            c.setFillColorRGB(0, 0, 0)
+            module = 1 / size
+            for y, row in enumerate(matrix):
+                x = 0
+                while x < size:
+                    if row[x]:
+                        start = x
+                        while x < size and row[x]:
+                            x += 1
+                        c.rect(start * module, 1 - (y + 1) * module, (x - start) * module, module, stroke=0, fill=1)
+                    else:
+                        x += 1
+            c.endForm()
+            self.forms[name] = name
+        return self.forms[name]
+
+    def place_form(self, name: Optional[str], x: float, y: float, size: float, circle: bool = False):
+        if name is None:
+            return
+        c = self.canvas
+        c.saveState()
+        if circle:
+            path = c.beginPath()
+            path.circle(x + size / 2, y + size / 2, size / 2)
+            c.clipPath(path, stroke=0, fill=0)
+        c.translate(x, y)
+        c.scale(size, size)
+        c.doForm(name)
+        c.restoreState()
+
+    def centred_line(self, text: str, role: str, size: float, color, x: float, y: float, char_space: float = 0):
+        c = self.canvas
+        c.setFillColor(color)
+        c.setFont(pdf_font(role), size)
+        c.drawCentredString(x, y, text, charSpace=char_space)
+
+    # --- этикетка ---
+
+    def draw_label(self, card: LabelCard, x: float, y: float):
+        c = self.canvas
+        c.saveState()
+        c.translate(x, y)
+        c.doForm('label-bg')
+
+        border = 3 * PX
+        pad = 3.5 * mm + border
+        width = LABEL_WIDTH - 2 * pad
+        center = LABEL_WIDTH / 2
+        top = LABEL_HEIGHT - pad
+
+        # Шапка: категория, название, слоган
+        top -= 7
+        self.centred_line(card.category.upper(), 'sans-semibold', 7, PURPLE, center, top, char_space=3 * PX)
+        top -= 1 * mm
+
+        name_size = size_option(LABEL_NAME, card.name_class)
+        para, para_height = fit_paragraph(f"{card.number}. {card.title}".upper(), 'serif-bold', name_size.font_size,
+                                          name_size.line_height, DARK_PURPLE, width, 25 * mm)
+        para.drawOn(c, pad, top - para_height)
+        top -= para_height
+
+        if card.tagline:
+            top -= 0.5 * mm
+            para, para_height = fit_paragraph(card.tagline, 'sans-italic', 7, 1.1, ROSE, width, 10 * mm)
+            para.drawOn(c, pad, top - para_height)
+            top -= para_height + 1 * mm
+        top -= 1.5 * mm
+
+        # Логотип
+        logo_size = 15 * mm
+        top -= 2 * mm + logo_size
+        self.place_form(self.ref_form(card.logo), center - logo_size / 2, top, logo_size, circle=True)
+        top -= 2 * mm
+
+        # Подвал снизу вверх: QR, сайт, бренд, разделитель
+        bottom = pad
+        qr_size = 10 * mm
+        qr_x = center - (qr_size + 2 * mm + 8 * mm) / 2
+        c.setFillColor(white)
+        c.roundRect(qr_x, bottom, qr_size, qr_size, 2 * PX, stroke=0, fill=1)
+        self.place_form(self.ref_form(card.qr), qr_x + 0.5 * mm, bottom + 0.5 * mm, qr_size - 1 * mm)
+        c.setFillColor(PURPLE)
+        c.setFont(pdf_font('sans-medium'), 6)
+        c.drawString(qr_x + qr_size + 2 * mm, bottom + qr_size / 2 + 1, "Группа")
+        c.drawString(qr_x + qr_size + 2 * mm, bottom + qr_size / 2 - 6, "ВК")
+        bottom += qr_size + 1.5 * mm
+        self.centred_line(card.website or '', 'sans', 6.5, PURPLE, center, bottom)
+        bottom += 6.5 + 1
+        self.centred_line(card.brand_name or '', 'serif-semibold', 10, BROWN, center, bottom)
+        bottom += 10 + 1 * mm
+        c.setStrokeColor(ROSE)
+        c.setLineWidth(0.5)
+        c.line(center - width * 0.3, bottom, center + width * 0.3, bottom)
+        bottom += 1 * mm
+
+        # Описание в оставшемся месте
+        desc_size = size_option(LABEL_DESCRIPTION, card.description_class)
+        size, leading = desc_size.font_size, desc_size.line_height
+        box_width = width - 3 * mm
+        box_height = max(top - bottom, 0)
+        para, para_height = fit_paragraph(card.description, 'sans-medium', size, leading, TEXT_PURPLE,
+                                          box_width, box_height)
+        self._clipped(para, pad + 1.5 * mm, bottom, box_width, box_height, top - para_height)
+        c.restoreState()
+
+    def _clipped(self, para: Paragraph, x: float, y: float, width: float, height: float, draw_y: float):
+        c = self.canvas
+        c.saveState()
+        path = c.beginPath()
+        path.rect(x, y, width, height)
+        c.clipPath(path, stroke=0, fill=0)
+        para.drawOn(c, x, draw_y)
+        c.restoreState()
+
+    # --- инструкция ---
+
+    def draw_instruction(self, card: InstructionCard, x: float, y: float):
+        c = self.canvas
+        c.saveState()
+        c.translate(x, y)
+        c.doForm('instruction-bg')
+
+        pad = 12 * PX
+        width = INSTRUCTION_WIDTH - 2 * pad
+        center = INSTRUCTION_WIDTH / 2
+        top = INSTRUCTION_HEIGHT - pad
+
+        # Шапка: логотип, заголовок, QR
+        icon = 45 * PX
+        self.place_form(self.ref_form(card.logo), pad, top - icon, icon, circle=True)
+        c.setFillColor(white)
+        c.roundRect(INSTRUCTION_WIDTH - pad - icon, top - icon, icon, icon, 4 * PX, stroke=0, fill=1)
+        self.place_form(self.ref_form(card.qr), INSTRUCTION_WIDTH - pad - icon + 2 * PX, top - icon + 2 * PX, icon - 4 * PX)
+
+        title_size = size_option(INSTRUCTION_TITLE, card.title_class)
+        title_width = width - 2 * icon - 16 * PX
+        para, title_height = fit_paragraph(card.title.upper(), 'serif-bold', title_size.font_size,
+                                           title_size.line_height, DARK_PURPLE, title_width, 30 * mm)
+        para.drawOn(c, pad + icon + 8 * PX, top - title_height)
+        header_height = title_height
+        if card.tagline:
+            para, tagline_height = fit_paragraph(card.tagline, 'sans-italic', 10, 1.2, ROSE, title_width, 15 * mm)
+            para.drawOn(c, pad + icon + 8 * PX, top - title_height - 3 * PX - tagline_height)
+            header_height += 3 * PX + tagline_height
+        top -= max(icon, header_height) + 8 * PX
+        c.setStrokeColor(blend(GOLD, 0.3))
+        c.setLineWidth(1 * PX)
+        c.line(pad, top, INSTRUCTION_WIDTH - pad, top)
+        top -= 8 * PX
+
+        # Подвал
+        bottom = pad
+        self.centred_line(card.website or '', 'sans', 8, PURPLE, center, bottom)
+        bottom += 8 + 2 * PX
+        self.centred_line(card.brand_name or '', 'serif-semibold', 11, BROWN, center, bottom, char_space=2 * PX)
+        bottom += 11 + 6 * PX
+        c.setStrokeColor(blend(GOLD, 0.2))
+        c.line(pad, bottom, INSTRUCTION_WIDTH - pad, bottom)
+        bottom += 8 * PX
+
+        # Разделы: начинаем с размеров подбора по метрикам и, если reportlab
+        # переносит иначе, одинаково уменьшаем шрифт, пока все не поместятся
+        sections = []
+        for heading, text, box, css_class, spell in (
+            ("Описание", card.description, INSTRUCTION_SECTION, card.description_class, False),
+            ("Как работать", card.practice, INSTRUCTION_SECTION, card.practice_class, False),
+            ("Заговор", card.ritual, INSTRUCTION_SPELL, card.ritual_class, True),
+        ):
+            if text:
+                option = size_option(box, css_class)
+                sections.append((heading, text, (option.font_size, option.line_height), spell))
+
+        available = top - bottom
+        text_width = width - 16 * PX
+        shrink = 0
+        while True:
+            blocks = []
+            for heading, text, (size, leading), spell in sections:
+                heading_size = (10 if spell else 11) - shrink
+                para = paragraph(text, 'serif-italic' if spell else 'sans', max(size - shrink, MIN_FONT_SIZE), leading,
+                                 DARK_PURPLE if spell else TEXT_PURPLE, TA_CENTER if spell else TA_JUSTIFY)
+                _, para_height = para.wrap(text_width, available)
+                blocks.append((heading, heading_size, para, para_height, spell))
+            total = sum(heading_size + 4 * PX + para_height + 12 * PX for _, heading_size, _, para_height, _ in blocks)
+            total += 8 * PX * max(len(blocks) - 1, 0)
+            if total <= available or max((size for _, _, (size, _), _ in sections), default=0) - shrink <= MIN_FONT_SIZE:
+                break
+            shrink += 0.5
+
+        for heading, heading_size, para, para_height, spell in blocks:
+            block_height = heading_size + 4 * PX + para_height + 12 * PX
+            if spell:
+                c.setFillColor(blend(ROSE, 0.08))
+                c.roundRect(pad, top - block_height, width, block_height, 6 * PX, stroke=0, fill=1)
+                c.setStrokeColor(ROSE)
+                c.setLineWidth(2 * PX)
+                c.line(pad, top - block_height, pad, top)
+            c.setFillColor(BROWN)
+            c.setFont(pdf_font('sans-semibold'), heading_size)
+            c.drawString(pad + 8 * PX, top - 6 * PX - heading_size, heading.upper())
+            self._clipped(para, pad + 8 * PX, bottom, text_width, max(top - bottom, 0),
+                          top - 6 * PX - heading_size - 4 * PX - para_height)
+            top -= block_height + 8 * PX
+        c.restoreState()
+
+    # --- страницы ---
+
+    def draw_warnings_page(self, all_warnings: List[Tuple[str, List[str]]], candle_count: int):
+        c = self.canvas
+        margin = 20 * mm
+        width = PAGE_WIDTH - 2 * margin
+        top = PAGE_HEIGHT - margin
+
+        para = paragraph("Предупреждения о переполнении текста", 'serif-bold', 24, 1.1, WARNING_RED)
+        # Знака ⚠ нет в антикве - выводим его рубленым шрифтом
+        para = Paragraph(f'<font name="{pdf_font("sans")}">⚠</font> {para.text}', para.style)
+        _, height = para.wrap(width, 40 * mm)
+        para.drawOn(c, margin, top - height)
+        top -= height + 5 * mm
+        self.centred_line(f"Найдено проблем в {len(all_warnings)} свечах из {candle_count}", 'sans', 12,
+                          HexColor('#666666'), PAGE_WIDTH / 2, top - 12)
+        top -= 12 + 5 * mm
+        c.setStrokeColor(HexColor('#ff6b6b'))
+        c.setLineWidth(3 * PX)
+        c.line(margin, top, PAGE_WIDTH - margin, top)
+        top -= 10 * mm
+
+        for name, warnings in all_warnings:
+            lines = [paragraph(f"⚠ {warning}", 'sans', 10, 1.3, HexColor('#333333'), TA_LEFT) for warning in warnings]
+            heights = [line.wrap(width - 10 * mm, PAGE_HEIGHT)[1] for line in lines]
+            block = 14 + 5 * PX + sum(heights) + 20 * PX
+            if top - block < margin:
+                c.showPage()
+                top = PAGE_HEIGHT - margin
+            c.setFillColor(HexColor('#fff0f0'))
+            c.roundRect(margin, top - block, width, block, 8 * PX, stroke=0, fill=1)
+            c.setFillColor(HexColor('#ff6b6b'))
+            c.rect(margin, top - block, 4 * PX, block, stroke=0, fill=1)
+            c.setFillColor(WARNING_RED)
+            c.setFont(pdf_font('serif-bold'), 14)
+            c.drawString(margin + 15 * PX, top - 10 * PX - 14, name)
+            line_top = top - 10 * PX - 14 - 5 * PX
+            for line, line_height in zip(lines, heights):
+                line.drawOn(c, margin + 15 * PX, line_top - line_height)
+                line_top -= line_height
+            top -= block + 10 * PX
+        c.showPage()
+
+    def card_form(self, key: str) -> str:
+        """
+        Карточка плана как Form XObject: рисуется один раз,
+        копии на листах лишь ссылаются на неё
+        """
+        if key not in self.cards:
+            card = self.plan.cards[key]
+            # Картинки оформляются заранее: определения форм не вкладываются друг в друга
+            self.ref_form(card.logo)
+            self.ref_form(card.qr)
+            name = f"card-{len(self.cards)}"
+            c = self.canvas
+            if isinstance(card, LabelCard):
+                c.beginForm(name, 0, 0, LABEL_WIDTH, LABEL_HEIGHT)
+                self.draw_label(card, 0, 0)
+            else:
+                c.beginForm(name, 0, 0, INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT)
+                self.draw_instruction(card, 0, 0)
+            c.endForm()
+            self.cards[key] = name
+        return self.cards[key]
+
+    def draw_cards_page(self, page: PagePlan):
+        """
+        Лист плана по его макету; ячейки (None, n) - n уже занятых ячеек начатого листа, они пропускаются.
+        Если карточка макета отличается от размера дизайна, она равномерно масштабируется по центру места
+        """
+        kind, layout = page.kind, LAYOUTS[page.layout]
+        c = self.canvas
+        page_width, page_height = layout.page_width * mm, layout.page_height * mm
+        c.setPageSize((page_width, page_height))
+        design_width, design_height = (LABEL_WIDTH, LABEL_HEIGHT) if kind == 'label' else (INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT)
+        card_width, card_height = layout.card_width * mm, layout.card_height * mm
+        scale = min(card_width / design_width, card_height / design_height)
+        offset_x = (card_width - design_width * scale) / 2
+        offset_y = (card_height - design_height * scale) / 2
+
+        index = 0
+        for key, count in page.slots:
+            if key is None:
+                index += count
+                continue
+            name = self.card_form(key)
+            for _ in range(count):
+                left, top = layout.card_position(index)
+                c.saveState()
+                c.translate(left * mm + offset_x, page_height - top * mm - card_height + offset_y)
+                if scale != 1:
+                    c.scale(scale, scale)
+                c.doForm(name)
+                c.restoreState()
+                index += 1
+        c.showPage()
+
+
+def iter_labels_pdf(candles: List[Candle], print_type: str = 'both',
+                    label_layout: SheetLayout = DEFAULT_LAYOUTS['label'],
+                    instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                    label_start_slot: int = 0, instruction_start_slot: int = 0,
+                    packing: str = 'sequential', style_profile: str = 'standard',
+                    on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Generate a PDF with the same sheets as the HTML version, without a browser.
+
+    Pages are drawn one by one and compressed as soon as they are finished, but this is
+    not a streaming renderer: reportlab keeps every page object until canvas.save() and
+    the card forms are shared by the whole file, so memory grows with the page count and
+    the first byte is sent only after the last page is drawn. The finished file is spooled
+    (in memory up to 8 MB, then on disk) and sent in chunks.
+    on_pages(count) is called as sheets are drawn (progress of background jobs).
+    style_profile 'print-fast' draws flat card backgrounds instead of gradient bands.
+    """
+    plan = build_plan(candles, label_layout, print_type, instruction_layout,
+                      label_start_slot, instruction_start_slot, packing, style_profile)
+    yield from iter_plan_pdf(plan, on_pages)
+
+def iter_plan_pdf(plan: RenderPlan, on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    PDF-документ по плану (см. iter_labels_pdf). Файл собирается целиком и только потом
+    отдаётся частями: общие формы карточек не позволяют отдавать листы по мере готовности
+    """
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    canvas = Canvas(spool, pagesize=A4, pageCompression=1)
+    canvas.setTitle("Этикетки для свечей - АРТ-СВЕЧИ")
+    renderer = PdfLabelRenderer(canvas, plan)
+
+    if plan.warnings:
+        renderer.draw_warnings_page(plan.warnings, plan.candle_count)
+
+    for page in plan.pages:
+        renderer.draw_cards_page(page)
+        if on_pages:
+            on_pages(1)
+
+    canvas.save()
+    spool.seek(0)
+    try:
+        while True:
+            chunk = spool.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
@@ -0,0 +1,34 @@
+from typing import NamedTuple, Optional
+import secrets
+import time
+from cache import LRUCache
+from config import settings
+from render_plan import RenderPlan
+
+class Preview(NamedTuple):
+    """План документа, открытого в режиме предпросмотра; листы отдаются фрагментами по токену"""
+    plan: RenderPlan
+    image_mode: str
+    minify: bool
+    expires_at: float
+    size: int  # примерный размер плана в байтах для бюджета кэша
+
+# Предпросмотры по токену; вытесненный или просроченный предпросмотр открывается заново
+preview_cache = LRUCache(max_bytes=settings.preview_cache_max_bytes, sizeof=lambda preview: preview.size)
+
+def create_preview(plan: RenderPlan, image_mode: str, minify: bool = False) -> str:
+    """
+    Сохраняет план и возвращает токен - единственный ключ к листам предпросмотра
+    (/api/preview/{token}/pages без авторизации): случайный, живёт settings.preview_ttl_minutes.
+    Оболочка открывается из blob: URL, и токен API в неё не попадает
+    """
+    token = secrets.token_urlsafe(24)
+    expires_at = time.time() + settings.preview_ttl_minutes * 60
+    preview_cache.put(token, Preview(plan, image_mode, minify, expires_at, len(repr(plan))))
+    return token
+
+def get_preview(token: str) -> Optional[Preview]:
+    preview = preview_cache.get(token)
+    if preview is None or preview.expires_at < time.time():
+        return None
+    return preview
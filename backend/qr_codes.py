@@ -0,0 +1,46 @@
+from functools import lru_cache
+from typing import Tuple
+from urllib.parse import quote
+import qrcode
+from qrcode.constants import ERROR_CORRECT_M
+
+@lru_cache(maxsize=1024)
+def qr_matrix(payload: str) -> Tuple[Tuple[bool, ...], ...]:
+    """Матрица модулей QR кода (с тихой зоной в 1 модуль)"""
+    qr = qrcode.QRCode(error_correction=ERROR_CORRECT_M, border=1)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return tuple(tuple(row) for row in qr.get_matrix())
+
+@lru_cache(maxsize=1024)
+def qr_svg(payload: str) -> str:
+    """
+    Векторный QR код в виде компактного SVG: тёмные модули каждой строки
+    объединяются в горизонтальные отрезки одного <path> с толщиной линии в модуль
+    """
+    matrix = qr_matrix(payload)
+    size = len(matrix)
+    path = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if row[x]:
+                start = x
+                while x < size and row[x]:
+                    x += 1
+                path.append(f"M{start} {y}.5h{x - start}")
+            else:
+                x += 1
+
+    # Одинарные кавычки и без '#', чтобы SVG можно было вставить в data URL
+    return (
+        f"<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {size} {size}' shape-rendering='crispEdges'>"
+        f"<path fill='white' d='M0 0h{size}v{size}H0z'/>"
+        f"<path stroke='black' d='{''.join(path)}'/>"
+        f"</svg>"
+    )
+
+@lru_cache(maxsize=1024)
+def qr_data_url(payload: str) -> str:
+    """QR код как data URL (SVG без base64)"""
+    return "data:image/svg+xml," + quote(qr_svg(payload), safe=" '=:/.,-")
@@ -0,0 +1,521 @@
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Callable, List, Iterator, Optional
+import io
+import logging
+import math
+import zipfile
+from PIL import Image, ImageDraw, ImageFont, ImageMath, ImageOps
+from models import Candle
+from archives import iter_zip
+from cache import LRUCache
+from config import settings
+from fonts import font_file
+from label_generator import image_file_path, image_version
+from qr_codes import qr_matrix
+from render_plan import ImageRef, InstructionCard, LabelCard, PagePlan, RenderPlan, build_plan, card_digest
+from render_pool import ordered_map, render_workers
+from text_fitting import (
+    MM, PX, LABEL_NAME, LABEL_DESCRIPTION, INSTRUCTION_TITLE, INSTRUCTION_SECTION, INSTRUCTION_SPELL, TextBox, size_option,
+)
+from layouts import LAYOUTS, SheetLayout, DEFAULT_LAYOUTS
+from svg_generator import (
+    PAGE_WIDTH, PAGE_HEIGHT, LABEL_WIDTH, LABEL_HEIGHT, INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT,
+    PURPLE, DARK_PURPLE, TEXT_PURPLE, ROSE, BROWN, WARNING_RED, GOLD,
+    FLAT_LABEL_BACKGROUND, FLAT_INSTRUCTION_BACKGROUND, LABEL_GRADIENT, INSTRUCTION_GRADIENT,
+    MIN_FONT_SIZE, TextBlock, blend,
+)
+
+logger = logging.getLogger(__name__)
+
+# Растровый вывод для печати без браузера: каждый лист плана - PNG с заданным DPI, все листы - в ZIP.
+# Геометрия та же, что у SVG (svg_generator), координаты в pt переводятся в пиксели.
+# Фоны карточек, картинки и готовые карточки собираются один раз на процесс (карточки - в пределах
+# raster_card_cache_max_bytes); большие документы рендерятся в пуле процессов (render_pool)
+
+# Сколько листов рендерит одна задача пула: PNG листа кодируется долго, задачи мельче, чем у HTML
+RASTER_PAGES_PER_TASK = 4
+
+# Во сколько раз крупнее рисуются маски скруглений и кругов перед уменьшением (сглаживание краёв)
+MASK_SUPERSAMPLING = 4
+
+# Сжатие PNG: листы в основном из заливок, более сильное сжатие почти не уменьшает файл
+PNG_COMPRESS_LEVEL = 3
+
+# Нарисованные карточки в процессе рендера: ключ - отпечаток карточки, версии её картинок, профиль, DPI и размер
+card_cache = LRUCache(max_bytes=settings.raster_card_cache_max_bytes, sizeof=lambda image: image.width * image.height * 4)
+
+@lru_cache(maxsize=256)
+def font(role: str, size: float) -> ImageFont.FreeTypeFont:
+    """Шрифт начертания role (те же файлы, что у подбора текста) размером size пикселей"""
+    path = font_file(role)
+    return ImageFont.truetype(path, size) if path else ImageFont.load_default(size)
+
+def rounded_mask(width: int, height: int, radius: float, outline: float = 0) -> Image.Image:
+    """Маска скруглённого прямоугольника (outline - только обводка такой толщины внутрь)"""
+    scale = MASK_SUPERSAMPLING
+    mask = Image.new('L', (width * scale, height * scale))
+    ImageDraw.Draw(mask).rounded_rectangle(
+        (0, 0, width * scale - 1, height * scale - 1), round(radius * scale), fill=None if outline else 255,
+        outline=255 if outline else None, width=max(round(outline * scale), 1),
+    )
+    return mask.resize((width, height), Image.LANCZOS)
+
+@lru_cache(maxsize=16)
+def circle_mask(size: int) -> Image.Image:
+    """Круглая маска картинки size x size"""
+    scale = MASK_SUPERSAMPLING
+    mask = Image.new('L', (size * scale, size * scale))
+    ImageDraw.Draw(mask).ellipse((0, 0, size * scale - 1, size * scale - 1), fill=255)
+    return mask.resize((size, size), Image.LANCZOS)
+
+def hex_rgb(color: str) -> tuple:
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+def gradient_image(width: int, height: int, angle: float, colors: List[str], positions: List[float]) -> Image.Image:
+    """
+    CSS linear-gradient(angle) для блока width x height пикселей (как svg_generator.gradient).
+    Положение точки на линии градиента - линейная функция координат: считается ImageMath по
+    картам x и y, цвет - по таблице из 256 оттенков
+    """
+    radians = math.radians(angle)
+    dx, dy = math.sin(radians), -math.cos(radians)
+    length = abs(width * dx) + abs(height * dy)
+
+    xs = Image.new('F', (width, 1))
+    xs.putdata([x + 0.5 for x in range(width)])
+    ys = Image.new('F', (1, height))
+    ys.putdata([y + 0.5 for y in range(height)])
+    offset = 127.5 - (width * dx + height * dy) / 2 * 255 / length
+    position = ImageMath.eval(
+        f"x * {dx * 255 / length!r} + y * {dy * 255 / length!r} + {offset!r}",
+        x=xs.resize((width, height), Image.NEAREST), y=ys.resize((width, height), Image.NEAREST),
+    ).convert('L')
+
+    stops = list(zip(positions, (hex_rgb(color) for color in colors)))
+    table = []
+    for level in range(256):
+        t = level / 255
+        for (start, start_rgb), (end, end_rgb) in zip(stops, stops[1:]):
+            if t <= end:
+                share = (t - start) / (end - start) if end > start else 0
+                table.append(tuple(round(a + (b - a) * max(share, 0)) for a, b in zip(start_rgb, end_rgb)))
+                break
+        else:
+            table.append(stops[-1][1])
+    return Image.merge('RGB', [position.point([rgb[channel] for rgb in table]) for channel in range(3)])
+
+@lru_cache(maxsize=8)
+def card_background(kind: str, style_profile: str, dpi: int) -> Image.Image:
+    """Фон карточки вида kind с обводкой и скруглёнными углами (RGBA) - общий для всех карточек"""
+    k = dpi / 72
+    flat = style_profile == 'print-fast'
+    if kind == 'label':
+        width, height = round(LABEL_WIDTH * k), round(LABEL_HEIGHT * k)
+        fill, angles = FLAT_LABEL_BACKGROUND, LABEL_GRADIENT
+    else:
+        width, height = round(INSTRUCTION_WIDTH * k), round(INSTRUCTION_HEIGHT * k)
+        fill, angles = FLAT_INSTRUCTION_BACKGROUND, INSTRUCTION_GRADIENT
+
+    background = Image.new('RGB', (width, height), fill) if flat else gradient_image(width, height, *angles)
+    radius = 10 * PX * k
+    if kind == 'label':
+        background.paste(PURPLE, (0, 0), rounded_mask(width, height, radius, outline=3 * PX * k))
+    background.putalpha(rounded_mask(width, height, radius))
+    return background
+
+def ref_version(ref: ImageRef) -> tuple:
+    """Версия картинки плана для кэшей процесса: QR - по тексту, файл - по размеру и mtime"""
+    return (ref.qr_data,) if ref.qr_data else image_version(ref.path, ref.kind, {})
+
+@lru_cache(maxsize=64)
+def image_tile(ref: ImageRef, size: int, round_mask: bool = False, version: tuple = ()) -> Optional[Image.Image]:
+    """
+    Картинка плана, вписанная в квадрат size пикселей (RGBA): QR - из матрицы модулей
+    без сглаживания, файл - печатная копия. None - файла нет или Pillow его не читает.
+    version (ref_version) - часть ключа кэша: изменённый файл перечитывается
+    """
+    if ref.qr_data:
+        matrix = qr_matrix(ref.qr_data)
+        tile = Image.new('L', (len(matrix), len(matrix)))
+        tile.putdata([0 if dark else 255 for row in matrix for dark in row])
+        tile = tile.resize((size, size), Image.NEAREST).convert('RGBA')
+    else:
+        path = image_file_path(ref.path, ref.kind)
+        if not path:
+            return None
+        try:
+            with Image.open(path) as source:
+                image = ImageOps.contain(ImageOps.exif_transpose(source).convert('RGBA'), (size, size), Image.LANCZOS)
+        except Exception as e:
+            logger.warning("Error rasterizing image %s: %s", path, e)
+            return None
+        tile = Image.new('RGBA', (size, size))
+        tile.paste(image, ((size - image.width) // 2, (size - image.height) // 2))
+
+    if round_mask:
+        alpha = tile.getchannel('A')
+        alpha.paste(0, (0, 0), ImageOps.invert(circle_mask(size)))
+        tile.putalpha(alpha)
+    return tile
+
+def png_bytes(image: Image.Image, dpi: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', dpi=(dpi, dpi), compress_level=PNG_COMPRESS_LEVEL)
+    return buffer.getvalue()
+
+
+class Canvas:
+    """Рисование на картинке в pt (как в SVG): k - пикселей на pt"""
+
+    def __init__(self, image: Image.Image, k: float):
+        self.image = image
+        self.draw = ImageDraw.Draw(image)
+        self.k = k
+
+    def px(self, value: float) -> int:
+        return round(value * self.k)
+
+    def rect(self, x: float, y: float, width: float, height: float, fill: str, radius: float = 0):
+        box = (self.px(x), self.px(y), self.px(x + width) - 1, self.px(y + height) - 1)
+        if radius:
+            self.draw.rounded_rectangle(box, self.px(radius), fill=fill)
+        else:
+            self.draw.rectangle(box, fill=fill)
+
+    def line(self, x1: float, y1: float, x2: float, y2: float, color: str, width: float):
+        self.draw.line((x1 * self.k, y1 * self.k, x2 * self.k, y2 * self.k), fill=color, width=max(self.px(width), 1))
+
+    def text(self, text: str, role: str, size: float, color: str, x: float, y: float,
+             anchor: str = 'middle', letter_spacing: float = 0, word_spacing: float = 0):
+        """Одна строка с базовой линией y; разрядка и промежутки между словами - по частям строки"""
+        if not text:
+            return
+        face = font(role, size * self.k)
+        if not letter_spacing and not word_spacing:
+            self.draw.text((x * self.k, y * self.k), text, font=face, fill=color, anchor='ms' if anchor == 'middle' else 'ls')
+            return
+
+        letter, word = letter_spacing * self.k, word_spacing * self.k
+        width = face.getlength(text) + letter * len(text) + word * text.count(' ')
+        left = x * self.k - width / 2 if anchor == 'middle' else x * self.k
+        # Без разрядки строка рисуется по словам, с разрядкой - по буквам
+        parts = text.split(' ') if not letter else list(text)
+        space = face.getlength(' ') + word
+        for index, part in enumerate(parts):
+            self.draw.text((left, y * self.k), part, font=face, fill=color, anchor='ls')
+            if letter:
+                left += face.getlength(part) + letter + (word if part == ' ' else 0)
+            elif index < len(parts) - 1:
+                left += face.getlength(part) + space
+
+    def paragraph(self, block: TextBlock, color: str, x: float, top: float, align: str = 'center'):
+        """Абзац TextBlock: x - левый край блока; align как у TextBlock.svg"""
+        box, size = block.box, block.size
+        line_height = size * block.leading
+        baseline = top + (line_height - size) / 2 + size * 0.8
+        anchor, line_x = ('middle', x + box.width / 2) if align == 'center' else ('start', x)
+        face = font(box.role, size * self.k)
+        for index, line in enumerate(block.lines):
+            spacing = 0
+            spaces = line.count(' ')
+            if align == 'justify' and spaces and index < len(block.lines) - 1:
+                # Свободное место строки - по метрикам растрового шрифта
+                used = face.getlength(line) / self.k + box.letter_spacing * len(line)
+                spacing = max(box.width - used, 0) / spaces
+            self.text(line, box.role, size, color, line_x, baseline + index * line_height, anchor,
+                      box.letter_spacing, spacing)
+
+    def place(self, tile: Optional[Image.Image], x: float, y: float):
+        if tile is not None:
+            self.image.alpha_composite(tile, (self.px(x), self.px(y)))
+
+    @contextmanager
+    def clip(self, x: float, y: float, width: float, height: float):
+        """Рисование только внутри прямоугольника: на копии, из которой возвращается вырезанная область"""
+        layer = Canvas(self.image.copy(), self.k)
+        yield layer
+        box = (self.px(x), self.px(y), self.px(x + width), self.px(y + max(height, 0)))
+        self.image.paste(layer.image.crop(box), box[:2])
+
+
+class RasterLabelRenderer:
+    """
+    Листы плана документа (render_plan) в картинки с заданным DPI.
+    Уникальная карточка рисуется один раз на процесс (card_cache), копии на листе - её вставки
+    """
+
+    def __init__(self, plan: RenderPlan, dpi: int):
+        self.plan = plan
+        self.dpi = dpi
+        self.k = dpi / 72
+
+    def tile(self, key: str, size: float, round_mask: bool = False) -> Optional[Image.Image]:
+        ref = self.plan.images[key]
+        return image_tile(ref, round(size * self.k), round_mask, ref_version(ref))
+
+    def new_card(self, kind: str) -> Canvas:
+        return Canvas(card_background(kind, self.plan.style_profile, self.dpi).copy(), self.k)
+
+    # --- этикетка ---
+
+    def label_image(self, card: LabelCard) -> Image.Image:
+        canvas = self.new_card('label')
+        pad = 3.5 * MM + 3 * PX
+        width = LABEL_WIDTH - 2 * pad
+        center = LABEL_WIDTH / 2
+
+        # Шапка: категория, название, слоган
+        top = pad + 7
+        canvas.text(card.category.upper(), 'sans-semibold', 7, PURPLE, center, top, letter_spacing=3 * PX)
+        top += 1 * MM
+
+        name_size = size_option(LABEL_NAME, card.name_class)
+        name = TextBlock(f"{card.number}. {card.title}", LABEL_NAME, name_size.font_size, name_size.line_height, 25 * MM)
+        canvas.paragraph(name, DARK_PURPLE, pad, top)
+        top += name.height
+
+        if card.tagline:
+            top += 0.5 * MM
+            tagline = TextBlock(card.tagline, TextBox('sans-italic', width, ()), 7, 1.1, 10 * MM)
+            canvas.paragraph(tagline, ROSE, pad, top)
+            top += tagline.height + 1 * MM
+        top += 1.5 * MM
+
+        # Логотип в круге
+        logo_size = 15 * MM
+        top += 2 * MM
+        canvas.place(self.tile(card.logo, logo_size, round_mask=True), center - logo_size / 2, top)
+        top += logo_size + 2 * MM
+
+        # Подвал снизу вверх: QR, сайт, бренд, разделитель
+        bottom = LABEL_HEIGHT - pad
+        qr_size = 10 * MM
+        qr_x = center - (qr_size + 2 * MM + 8 * MM) / 2
+        canvas.rect(qr_x, bottom - qr_size, qr_size, qr_size, '#ffffff', radius=2 * PX)
+        canvas.place(self.tile(card.qr, qr_size - 1 * MM), qr_x + 0.5 * MM, bottom - qr_size + 0.5 * MM)
+        canvas.text("Группа", 'sans-medium', 6, PURPLE, qr_x + qr_size + 2 * MM, bottom - qr_size / 2 - 1, 'start')
+        canvas.text("ВК", 'sans-medium', 6, PURPLE, qr_x + qr_size + 2 * MM, bottom - qr_size / 2 + 6, 'start')
+        bottom -= qr_size + 1.5 * MM
+        canvas.text(card.website or '', 'sans', 6.5, PURPLE, center, bottom)
+        bottom -= 6.5 + 1
+        canvas.text(card.brand_name or '', 'serif-semibold', 10, BROWN, center, bottom)
+        bottom -= 10 + 1 * MM
+        canvas.line(center - width * 0.3, bottom, center + width * 0.3, bottom, ROSE, 0.5)
+        bottom -= 1 * MM
+
+        # Описание в оставшемся месте
+        desc_size = size_option(LABEL_DESCRIPTION, card.description_class)
+        box = TextBox(LABEL_DESCRIPTION.role, width - 3 * MM, ())
+        description = TextBlock(card.description or '', box, desc_size.font_size, desc_size.line_height,
+                                max(bottom - top, 0))
+        with canvas.clip(pad + 1.5 * MM, top, box.width, bottom - top) as layer:
+            layer.paragraph(description, TEXT_PURPLE, pad + 1.5 * MM, top)
+        return canvas.image
+
+    # --- инструкция ---
+
+    def instruction_image(self, card: InstructionCard) -> Image.Image:
+        canvas = self.new_card('instruction')
+        pad = 12 * PX
+        width = INSTRUCTION_WIDTH - 2 * pad
+        center = INSTRUCTION_WIDTH / 2
+        top = pad
+
+        # Шапка: логотип, заголовок, QR
+        icon = 45 * PX
+        canvas.place(self.tile(card.logo, icon, round_mask=True), pad, top)
+        canvas.rect(INSTRUCTION_WIDTH - pad - icon, top, icon, icon, '#ffffff', radius=4 * PX)
+        canvas.place(self.tile(card.qr, icon - 4 * PX), INSTRUCTION_WIDTH - pad - icon + 2 * PX, top + 2 * PX)
+
+        title_size = size_option(INSTRUCTION_TITLE, card.title_class)
+        title_x = pad + icon + 8 * PX
+        title = TextBlock(card.title, INSTRUCTION_TITLE._replace(width=width - 2 * icon - 16 * PX),
+                          title_size.font_size, title_size.line_height, 30 * MM)
+        canvas.paragraph(title, DARK_PURPLE, title_x, top)
+        header_height = title.height
+        if card.tagline:
+            tagline = TextBlock(card.tagline, TextBox('sans-italic', title.box.width, ()), 10, 1.2, 15 * MM)
+            canvas.paragraph(tagline, ROSE, title_x, top + title.height + 3 * PX)
+            header_height += 3 * PX + tagline.height
+        top += max(icon, header_height) + 8 * PX
+        canvas.line(pad, top, INSTRUCTION_WIDTH - pad, top, blend(GOLD, 0.3), 1 * PX)
+        top += 8 * PX
+
+        # Подвал
+        bottom = INSTRUCTION_HEIGHT - pad
+        canvas.text(card.website or '', 'sans', 8, PURPLE, center, bottom)
+        bottom -= 8 + 2 * PX
+        canvas.text(card.brand_name or '', 'serif-semibold', 11, BROWN, center, bottom, letter_spacing=2 * PX)
+        bottom -= 11 + 6 * PX
+        canvas.line(pad, bottom, INSTRUCTION_WIDTH - pad, bottom, blend(GOLD, 0.2), 1 * PX)
+        bottom -= 8 * PX
+
+        # Разделы: размеры из подбора, при нехватке места все уменьшаются одинаково (как в SVG)
+        sections = []
+        for heading, text, box, css_class, spell in (
+            ("Описание", card.description, INSTRUCTION_SECTION, card.description_class, False),
+            ("Как работать", card.practice, INSTRUCTION_SECTION, card.practice_class, False),
+            ("Заговор", card.ritual, INSTRUCTION_SPELL, card.ritual_class, True),
+        ):
+            if text:
+                option = size_option(box, css_class)
+                sections.append((heading, text, option.font_size, option.line_height, spell))
+
+        available = bottom - top
+        text_box_width = width - 16 * PX
+        shrink = 0
+        while True:
+            blocks = []
+            for heading, text, size, leading, spell in sections:
+                box = TextBox('serif-italic' if spell else 'sans', text_box_width, (), pre_line=True)
+                blocks.append((heading, (10 if spell else 11) - shrink,
+                               TextBlock(text, box, max(size - shrink, MIN_FONT_SIZE), leading), spell))
+            total = sum(heading_size + 4 * PX + block.height + 12 * PX for _, heading_size, block, _ in blocks)
+            total += 8 * PX * max(len(blocks) - 1, 0)
+            if total <= available or max((size for _, _, size, _, _ in sections), default=0) - shrink <= MIN_FONT_SIZE:
+                break
+            shrink += 0.5
+
+        for heading, heading_size, block, spell in blocks:
+            block_height = heading_size + 4 * PX + block.height + 12 * PX
+            if spell:
+                canvas.rect(pad, top, width, block_height, blend(ROSE, 0.08), radius=6 * PX)
+                canvas.line(pad, top, pad, top + block_height, ROSE, 2 * PX)
+            canvas.text(heading.upper(), 'sans-semibold', heading_size, BROWN, pad + 8 * PX, top + 6 * PX + heading_size, 'start')
+            with canvas.clip(pad + 8 * PX, top, text_box_width, bottom - top) as layer:
+                layer.paragraph(block, DARK_PURPLE if spell else TEXT_PURPLE, pad + 8 * PX,
+                                top + 6 * PX + heading_size + 4 * PX, 'center' if spell else 'justify')
+            top += block_height + 8 * PX
+        return canvas.image
+
+    # --- листы ---
+
+    def card_image(self, key: str, size: tuple) -> Image.Image:
+        """Карточка плана размером size пикселей - из card_cache или рисуется"""
+        card = self.plan.cards[key]
+        cache_key = (card_digest(card), ref_version(self.plan.images[card.logo]), ref_version(self.plan.images[card.qr]),
+                     self.plan.style_profile, self.dpi, size)
+        image = card_cache.get(cache_key)
+        if image is None:
+            image = self.label_image(card) if isinstance(card, LabelCard) else self.instruction_image(card)
+            if image.size != size:
+                image = image.resize(size, Image.LANCZOS)
+            card_cache.put(cache_key, image)
+        return image
+
+    def page_image(self, page: PagePlan) -> Image.Image:
+        """
+        Лист плана по его макету; ячейки (None, n) - занятые ячейки начатого листа, они пропускаются.
+        Карточка другого размера масштабируется по центру ячейки, как в SVG
+        """
+        layout = LAYOUTS[page.layout]
+        design_width, design_height = (LABEL_WIDTH, LABEL_HEIGHT) if page.kind == 'label' else (INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT)
+        card_width, card_height = layout.card_width * MM, layout.card_height * MM
+        scale = min(card_width / design_width, card_height / design_height)
+        offset_x = (card_width - design_width * scale) / 2
+        offset_y = (card_height - design_height * scale) / 2
+        size = (round(design_width * scale * self.k), round(design_height * scale * self.k))
+
+        sheet = Image.new('RGB', (round(layout.page_width * MM * self.k), round(layout.page_height * MM * self.k)), '#ffffff')
+        index = 0
+        for key, count in page.slots:
+            if key is None:
+                index += count
+                continue
+            card = self.card_image(key, size)
+            for _ in range(count):
+                left, top = layout.card_position(index)
+                sheet.paste(card, (round((left * MM + offset_x) * self.k), round((top * MM + offset_y) * self.k)), card)
+                index += 1
+        return sheet
+
+    def warnings_pages(self) -> List[Image.Image]:
+        """Страницы предупреждений о переполнении текста (A4, как в SVG)"""
+        margin = 20 * MM
+        width = PAGE_WIDTH - 2 * margin
+        size = (round(PAGE_WIDTH * self.k), round(PAGE_HEIGHT * self.k))
+        pages = []
+
+        canvas = Canvas(Image.new('RGB', size, '#ffffff'), self.k)
+        title = TextBlock("Предупреждения о переполнении текста", TextBox('serif-bold', width - 30, ()), 24, 1.1, 40 * MM)
+        top = margin
+        canvas.text("⚠", 'sans', 24, WARNING_RED, margin + 12, top + 24 * 0.85)
+        canvas.paragraph(title, WARNING_RED, margin + 30, top)
+        top += title.height + 5 * MM
+        canvas.text(f"Найдено проблем в {len(self.plan.warnings)} свечах из {self.plan.candle_count}",
+                    'sans', 12, '#666666', PAGE_WIDTH / 2, top + 12)
+        top += 12 + 5 * MM
+        canvas.line(margin, top, PAGE_WIDTH - margin, top, '#ff6b6b', 3 * PX)
+        top += 10 * MM
+
+        box = TextBox('sans', width - 10 * MM, ())
+        for name, warnings in self.plan.warnings:
+            lines = [TextBlock(f"⚠ {warning}", box, 10, 1.3) for warning in warnings]
+            block = 14 + 5 * PX + sum(line.height for line in lines) + 20 * PX
+            if top + block > PAGE_HEIGHT - margin:
+                pages.append(canvas.image)
+                canvas, top = Canvas(Image.new('RGB', size, '#ffffff'), self.k), margin
+            canvas.rect(margin, top, width, block, '#fff0f0', radius=8 * PX)
+            canvas.rect(margin, top, 4 * PX, block, '#ff6b6b')
+            canvas.text(name, 'serif-bold', 14, WARNING_RED, margin + 15 * PX, top + 10 * PX + 14, 'start')
+            line_top = top + 10 * PX + 14 + 5 * PX
+            for line in lines:
+                canvas.paragraph(line, '#333333', margin + 15 * PX, line_top, 'left')
+                line_top += line.height
+            top += block + 10 * PX
+        pages.append(canvas.image)
+        return pages
+
+def render_sheets_task(plan: RenderPlan, dpi: int) -> List[bytes]:
+    """Задача пула: листы plan.pages в PNG. В плане только карточки и картинки этих листов"""
+    renderer = RasterLabelRenderer(plan, dpi)
+    return [png_bytes(renderer.page_image(page), dpi) for page in plan.pages]
+
+def iter_labels_png(candles: List[Candle], print_type: str = 'both',
+                    label_layout: SheetLayout = DEFAULT_LAYOUTS['label'],
+                    instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                    label_start_slot: int = 0, instruction_start_slot: int = 0,
+                    packing: str = 'sequential', style_profile: str = 'standard', dpi: int = 300,
+                    on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Generate the same sheets as the HTML, PDF and SVG versions as PNG images in a ZIP archive.
+
+    Every sheet is a full-page bitmap at the given DPI (sheet-001.png, ...) for printer
+    drivers that take images directly. Card backgrounds, images and finished cards are
+    composited once per process and reused; documents larger than one task are rendered
+    in parallel in the render pool, smaller ones in process. The archive is streamed sheet
+    by sheet (PNG is stored as is).
+    on_pages(count) is called as sheets are finished (progress of background jobs).
+    """
+    plan = build_plan(candles, label_layout, print_type, instruction_layout,
+                      label_start_slot, instruction_start_slot, packing, style_profile)
+    yield from iter_plan_png(plan, dpi, on_pages)
+
+def iter_plan_png(plan: RenderPlan, dpi: int = 300, on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """ZIP с листами PNG по плану (см. iter_labels_png)"""
+    chunks = [plan.pages[start:start + RASTER_PAGES_PER_TASK] for start in range(0, len(plan.pages), RASTER_PAGES_PER_TASK)]
+
+    def tasks():
+        # В задачу уходят только карточки и картинки её листов
+        for chunk in chunks:
+            cards = {key: plan.cards[key] for page in chunk for key, _ in page.slots if key is not None}
+            images = {key: plan.images[key] for card in cards.values() for key in (card.logo, card.qr)}
+            yield (plan._replace(pages=chunk, cards=cards, images=images, warnings=[]), dpi)
+
+    def files():
+        if plan.warnings:
+            for number, page in enumerate(RasterLabelRenderer(plan, dpi).warnings_pages(), start=1):
+                yield f"warnings-{number}.png", png_bytes(page, dpi)
+        if len(plan.pages) > RASTER_PAGES_PER_TASK and render_workers() > 1:
+            results = ordered_map(render_sheets_task, tasks())
+        else:
+            # Запуск пула (spawn, импорт backend) дороже рендера нескольких листов
+            results = (render_sheets_task(*task) for task in tasks())
+        for chunk, sheets in zip(chunks, results):
+            for page, data in zip(chunk, sheets):
+                yield f"sheet-{page.number:03d}.png", data
+            if on_pages:
+                on_pages(len(chunk))
+
+    yield from iter_zip(files(), zipfile.ZIP_STORED)
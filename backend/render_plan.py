@@ -0,0 +1,250 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+from models import Candle
+from text_fitting import (
+    FIT_VERSION, LABEL_NAME, LABEL_DESCRIPTION, INSTRUCTION_TITLE, fit_text, fit_instruction,
+)
+from layouts import SheetLayout, DEFAULT_LAYOUTS
+from sheet_packing import page_runs
+import hashlib
+
+# План документа: все решения о раскладке и оформлении без разметки.
+# Свечи превращаются в карточки с готовыми текстами и классами размеров, карточки -
+# в листы с ячейками; HTML (label_generator) и PDF (pdf_generator) только выводят план.
+# План состоит из кортежей и словарей, поэтому сериализуется в JSON (RenderPlan.to_dict)
+
+PRINT_TYPES = ('labels', 'instructions', 'both')
+
+def label_title(candle: Candle) -> str:
+    """Название на этикетке как в шаблоне: номер и название"""
+    return f"{candle.sequence_number or ''}. {candle.display_name or candle.name}"
+
+def compute_text_fit(candle: Candle) -> Dict:
+    """
+    Подбор размеров текста свечи по метрикам шрифтов (см. text_fitting):
+    CSS-классы для всех текстовых блоков и предупреждения о переполнении
+    """
+    name_fit = fit_text(label_title(candle), LABEL_NAME)
+    desc_fit = fit_text(candle.description, LABEL_DESCRIPTION)
+    title_fit = fit_text(candle.display_name or candle.name, INSTRUCTION_TITLE)
+    sections = fit_instruction(candle.description, candle.practice or '', candle.ritual_text or '')
+
+    warnings = []
+
+    # Проверка названия
+    if not name_fit.fits:
+        warnings.append(f"Название не помещается на этикетке ({name_fit.lines} строк при {name_fit.font_size:g}pt)")
+    if not title_fit.fits:
+        warnings.append(f"Название не помещается в шапке инструкции ({title_fit.lines} строк при {title_fit.font_size:g}pt)")
+
+    # Проверка описания для этикетки
+    if not desc_fit.fits:
+        warnings.append(
+            f"Описание не помещается на этикетке ({desc_fit.lines} строк при минимальном шрифте "
+            f"{desc_fit.font_size:g}pt, помещается {LABEL_DESCRIPTION.options[-1].max_lines})"
+        )
+
+    # Общая проверка для инструкции: разделы делят высоту карточки
+    if not sections.fits:
+        warnings.append("Текст инструкции не помещается на карточке даже при минимальном шрифте")
+
+    return {
+        'label_name': name_fit.css_class,
+        'label_description': desc_fit.css_class,
+        'instruction_title': title_fit.css_class,
+        'instruction_description': sections.description.css_class,
+        'instruction_practice': sections.practice.css_class,
+        'instruction_ritual': sections.ritual.css_class,
+        'warnings': warnings,
+    }
+
+def refresh_text_fit(candle: Candle):
+    """Пересчитывает и сохраняет в свече подбор текста; вызывается перед записью свечи"""
+    text_fit = compute_text_fit(candle)
+    candle.text_fit = text_fit
+    candle.text_fit_version = FIT_VERSION
+    candle.has_overflow = bool(text_fit['warnings'])
+
+def candle_text_fit(candle: Candle) -> Dict:
+    """Сохранённый подбор текста свечи; если его нет или он от другой версии - считаем заново"""
+    if candle.text_fit and candle.text_fit_version == FIT_VERSION:
+        return candle.text_fit
+    return compute_text_fit(candle)
+
+def check_overflow(candle: Candle) -> List[str]:
+    """
+    Проверяет переполнение текста в свече
+    Возвращает список предупреждений
+    """
+    return candle_text_fit(candle)['warnings']
+
+def candle_quantity(candle: Candle) -> int:
+    """Сколько копий свечи печатать"""
+    return getattr(candle, 'quantity', 1) or 1
+
+class ImageRef(NamedTuple):
+    """Картинка карточки без привязки к формату вывода: загруженный файл или QR из текста"""
+    kind: str  # 'logo' или 'qr'
+    path: Optional[str]  # путь из свечи; None - картинка по умолчанию
+    qr_data: Optional[str] = None  # QR строится из текста, path не используется
+
+    @property
+    def key(self) -> str:
+        return 'img-' + hashlib.sha1(repr(tuple(self)).encode('utf-8')).hexdigest()[:10]
+
+def logo_ref(candle: Candle) -> ImageRef:
+    return ImageRef('logo', candle.logo_image or None)
+
+def qr_ref(candle: Candle) -> ImageRef:
+    if candle.qr_data:
+        return ImageRef('qr', None, candle.qr_data)
+    return ImageRef('qr', candle.qr_image or None)
+
+class LabelCard(NamedTuple):
+    """Этикетка: тексты и классы размеров; logo и qr - ключи RenderPlan.images"""
+    category: str
+    number: str
+    title: str
+    name_class: str
+    tagline: Optional[str]
+    description: str
+    description_class: str
+    brand_name: Optional[str]
+    website: Optional[str]
+    logo: str
+    qr: str
+
+class InstructionCard(NamedTuple):
+    """Инструкция: разделы без текста (None) не выводятся"""
+    title: str
+    title_class: str
+    tagline: Optional[str]
+    description: Optional[str]
+    description_class: str
+    practice: Optional[str]
+    practice_class: str
+    ritual: Optional[str]
+    ritual_class: str
+    brand_name: Optional[str]
+    website: Optional[str]
+    logo: str
+    qr: str
+
+Card = Union[LabelCard, InstructionCard]
+
+def card_digest(card: Card) -> str:
+    """Отпечаток карточки по содержимому - ключ кэшей вместо копии всех её текстов"""
+    return hashlib.sha1(repr(card).encode('utf-8')).hexdigest()
+
+def label_card(candle: Candle, logo: str, qr: str) -> LabelCard:
+    text_fit = candle_text_fit(candle)
+    return LabelCard(
+        category=candle.category.name if candle.category else "Магическая свеча",
+        number=str(candle.sequence_number or ''),
+        title=candle.display_name or candle.name,
+        name_class=text_fit['label_name'],
+        tagline=candle.tagline or None,
+        description=candle.description,
+        description_class=text_fit['label_description'],
+        brand_name=candle.brand_name,
+        website=candle.website,
+        logo=logo,
+        qr=qr,
+    )
+
+def instruction_card(candle: Candle, logo: str, qr: str) -> InstructionCard:
+    text_fit = candle_text_fit(candle)
+    return InstructionCard(
+        title=candle.display_name or candle.name,
+        title_class=text_fit['instruction_title'],
+        tagline=candle.tagline or None,
+        description=candle.description or None,
+        description_class=text_fit['instruction_description'],
+        practice=candle.practice or None,
+        practice_class=text_fit['instruction_practice'],
+        ritual=candle.ritual_text or None,
+        ritual_class=text_fit['instruction_ritual'],
+        brand_name=candle.brand_name,
+        website=candle.website,
+        logo=logo,
+        qr=qr,
+    )
+
+class PagePlan(NamedTuple):
+    kind: str  # 'label' или 'instruction'
+    number: int
+    layout: str  # имя макета (layouts.LAYOUTS)
+    slots: Tuple[Tuple[Optional[str], int], ...]  # (ключ карточки, копий подряд); None - занятые ячейки начатого листа
+
+class RenderPlan(NamedTuple):
+    print_type: str
+    style_profile: str  # style_profiles.STYLE_PROFILES
+    layouts: Dict[str, str]  # вид листа -> имя макета
+    candle_count: int
+    warnings: List[Tuple[str, List[str]]]  # (название свечи, предупреждения)
+    images: Dict[str, ImageRef]
+    cards: Dict[str, Card]  # 'label:<id>' / 'instruction:<id>'
+    pages: List[PagePlan]
+
+    def to_dict(self) -> Dict:
+        """План в виде JSON-совместимого словаря"""
+        return {
+            'print_type': self.print_type,
+            'style_profile': self.style_profile,
+            'layouts': self.layouts,
+            'candle_count': self.candle_count,
+            'warnings': [{'name': name, 'warnings': warnings} for name, warnings in self.warnings],
+            'images': {key: ref._asdict() for key, ref in self.images.items()},
+            'cards': {key: card._asdict() for key, card in self.cards.items()},
+            'pages': [page._asdict() for page in self.pages],
+        }
+
+def build_plan(candles: List[Candle], label_layout: SheetLayout = DEFAULT_LAYOUTS['label'], print_type: str = 'both',
+               instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+               label_start_slot: int = 0, instruction_start_slot: int = 0,
+               packing: str = 'sequential', style_profile: str = 'standard') -> RenderPlan:
+    """
+    План документа: предупреждения о переполнении, карточки (одна на свечу и вид)
+    и листы; копии - число в ячейке листа, а не отдельные карточки
+    """
+    images = {}
+    keys = []
+    warnings = []
+    for index, candle in enumerate(candles):
+        logo, qr = logo_ref(candle), qr_ref(candle)
+        images.setdefault(logo.key, logo)
+        images.setdefault(qr.key, qr)
+        keys.append((candle, str(candle.id if candle.id is not None else f"#{index}"), logo.key, qr.key))
+
+        candle_warnings = check_overflow(candle)
+        if candle_warnings:
+            warnings.append((candle.display_name or candle.name, candle_warnings))
+
+    passes = []
+    if print_type in ('labels', 'both'):
+        passes.append(('label', label_layout, label_start_slot, label_card))
+    if print_type in ('instructions', 'both'):
+        passes.append(('instruction', instruction_layout, instruction_start_slot, instruction_card))
+
+    cards = {}
+    pages = []
+    for kind, layout, start_slot, make_card in passes:
+        for candle, key, logo, qr in keys:
+            cards[f"{kind}:{key}"] = make_card(candle, logo, qr)
+        items = ((f"{kind}:{key}", candle_quantity(candle)) for candle, key, _, _ in keys)
+        for runs in page_runs(items, layout.per_page, start_slot, packing):
+            pages.append(PagePlan(kind, len(pages) + 1, layout.name, tuple(runs)))
+
+    return RenderPlan(
+        print_type=print_type,
+        style_profile=style_profile,
+        layouts={'label': label_layout.name, 'instruction': instruction_layout.name},
+        candle_count=len(candles),
+        warnings=warnings,
+        images=images,
+        cards=cards,
+        pages=pages,
+    )
+
+def plan_card_count(plan: RenderPlan) -> int:
+    """Сколько карточек (с копиями) на листах плана"""
+    return sum(count for page in plan.pages for key, count in page.slots if key is not None)
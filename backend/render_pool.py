@@ -0,0 +1,60 @@
+from concurrent.futures import Executor, ProcessPoolExecutor
+from collections import deque
+from typing import Callable, Iterable, Iterator, Optional
+import atexit
+import multiprocessing
+import os
+import threading
+from config import settings
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+def render_workers() -> int:
+    """Число процессов рендера: из настроек или по числу ядер"""
+    return settings.render_workers or os.cpu_count() or 1
+
+def get_render_pool() -> Executor:
+    """
+    Общий пул процессов для рендера страниц (создаётся при первом обращении).
+    Процессы запускаются через spawn: fork из многопоточного сервера
+    может унаследовать захваченные блокировки
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=render_workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+def shutdown_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+atexit.register(shutdown_render_pool)
+
+def ordered_map(func: Callable, tasks: Iterable[tuple], window: Optional[int] = None) -> Iterator:
+    """
+    Выполняет func(*task) в пуле и отдаёт результаты в исходном порядке.
+    Одновременно в работе не больше window задач, поэтому результаты
+    не копятся в памяти, пока потребитель читает поток
+    """
+    pool = get_render_pool()
+    window = window or render_workers() * 2
+    pending = deque()
+    try:
+        for task in tasks:
+            pending.append(pool.submit(func, *task))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Клиент отключился - недоделанные задачи не нужны
+        for future in pending:
+            future.cancel()
@@ -31,6 +31,7 @@ class CandleBase(BaseModel):
     brand_name: str = "АРТ-СВЕЧИ"
     website: str = "art-svechi.ligardi.ru"
     qr_image: Optional[str] = None
+    qr_data: Optional[str] = None
     logo_image: Optional[str] = None
     quantity: int = 1
     is_active: bool = True
@@ -52,6 +53,7 @@ class CandleUpdate(BaseModel):
     brand_name: Optional[str] = None
     website: Optional[str] = None
     qr_image: Optional[str] = None
+    qr_data: Optional[str] = None
     logo_image: Optional[str] = None
     quantity: Optional[int] = None
     is_active: Optional[bool] = None
@@ -62,10 +64,21 @@ class Candle(CandleBase):
     updated_at: datetime
     last_modified_at: datetime
     category: Optional[Category] = None
+    has_overflow: Optional[bool] = None  # Текст не помещается на карточках (см. /api/candles/overflow-report)
 
     class Config:
         from_attributes = True
 
+class OverflowReportItem(BaseModel):
+    id: int
+    sequence_number: Optional[int] = None
+    name: str
+    warnings: List[str]
+
+class OverflowReport(BaseModel):
+    total: int
+    candles: List[OverflowReportItem]
+
 # Label Set schemas
 class LabelSetBase(BaseModel):
     name: str
@@ -87,6 +100,60 @@ class LabelSetWithCandles(LabelSet):
 # Generate labels request
 class GenerateLabelsRequest(BaseModel):
     candle_ids: List[int]
-    format: str = "html"  # html, pdf
-    labels_per_page: int = 6
+    format: str = "html"  # html, pdf, svg (ZIP с листом SVG на каждый лист), png (ZIP с листами PNG)
+    labels_per_page: Optional[int] = None  # выбрать макет этикеток по числу на листе (см. /api/layouts)
+    label_layout: Optional[str] = None  # макет листа этикеток, по умолчанию a4-3x3
+    instruction_layout: Optional[str] = None  # макет листа инструкций, по умолчанию a4-2x2
+    label_start_slot: int = 0  # сколько ячеек первого листа этикеток уже занято (печать продолжит начатый лист)
+    instruction_start_slot: int = 0  # то же для первого листа инструкций
+    packing: str = "sequential"  # sequential (по порядку), compact (копии одной свечи вместе)
+    style_profile: str = "standard"  # standard, print-fast (плоские заливки без теней - быстрее печать)
     print_type: str = "both"  # labels, instructions, both
+    image_mode: str = "shared"  # shared (each image once per document), inline
+    inline_css: bool = False  # True - встроить стили в документ (автономный файл)
+    preview: bool = False  # True - лёгкая оболочка HTML, листы подгружаются при прокрутке
+    minify: bool = False  # True - HTML без комментариев и отступов, экономия в заголовке X-Minify-Saved-Bytes
+    dpi: Optional[int] = None  # разрешение листов PNG, по умолчанию 300
+
+# Dry-run estimate of a generation request
+class GenerationEstimate(BaseModel):
+    output_format: str
+    candle_count: int
+    card_count: int  # карточек на листах с учётом копий
+    label_sheets: Optional[int] = None  # None - этикетки не печатаются
+    label_free_slots: Optional[int] = None
+    instruction_sheets: Optional[int] = None
+    instruction_free_slots: Optional[int] = None
+    warnings: List[OverflowReportItem]  # свечи с переполнением текста
+    estimated_bytes: int  # HTML - по шаблонам плана, остальные форматы - по выполненным задачам
+    estimated_seconds: float
+    timing_basis: str  # jobs (по выполненным задачам), default (по настройкам)
+
+# Background generation jobs
+class GenerationJob(BaseModel):
+    id: str
+    status: str  # queued, running, done, failed
+    output_format: str
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+    result_size: Optional[int] = None  # байт, когда задача выполнена
+    minify_saved_bytes: Optional[int] = None  # для minify: на сколько байт документ меньше обычного
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Sheet layouts
+class SheetLayoutInfo(BaseModel):
+    name: str
+    title: str
+    kind: str  # label, instruction
+    columns: int
+    rows: int
+    per_page: int
+    card_width: float  # мм
+    card_height: float  # мм
+    is_default: bool
@@ -0,0 +1,80 @@
+from typing import Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar('T')
+
+# Режимы раскладки копий по листам
+PACKING_MODES = ('sequential', 'compact')
+
+def sheet_usage(card_count: int, per_page: int, start_slot: int = 0) -> Tuple[int, int]:
+    """
+    Сколько листов займут card_count карточек, если на первом листе уже занято start_slot ячеек,
+    и сколько ячеек останется свободными на последнем листе
+    """
+    if not card_count:
+        return 0, 0
+    sheets = -(-(start_slot + card_count) // per_page)
+    return sheets, sheets * per_page - start_slot - card_count
+
+def iter_page_runs(items: Iterable[Tuple[T, int]], per_page: int, start_slot: int = 0) -> Iterator[List[Tuple[Optional[T], int]]]:
+    """
+    Раскладывает копии по листам без развёрнутого списка: items - пары (элемент, число копий),
+    каждый лист - список пар (элемент, сколько копий подряд на этом листе).
+    Занятые ячейки начатого листа (start_slot) идут первой парой (None, start_slot)
+    """
+    page, free = [], per_page
+    for item, quantity in items:
+        while quantity:
+            if start_slot and not page:
+                page.append((None, start_slot))
+                free -= start_slot
+            take = min(quantity, free)
+            page.append((item, take))
+            quantity -= take
+            free -= take
+            if not free:
+                yield page
+                page, free = [], per_page
+                start_slot = 0
+    if page:
+        yield page
+
+def pack_page_runs(items: Iterable[Tuple[T, int]], per_page: int, start_slot: int = 0) -> List[List[Tuple[Optional[T], int]]]:
+    """
+    Раскладка 'compact': копии одной свечи держатся вместе на как можно меньшем числе листов.
+    Полные листы одной свечи идут как есть, остатки раскладываются по листам first-fit decreasing.
+    Листов никогда не больше, чем при раскладке по порядку (минимум для тиража) - если
+    первая подходящая раскладка выходит длиннее, остатки идут подряд по убыванию количества
+    """
+    items = sorted(items, key=lambda pair: pair[1], reverse=True)
+    sheets, _ = sheet_usage(sum(quantity for _, quantity in items), per_page, start_slot)
+
+    full_pages = []
+    # Листы с остатками: [пары, свободных ячеек]; начатый лист - первый
+    bins = [[[(None, start_slot)], per_page - start_slot]] if start_slot else []
+    for item, quantity in items:
+        full, rest = divmod(quantity, per_page)
+        full_pages.extend([(item, per_page)] for _ in range(full))
+        if not rest:
+            continue
+        for page in bins:
+            if page[1] >= rest:
+                page[0].append((item, rest))
+                page[1] -= rest
+                break
+        else:
+            bins.append([[(item, rest)], per_page - rest])
+
+    if len(full_pages) + len(bins) > sheets or (start_slot and len(bins[0][0]) == 1):
+        return list(iter_page_runs(items, per_page, start_slot))
+
+    pages = [runs for runs, _ in bins]
+    if start_slot:
+        return pages[:1] + full_pages + pages[1:]
+    return full_pages + pages
+
+def page_runs(items: Iterable[Tuple[T, int]], per_page: int, start_slot: int = 0,
+              packing: str = 'sequential') -> Iterable[List[Tuple[Optional[T], int]]]:
+    """Листы в выбранном режиме раскладки (см. PACKING_MODES)"""
+    if packing == 'compact':
+        return pack_page_runs(items, per_page, start_slot)
+    return iter_page_runs(items, per_page, start_slot)
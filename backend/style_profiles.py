@@ -0,0 +1,88 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+from PIL import Image
+from layouts import DEFAULT_LAYOUTS
+import label_templates as tpl
+import base64
+import hashlib
+import io
+import math
+
+# Профили оформления документа (GenerateLabelsRequest.style_profile):
+# standard - полный дизайн; print-fast - та же раскладка с плоскими заливками
+# и заранее отрисованными искрами, быстрее в предпросмотре печати и на принтере
+STYLE_PROFILES = ('standard', 'print-fast')
+
+# Искры из .label::before и .instruction-card::before: (радиус в CSS px, x %, y %, RGBA)
+LABEL_SPARKLES = [
+    (1, 10, 20, (255, 255, 255, 0.8)),
+    (1.5, 30, 10, (255, 255, 255, 0.6)),
+    (1, 50, 30, (255, 255, 255, 0.7)),
+    (2, 70, 15, (255, 215, 0, 0.8)),
+    (1, 85, 25, (255, 255, 255, 0.5)),
+    (1.5, 20, 80, (255, 255, 255, 0.6)),
+    (1, 60, 85, (255, 215, 0, 0.7)),
+    (2, 90, 70, (255, 255, 255, 0.5)),
+]
+
+INSTRUCTION_SPARKLES = [
+    (1, 15, 25, (255, 255, 255, 0.6)),
+    (1.5, 85, 15, (255, 215, 0, 0.7)),
+    (1, 50, 80, (255, 255, 255, 0.5)),
+]
+
+CSS_PX_PER_MM = 96 / 25.4
+# Точек картинки на CSS-пиксель: 2 - это 192 dpi, для искр в 1-2 CSS px достаточно,
+# а почти пустая картинка во весь размер карточки остаётся небольшой
+SPARKLES_SCALE = 2
+
+def sparkles_png(width_mm: float, height_mm: float, sparkles) -> bytes:
+    """Искры карточки на прозрачном фоне: как radial-gradient, цвет в центре гаснет к краю"""
+    width = round(width_mm * CSS_PX_PER_MM * SPARKLES_SCALE)
+    height = round(height_mm * CSS_PX_PER_MM * SPARKLES_SCALE)
+    image = Image.new('RGBA', (width, height), (0, 0, 0, 0))
+    pixels = image.load()
+    for radius, x, y, (red, green, blue, alpha) in sparkles:
+        cx, cy, radius = x / 100 * width, y / 100 * height, radius * SPARKLES_SCALE
+        for py in range(max(int(cy - radius), 0), min(int(cy + radius) + 1, height)):
+            for px in range(max(int(cx - radius), 0), min(int(cx + radius) + 1, width)):
+                distance = math.hypot(px + 0.5 - cx, py + 0.5 - cy) / radius
+                if distance < 1:
+                    pixels[px, py] = (red, green, blue, round(255 * alpha * (1 - distance)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+def png_data_url(data: bytes) -> str:
+    return f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}"
+
+@lru_cache(maxsize=None)
+def profile_css(profile: str, minify: bool = False) -> str:
+    """Стили документа для профиля (собираются и минифицируются один раз на процесс)"""
+    if minify:
+        return tpl.minify_css(profile_css(profile))
+    if profile != 'print-fast':
+        return tpl.LABELS_CSS
+
+    label, instruction = DEFAULT_LAYOUTS['label'], DEFAULT_LAYOUTS['instruction']
+    return tpl.LABELS_CSS + tpl.PRINT_FAST_CSS.render(
+        label_sparkles=png_data_url(sparkles_png(label.card_width, label.card_height, LABEL_SPARKLES)),
+        instruction_sparkles=png_data_url(
+            sparkles_png(instruction.card_width, instruction.card_height, INSTRUCTION_SPARKLES)
+        ),
+    )
+
+@lru_cache(maxsize=None)
+def profile_stylesheet(profile: str, minify: bool = False) -> Tuple[str, str]:
+    """(labels.<хэш>.css, стили) - имя меняется вместе с содержимым, файл кэшируется бессрочно"""
+    css = profile_css(profile, minify)
+    return f"labels.{hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]}.css", css
+
+def find_profile_stylesheet(filename: str) -> Optional[str]:
+    for profile in STYLE_PROFILES:
+        for minify in (False, True):
+            name, css = profile_stylesheet(profile, minify)
+            if name == filename:
+                return css
+    return None
@@ -0,0 +1,480 @@
+from functools import lru_cache
+from typing import Callable, List, Dict, Iterator, Optional, Tuple
+from xml.sax.saxutils import escape, quoteattr
+import math
+from models import Candle
+from archives import iter_zip
+from label_generator import image_file_path, image_to_base64
+from qr_codes import qr_svg
+from render_plan import ImageRef, InstructionCard, LabelCard, PagePlan, RenderPlan, build_plan
+from text_fitting import (
+    MM, PX, LABEL_NAME, LABEL_DESCRIPTION, INSTRUCTION_TITLE, INSTRUCTION_SECTION, INSTRUCTION_SPELL,
+    TextBox, size_option, text_width, wrap_text,
+)
+from layouts import LAYOUTS, SheetLayout, DEFAULT_LAYOUTS
+from web_fonts import FONT_FACES, embedded_fonts_css
+
+# Векторный вывод: каждый лист плана - отдельный самодостаточный SVG (шрифты и картинки внутри),
+# все листы - в ZIP-архиве. Геометрия та же, что у PDF (pdf_generator), но сверху вниз; единица - pt.
+# Фоны, картинки, QR и каждая уникальная карточка листа лежат в <defs> один раз,
+# копии на листе - <use>. Строки переносятся по метрикам шрифтов (text_fitting.wrap_text)
+
+PAGE_WIDTH, PAGE_HEIGHT = 210 * MM, 297 * MM
+LABEL_WIDTH = DEFAULT_LAYOUTS['label'].card_width * MM
+LABEL_HEIGHT = DEFAULT_LAYOUTS['label'].card_height * MM
+INSTRUCTION_WIDTH = DEFAULT_LAYOUTS['instruction'].card_width * MM
+INSTRUCTION_HEIGHT = DEFAULT_LAYOUTS['instruction'].card_height * MM
+
+# Цвета дизайна (как в pdf_generator)
+PURPLE = '#5d1a75'
+DARK_PURPLE = '#2d0a3d'
+TEXT_PURPLE = '#3d0a4d'
+ROSE = '#8b2c5f'
+BROWN = '#8b4513'
+WARNING_RED = '#c92a2a'
+GOLD = '#e8b923'
+CARD_BACKGROUND = '#f3e5ff'
+FLAT_LABEL_BACKGROUND = '#fae2f7'
+FLAT_INSTRUCTION_BACKGROUND = '#f7e7fc'
+
+# Фоны карточек (как linear-gradient в CSS): угол, цвета и позиции опорных точек
+LABEL_GRADIENT = (160, ['#f8f0ff', '#f3e5ff', '#ffe0f5', '#ffd4e8'], [0, 0.3, 0.6, 1])
+INSTRUCTION_GRADIENT = (135, ['#f8f0ff', '#f3e5ff', '#ffe0f5'], [0, 0.5, 1])
+
+MIN_FONT_SIZE = 5
+
+SVG_OPEN = (
+    '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" '
+    'width="{width}mm" height="{height}mm" viewBox="0 0 {view_width} {view_height}">'
+)
+
+def num(value: float) -> str:
+    """Число для атрибута: до сотых, без лишних нулей"""
+    text = f"{value:.2f}".rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
+def blend(color: str, alpha: float, background: str = CARD_BACKGROUND) -> str:
+    """Цвет с прозрачностью alpha поверх background - без прозрачности в файле"""
+    channels = [
+        round(int(background[i:i + 2], 16) + (int(color[i:i + 2], 16) - int(background[i:i + 2], 16)) * alpha)
+        for i in (1, 3, 5)
+    ]
+    return '#' + ''.join(f"{channel:02x}" for channel in channels)
+
+@lru_cache(maxsize=None)
+def font_styles() -> str:
+    """
+    Встроенные шрифты (@font-face с data URL, как у автономного HTML) и классы начертаний
+    (роли fonts.FONT_FILES). Внешний @import программы просмотра и растеризаторы SVG не читают,
+    поэтому шрифты есть в каждом листе. Строка собирается один раз на процесс
+    """
+    rules = [embedded_fonts_css(minify=True)]
+    for role, family, weight, style in FONT_FACES:
+        generic = 'serif' if role.startswith('serif') else 'sans-serif'
+        rules.append(f".{role}{{font-family:'{family}',{generic};font-weight:{weight};font-style:{style}}}")
+    return f"<style>{''.join(rules)}</style>"
+
+def gradient(element_id: str, width: float, height: float, angle: float, colors: List[str],
+             positions: List[float]) -> str:
+    """CSS linear-gradient(angle) для блока width x height в его координатах"""
+    radians = math.radians(angle)
+    dx, dy = math.sin(radians), -math.cos(radians)
+    length = abs(width * dx) + abs(height * dy)
+    x1, y1 = width / 2 - dx * length / 2, height / 2 - dy * length / 2
+    x2, y2 = width / 2 + dx * length / 2, height / 2 + dy * length / 2
+    stops = ''.join(f'<stop offset="{num(position)}" stop-color="{color}"/>' for color, position in zip(colors, positions))
+    return (f'<linearGradient id="{element_id}" gradientUnits="userSpaceOnUse" '
+            f'x1="{num(x1)}" y1="{num(y1)}" x2="{num(x2)}" y2="{num(y2)}">{stops}</linearGradient>')
+
+def text_line(text: str, role: str, size: float, color: str, x: float, y: float,
+              anchor: str = 'middle', letter_spacing: float = 0) -> str:
+    """Одна строка с базовой линией y"""
+    spacing = f' letter-spacing="{num(letter_spacing)}"' if letter_spacing else ''
+    return (f'<text class="{role}" font-size="{num(size)}" fill="{color}" x="{num(x)}" y="{num(y)}" '
+            f'text-anchor="{anchor}"{spacing}>{escape(text)}</text>')
+
+class TextBlock:
+    """Абзац, перенесённый по метрикам: строки, кегль и высота"""
+
+    def __init__(self, text: str, box: TextBox, size: float, leading: float, max_height: Optional[float] = None):
+        # Как fit_paragraph в PDF: уменьшаем кегль, пока абзац не поместится по высоте
+        while True:
+            self.lines = wrap_text(text, box, size)
+            self.height = len(self.lines) * size * leading
+            if max_height is None or self.height <= max_height or size <= MIN_FONT_SIZE:
+                break
+            size -= 0.5
+        self.box = box
+        self.size = size
+        self.leading = leading
+
+    def svg(self, color: str, x: float, top: float, align: str = 'center', clip: Optional[str] = None) -> str:
+        """x - левый край блока; align: center, left или justify (последняя строка - влево)"""
+        box, size = self.box, self.size
+        line_height = size * self.leading
+        # Базовая линия строки как в CSS: полуинтерлиньяж сверху и выносной элемент шрифта
+        baseline = top + (line_height - size) / 2 + size * 0.8
+        anchor, line_x = ('middle', x + box.width / 2) if align == 'center' else ('start', x)
+
+        spans = []
+        for index, line in enumerate(self.lines):
+            if not line:
+                continue
+            spacing = ''
+            spaces = line.count(' ')
+            if align == 'justify' and spaces and index < len(self.lines) - 1:
+                free = box.width - text_width(line, box.role, size, box.letter_spacing)
+                if free > 0:
+                    spacing = f' word-spacing="{num(free / spaces)}"'
+            spans.append(f'<tspan x="{num(line_x)}" y="{num(baseline + index * line_height)}"{spacing}>'
+                         f'{escape(line)}</tspan>')
+
+        letter_spacing = f' letter-spacing="{num(box.letter_spacing)}"' if box.letter_spacing else ''
+        clip_path = f' clip-path="url(#{clip})"' if clip else ''
+        return (f'<text class="{box.role}" font-size="{num(size)}" fill="{color}" text-anchor="{anchor}"'
+                f'{letter_spacing}{clip_path}>{"".join(spans)}</text>')
+
+def clip_rect(clip_id: str, x: float, y: float, width: float, height: float) -> str:
+    return (f'<clipPath id="{clip_id}"><rect x="{num(x)}" y="{num(y)}" '
+            f'width="{num(width)}" height="{num(max(height, 0))}"/></clipPath>')
+
+def place(ref_key: str, x: float, y: float, size: float, clip: Optional[str] = None) -> str:
+    """
+    Картинка единичного размера (image_def) в квадрате size. Масштаб - transform, а не width/height
+    у <use>: их понимают не все программы печати. Маска задаётся в координатах карточки
+    """
+    use = f'<use xlink:href="#{ref_key}" transform="translate({num(x)} {num(y)}) scale({num(size)})"/>'
+    return f'<g clip-path="url(#{clip})">{use}</g>' if clip else use
+
+
+class SvgLabelRenderer:
+    """
+    Листы плана документа (render_plan) в SVG. Разметка карточки строится один раз на документ,
+    в каждый лист попадают только его карточки и картинки
+    """
+
+    def __init__(self, plan: RenderPlan):
+        self.plan = plan
+        self.images: Dict[str, str] = {}
+        self.cards: Dict[str, Tuple[str, str]] = {}  # ключ карточки -> (id, разметка <g>)
+
+    # --- общие элементы ---
+
+    def backgrounds(self, kind: str) -> str:
+        """Фон карточки вида kind; у инструкции - и круглая маска логотипа (шапка одной высоты)"""
+        flat = self.plan.style_profile == 'print-fast'
+        if kind == 'label':
+            radius = 10 * PX
+            fill = FLAT_LABEL_BACKGROUND if flat else 'url(#label-gradient)'
+            defs = '' if flat else gradient('label-gradient', LABEL_WIDTH, LABEL_HEIGHT, *LABEL_GRADIENT)
+            return (
+                f'{defs}<g id="label-bg"><rect width="{num(LABEL_WIDTH)}" height="{num(LABEL_HEIGHT)}" '
+                f'rx="{num(radius)}" fill="{fill}"/>'
+                f'<rect x="{num(1.5 * PX)}" y="{num(1.5 * PX)}" width="{num(LABEL_WIDTH - 3 * PX)}" '
+                f'height="{num(LABEL_HEIGHT - 3 * PX)}" rx="{num(radius)}" fill="none" stroke="{PURPLE}" '
+                f'stroke-width="{num(3 * PX)}"/></g>'
+            )
+
+        fill = FLAT_INSTRUCTION_BACKGROUND if flat else 'url(#instruction-gradient)'
+        defs = '' if flat else gradient('instruction-gradient', INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT, *INSTRUCTION_GRADIENT)
+        pad, icon = 12 * PX, 45 * PX
+        return (
+            f'{defs}<g id="instruction-bg"><rect width="{num(INSTRUCTION_WIDTH)}" height="{num(INSTRUCTION_HEIGHT)}" '
+            f'rx="{num(10 * PX)}" fill="{fill}"/></g>'
+            f'<clipPath id="instruction-logo"><circle cx="{num(pad + icon / 2)}" cy="{num(pad + icon / 2)}" '
+            f'r="{num(icon / 2)}"/></clipPath>'
+        )
+
+    def image_def(self, key: str) -> Optional[str]:
+        """
+        Картинка плана единичного размера: QR вектором из qr_data или файл data URL.
+        None - файла нет: картинка не выводится (путь на сервере в лист не попадает)
+        """
+        if key not in self.images:
+            ref: ImageRef = self.plan.images[key]
+            if ref.qr_data:
+                # Вложенный <svg> размером 1x1: матрица вписывается в него через viewBox
+                self.images[key] = qr_svg(ref.qr_data).replace('<svg ', f'<svg id="{key}" width="1" height="1" ', 1)
+            else:
+                file_path = image_file_path(ref.path, ref.kind)
+                href = file_path and image_to_base64(file_path)
+                self.images[key] = href and (
+                    f'<image id="{key}" width="1" height="1" preserveAspectRatio="xMidYMid meet" '
+                    f'xlink:href={quoteattr(href)}/>'
+                )
+        return self.images[key]
+
+    def place(self, key: str, x: float, y: float, size: float, clip: Optional[str] = None) -> str:
+        """place() для картинки плана; пусто, если картинки нет"""
+        return place(key, x, y, size, clip) if self.image_def(key) else ''
+
+    # --- этикетка ---
+
+    def label_svg(self, card: LabelCard, card_id: str) -> str:
+        pad = 3.5 * MM + 3 * PX
+        width = LABEL_WIDTH - 2 * pad
+        center = LABEL_WIDTH / 2
+        parts = ['<use xlink:href="#label-bg"/>']
+
+        # Шапка: категория, название, слоган
+        top = pad + 7
+        parts.append(text_line(card.category.upper(), 'sans-semibold', 7, PURPLE, center, top, letter_spacing=3 * PX))
+        top += 1 * MM
+
+        name_size = size_option(LABEL_NAME, card.name_class)
+        name = TextBlock(f"{card.number}. {card.title}", LABEL_NAME, name_size.font_size, name_size.line_height, 25 * MM)
+        parts.append(name.svg(DARK_PURPLE, pad, top))
+        top += name.height
+
+        if card.tagline:
+            top += 0.5 * MM
+            tagline = TextBlock(card.tagline, TextBox('sans-italic', width, ()), 7, 1.1, 10 * MM)
+            parts.append(tagline.svg(ROSE, pad, top))
+            top += tagline.height + 1 * MM
+        top += 1.5 * MM
+
+        # Логотип в круге: маска своя у карточки, так как высота шапки разная
+        logo_size = 15 * MM
+        top += 2 * MM
+        parts.append(f'<clipPath id="{card_id}-logo"><circle cx="{num(center)}" cy="{num(top + logo_size / 2)}" '
+                     f'r="{num(logo_size / 2)}"/></clipPath>')
+        parts.append(self.place(card.logo, center - logo_size / 2, top, logo_size, clip=f"{card_id}-logo"))
+        top += logo_size + 2 * MM
+
+        # Подвал снизу вверх: QR, сайт, бренд, разделитель
+        bottom = LABEL_HEIGHT - pad
+        qr_size = 10 * MM
+        qr_x = center - (qr_size + 2 * MM + 8 * MM) / 2
+        parts.append(f'<rect x="{num(qr_x)}" y="{num(bottom - qr_size)}" width="{num(qr_size)}" height="{num(qr_size)}" '
+                     f'rx="{num(2 * PX)}" fill="#fff"/>')
+        parts.append(self.place(card.qr, qr_x + 0.5 * MM, bottom - qr_size + 0.5 * MM, qr_size - 1 * MM))
+        parts.append(text_line("Группа", 'sans-medium', 6, PURPLE, qr_x + qr_size + 2 * MM, bottom - qr_size / 2 - 1, 'start'))
+        parts.append(text_line("ВК", 'sans-medium', 6, PURPLE, qr_x + qr_size + 2 * MM, bottom - qr_size / 2 + 6, 'start'))
+        bottom -= qr_size + 1.5 * MM
+        parts.append(text_line(card.website or '', 'sans', 6.5, PURPLE, center, bottom))
+        bottom -= 6.5 + 1
+        parts.append(text_line(card.brand_name or '', 'serif-semibold', 10, BROWN, center, bottom))
+        bottom -= 10 + 1 * MM
+        parts.append(f'<line x1="{num(center - width * 0.3)}" y1="{num(bottom)}" x2="{num(center + width * 0.3)}" '
+                     f'y2="{num(bottom)}" stroke="{ROSE}" stroke-width="0.5"/>')
+        bottom -= 1 * MM
+
+        # Описание в оставшемся месте
+        desc_size = size_option(LABEL_DESCRIPTION, card.description_class)
+        box = TextBox(LABEL_DESCRIPTION.role, width - 3 * MM, ())
+        description = TextBlock(card.description or '', box, desc_size.font_size, desc_size.line_height,
+                                max(bottom - top, 0))
+        parts.append(clip_rect(f"{card_id}-text", pad + 1.5 * MM, top, box.width, bottom - top))
+        parts.append(description.svg(TEXT_PURPLE, pad + 1.5 * MM, top, clip=f"{card_id}-text"))
+        return ''.join(parts)
+
+    # --- инструкция ---
+
+    def instruction_svg(self, card: InstructionCard, card_id: str) -> str:
+        pad = 12 * PX
+        width = INSTRUCTION_WIDTH - 2 * pad
+        center = INSTRUCTION_WIDTH / 2
+        top = pad
+        parts = ['<use xlink:href="#instruction-bg"/>']
+
+        # Шапка: логотип, заголовок, QR
+        icon = 45 * PX
+        parts.append(self.place(card.logo, pad, top, icon, clip='instruction-logo'))
+        parts.append(f'<rect x="{num(INSTRUCTION_WIDTH - pad - icon)}" y="{num(top)}" width="{num(icon)}" '
+                     f'height="{num(icon)}" rx="{num(4 * PX)}" fill="#fff"/>')
+        parts.append(self.place(card.qr, INSTRUCTION_WIDTH - pad - icon + 2 * PX, top + 2 * PX, icon - 4 * PX))
+
+        title_size = size_option(INSTRUCTION_TITLE, card.title_class)
+        title_x = pad + icon + 8 * PX
+        title = TextBlock(card.title, INSTRUCTION_TITLE._replace(width=width - 2 * icon - 16 * PX),
+                          title_size.font_size, title_size.line_height, 30 * MM)
+        parts.append(title.svg(DARK_PURPLE, title_x, top))
+        header_height = title.height
+        if card.tagline:
+            tagline = TextBlock(card.tagline, TextBox('sans-italic', title.box.width, ()), 10, 1.2, 15 * MM)
+            parts.append(tagline.svg(ROSE, title_x, top + title.height + 3 * PX))
+            header_height += 3 * PX + tagline.height
+        top += max(icon, header_height) + 8 * PX
+        parts.append(f'<line x1="{num(pad)}" y1="{num(top)}" x2="{num(INSTRUCTION_WIDTH - pad)}" y2="{num(top)}" '
+                     f'stroke="{blend(GOLD, 0.3)}" stroke-width="{num(1 * PX)}"/>')
+        top += 8 * PX
+
+        # Подвал
+        bottom = INSTRUCTION_HEIGHT - pad
+        parts.append(text_line(card.website or '', 'sans', 8, PURPLE, center, bottom))
+        bottom -= 8 + 2 * PX
+        parts.append(text_line(card.brand_name or '', 'serif-semibold', 11, BROWN, center, bottom, letter_spacing=2 * PX))
+        bottom -= 11 + 6 * PX
+        parts.append(f'<line x1="{num(pad)}" y1="{num(bottom)}" x2="{num(INSTRUCTION_WIDTH - pad)}" y2="{num(bottom)}" '
+                     f'stroke="{blend(GOLD, 0.2)}" stroke-width="{num(1 * PX)}"/>')
+        bottom -= 8 * PX
+
+        # Разделы: размеры из подбора, при нехватке места все уменьшаются одинаково (как в PDF)
+        sections = []
+        for heading, text, box, css_class, spell in (
+            ("Описание", card.description, INSTRUCTION_SECTION, card.description_class, False),
+            ("Как работать", card.practice, INSTRUCTION_SECTION, card.practice_class, False),
+            ("Заговор", card.ritual, INSTRUCTION_SPELL, card.ritual_class, True),
+        ):
+            if text:
+                option = size_option(box, css_class)
+                sections.append((heading, text, option.font_size, option.line_height, spell))
+
+        available = bottom - top
+        text_box_width = width - 16 * PX
+        shrink = 0
+        while True:
+            blocks = []
+            for heading, text, size, leading, spell in sections:
+                box = TextBox('serif-italic' if spell else 'sans', text_box_width, (), pre_line=True)
+                blocks.append((heading, (10 if spell else 11) - shrink,
+                               TextBlock(text, box, max(size - shrink, MIN_FONT_SIZE), leading), spell))
+            total = sum(heading_size + 4 * PX + block.height + 12 * PX for _, heading_size, block, _ in blocks)
+            total += 8 * PX * max(len(blocks) - 1, 0)
+            if total <= available or max((size for _, _, size, _, _ in sections), default=0) - shrink <= MIN_FONT_SIZE:
+                break
+            shrink += 0.5
+
+        parts.append(clip_rect(f"{card_id}-text", pad + 8 * PX, top, text_box_width, bottom - top))
+        for heading, heading_size, block, spell in blocks:
+            block_height = heading_size + 4 * PX + block.height + 12 * PX
+            if spell:
+                parts.append(f'<rect x="{num(pad)}" y="{num(top)}" width="{num(width)}" height="{num(block_height)}" '
+                             f'rx="{num(6 * PX)}" fill="{blend(ROSE, 0.08)}"/>')
+                parts.append(f'<line x1="{num(pad)}" y1="{num(top)}" x2="{num(pad)}" y2="{num(top + block_height)}" '
+                             f'stroke="{ROSE}" stroke-width="{num(2 * PX)}"/>')
+            parts.append(text_line(heading.upper(), 'sans-semibold', heading_size, BROWN,
+                                   pad + 8 * PX, top + 6 * PX + heading_size, 'start'))
+            parts.append(block.svg(DARK_PURPLE if spell else TEXT_PURPLE, pad + 8 * PX,
+                                   top + 6 * PX + heading_size + 4 * PX,
+                                   'center' if spell else 'justify', clip=f"{card_id}-text"))
+            top += block_height + 8 * PX
+        return ''.join(parts)
+
+    # --- листы ---
+
+    def card_def(self, key: str) -> Tuple[str, str]:
+        """(id, <g> карточки) - разметка строится один раз на документ"""
+        if key not in self.cards:
+            card = self.plan.cards[key]
+            card_id = f"card-{len(self.cards)}"
+            body = self.label_svg(card, card_id) if isinstance(card, LabelCard) else self.instruction_svg(card, card_id)
+            self.cards[key] = (card_id, f'<g id="{card_id}">{body}</g>')
+        return self.cards[key]
+
+    def page_svg(self, page: PagePlan) -> str:
+        """
+        Лист плана по его макету; ячейки (None, n) - занятые ячейки начатого листа, они пропускаются.
+        Карточка другого размера масштабируется по центру ячейки, как в PDF
+        """
+        layout = LAYOUTS[page.layout]
+        design_width, design_height = (LABEL_WIDTH, LABEL_HEIGHT) if page.kind == 'label' else (INSTRUCTION_WIDTH, INSTRUCTION_HEIGHT)
+        card_width, card_height = layout.card_width * MM, layout.card_height * MM
+        scale = min(card_width / design_width, card_height / design_height)
+        offset_x = (card_width - design_width * scale) / 2
+        offset_y = (card_height - design_height * scale) / 2
+
+        defs, uses = [self.backgrounds(page.kind)], []
+        image_keys = []
+        index = 0
+        for key, count in page.slots:
+            if key is None:
+                index += count
+                continue
+            card = self.plan.cards[key]
+            card_id, card_svg = self.card_def(key)
+            defs.append(card_svg)
+            for image_key in (card.logo, card.qr):
+                if image_key not in image_keys:
+                    image_keys.append(image_key)
+            for _ in range(count):
+                left, top = layout.card_position(index)
+                x, y = left * MM + offset_x, top * MM + offset_y
+                if scale != 1:
+                    uses.append(f'<use xlink:href="#{card_id}" transform="translate({num(x)} {num(y)}) scale({scale:.4f})"/>')
+                else:
+                    uses.append(f'<use xlink:href="#{card_id}" x="{num(x)}" y="{num(y)}"/>')
+                index += 1
+
+        defs.extend(filter(None, (self.image_def(key) for key in image_keys)))
+        return ''.join([
+            SVG_OPEN.format(width=num(layout.page_width), height=num(layout.page_height),
+                            view_width=num(layout.page_width * MM), view_height=num(layout.page_height * MM)),
+            font_styles(),
+            f"<defs>{''.join(defs)}</defs>",
+            ''.join(uses),
+            '</svg>',
+        ])
+
+    def warnings_pages(self) -> List[str]:
+        """Страницы предупреждений о переполнении текста (A4, как в PDF)"""
+        margin = 20 * MM
+        width = PAGE_WIDTH - 2 * margin
+        svg_open = SVG_OPEN.format(width=210, height=297, view_width=num(PAGE_WIDTH), view_height=num(PAGE_HEIGHT))
+        pages = []
+
+        title = TextBlock("Предупреждения о переполнении текста", TextBox('serif-bold', width - 30, ()), 24, 1.1, 40 * MM)
+        top = margin
+        # Знака ⚠ нет в антикве - он отдельной строкой рубленым шрифтом
+        parts = [text_line("⚠", 'sans', 24, WARNING_RED, margin + 12, top + 24 * 0.85, 'middle'),
+                 title.svg(WARNING_RED, margin + 30, top)]
+        top += title.height + 5 * MM
+        parts.append(text_line(f"Найдено проблем в {len(self.plan.warnings)} свечах из {self.plan.candle_count}",
+                               'sans', 12, '#666666', PAGE_WIDTH / 2, top + 12))
+        top += 12 + 5 * MM
+        parts.append(f'<line x1="{num(margin)}" y1="{num(top)}" x2="{num(PAGE_WIDTH - margin)}" y2="{num(top)}" '
+                     f'stroke="#ff6b6b" stroke-width="{num(3 * PX)}"/>')
+        top += 10 * MM
+
+        box = TextBox('sans', width - 10 * MM, ())
+        for name, warnings in self.plan.warnings:
+            lines = [TextBlock(f"⚠ {warning}", box, 10, 1.3) for warning in warnings]
+            block = 14 + 5 * PX + sum(line.height for line in lines) + 20 * PX
+            if top + block > PAGE_HEIGHT - margin:
+                pages.append(svg_open + font_styles() + ''.join(parts) + '</svg>')
+                parts, top = [], margin
+            parts.append(f'<rect x="{num(margin)}" y="{num(top)}" width="{num(width)}" height="{num(block)}" '
+                         f'rx="{num(8 * PX)}" fill="#fff0f0"/>')
+            parts.append(f'<rect x="{num(margin)}" y="{num(top)}" width="{num(4 * PX)}" height="{num(block)}" fill="#ff6b6b"/>')
+            parts.append(text_line(name, 'serif-bold', 14, WARNING_RED, margin + 15 * PX, top + 10 * PX + 14, 'start'))
+            line_top = top + 10 * PX + 14 + 5 * PX
+            for line in lines:
+                parts.append(line.svg('#333333', margin + 15 * PX, line_top, 'left'))
+                line_top += line.height
+            top += block + 10 * PX
+        pages.append(svg_open + font_styles() + ''.join(parts) + '</svg>')
+        return pages
+
+def iter_labels_svg(candles: List[Candle], print_type: str = 'both',
+                    label_layout: SheetLayout = DEFAULT_LAYOUTS['label'],
+                    instruction_layout: SheetLayout = DEFAULT_LAYOUTS['instruction'],
+                    label_start_slot: int = 0, instruction_start_slot: int = 0,
+                    packing: str = 'sequential', style_profile: str = 'standard',
+                    on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    Generate the same sheets as the HTML and PDF versions as SVG files in a ZIP archive.
+
+    Every sheet is a self-contained SVG (sheet-001.svg, ...) with its cards, images and
+    gradients defined once in <defs> and copies placed with <use>; text lines are broken
+    by the same font metrics as the text fitting. The subset fonts are embedded in every
+    sheet, so a sheet extracted from the archive still renders with them (at the cost of
+    a larger archive). The archive is streamed file by file;
+    on_pages(count) is called as sheets are built (progress of background jobs).
+    """
+    plan = build_plan(candles, label_layout, print_type, instruction_layout,
+                      label_start_slot, instruction_start_slot, packing, style_profile)
+    yield from iter_plan_svg(plan, on_pages)
+
+def iter_plan_svg(plan: RenderPlan, on_pages: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """ZIP с листами SVG по плану (см. iter_labels_svg)"""
+    def files():
+        renderer = SvgLabelRenderer(plan)
+        if plan.warnings:
+            for number, page in enumerate(renderer.warnings_pages(), start=1):
+                yield f"warnings-{number}.svg", page.encode('utf-8')
+        for page in plan.pages:
+            yield f"sheet-{page.number:03d}.svg", renderer.page_svg(page).encode('utf-8')
+            if on_pages:
+                on_pages(1)
+
+    yield from iter_zip(files())
@@ -0,0 +1,276 @@
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Tuple
+from PIL import ImageFont
+from fonts import FONT_FILES, font_digest, font_file
+import hashlib
+
+# Все размеры в пунктах (pt). Блоки повторяют геометрию из LABELS_CSS:
+# 1px = 0.75pt, 1mm = 72 / 25.4 pt
+PX = 0.75
+MM = 72 / 25.4
+
+# Размер, на котором измеряются глифы; ширина на других размерах - пропорционально
+REFERENCE_SIZE = 100
+
+# Если файла шрифта нет, считаем среднюю ширину символа в долях кегля
+FALLBACK_GLYPH_WIDTH = 0.55
+
+class SizeOption(NamedTuple):
+    css_class: str      # класс из LABELS_CSS
+    font_size: float    # pt
+    line_height: float  # множитель line-height
+    max_lines: int      # сколько строк помещается (line-clamp или высота блока); 0 - не ограничено
+
+class TextBox(NamedTuple):
+    """Блок текста на карточке: начертание, ширина и варианты размеров от крупного к мелкому"""
+    role: str
+    width: float
+    options: Tuple[SizeOption, ...]
+    uppercase: bool = False
+    letter_spacing: float = 0
+    pre_line: bool = False  # переносы строк сохраняются (white-space: pre-line)
+
+class Fit(NamedTuple):
+    css_class: str
+    font_size: float
+    line_height: float
+    lines: int
+    fits: bool  # False - текст не помещается даже на самом мелком размере
+
+# Этикетка 70мм: padding 3.5мм и рамка 3px с каждой стороны
+LABEL_CONTENT_WIDTH = 70 * MM - 2 * 3.5 * MM - 2 * 3 * PX
+
+LABEL_NAME = TextBox(
+    role='serif-bold',
+    width=LABEL_CONTENT_WIDTH,
+    options=(
+        SizeOption('label-name', 15, 1.1, 2),
+        SizeOption('label-name long-title', 11, 1.1, 2),
+        SizeOption('label-name very-long-title', 9, 1.0, 3),
+    ),
+    uppercase=True,
+    letter_spacing=1 * PX,
+)
+
+# Описание: padding 0 1.5мм, высота ограничена -webkit-line-clamp каждого класса
+LABEL_DESCRIPTION = TextBox(
+    role='sans-medium',
+    width=LABEL_CONTENT_WIDTH - 2 * 1.5 * MM,
+    options=(
+        SizeOption('text-short', 8.5, 1.3, 6),
+        SizeOption('text-medium', 7.5, 1.25, 7),
+        SizeOption('text-long', 6.5, 1.2, 9),
+        SizeOption('text-very-long', 6, 1.15, 10),
+        SizeOption('text-overflow', 5.5, 1.1, 11),
+    ),
+)
+
+# Инструкция: 4 карточки на A4 (поля 10мм, промежуток 5мм), padding карточки 12px
+INSTRUCTION_CARD_WIDTH = (210 - 2 * 10 - 5) / 2 * MM
+INSTRUCTION_CARD_HEIGHT = (297 - 2 * 10 - 5) / 2 * MM
+INSTRUCTION_CONTENT_WIDTH = INSTRUCTION_CARD_WIDTH - 2 * 12 * PX
+
+# Заголовок между логотипом и QR (по 45px) с отступами 8px
+INSTRUCTION_TITLE = TextBox(
+    role='serif-bold',
+    width=INSTRUCTION_CONTENT_WIDTH - 2 * 45 * PX - 2 * 8 * PX,
+    options=(
+        SizeOption('', 18, 1.2, 2),
+        SizeOption('long-title', 14, 1.2, 2),
+        SizeOption('very-long-title', 11, 1.1, 3),
+    ),
+    uppercase=True,
+)
+
+# Разделы: высоту делят между собой, поэтому max_lines не задан (см. fit_instruction)
+INSTRUCTION_SECTION = TextBox(
+    role='sans',
+    width=INSTRUCTION_CONTENT_WIDTH - 2 * 8 * PX,
+    options=(
+        SizeOption('', 9, 1.3, 0),
+        SizeOption('text-long', 8, 1.2, 0),
+        SizeOption('text-very-long', 7, 1.15, 0),
+        SizeOption('text-overflow', 6.5, 1.1, 0),
+    ),
+)
+
+INSTRUCTION_SPELL = TextBox(
+    role='serif-italic',
+    width=INSTRUCTION_CONTENT_WIDTH - 2 * 8 * PX - 2 * PX,
+    options=(
+        SizeOption('', 8.5, 1.3, 0),
+        SizeOption('text-long', 7.5, 1.2, 0),
+        SizeOption('text-very-long', 6.5, 1.15, 0),
+        SizeOption('text-overflow', 6, 1.1, 0),
+    ),
+    pre_line=True,
+)
+
+# Высота под разделы: карточка без padding, шапки (45px + 8px + 8px + рамка) и подвала
+INSTRUCTION_CONTENT_HEIGHT = INSTRUCTION_CARD_HEIGHT - 2 * 12 * PX - (45 + 17) * PX - 30
+INSTRUCTION_GAP = 8 * PX
+# Поля раздела и его заголовок (h3 11pt, у заговора 10pt и margin-top 4px)
+SECTION_CHROME = 2 * 6 * PX + 11 * 1.2 + 4 * PX
+SPELL_CHROME = 2 * 8 * PX + 4 * PX + 10 * 1.2 + 4 * PX
+
+class GlyphTable(dict):
+    """Ширины символов начертания на REFERENCE_SIZE; заполняется по мере надобности"""
+
+    def __init__(self, role: str):
+        super().__init__()
+        path = font_file(role)
+        self.font = ImageFont.truetype(path, REFERENCE_SIZE) if path else None
+
+    def __missing__(self, char: str) -> float:
+        width = self.font.getlength(char) if self.font else FALLBACK_GLYPH_WIDTH * REFERENCE_SIZE
+        self[char] = width
+        return width
+
+# Версия подбора: меняется вместе с геометрией блоков, алгоритмом и содержимым файлов шрифтов.
+# Сохранённые у свечей результаты другой версии пересчитываются
+FIT_ALGORITHM = 1
+FIT_VERSION = hashlib.sha256(repr((
+    FIT_ALGORITHM,
+    LABEL_NAME, LABEL_DESCRIPTION, INSTRUCTION_TITLE, INSTRUCTION_SECTION, INSTRUCTION_SPELL,
+    INSTRUCTION_CONTENT_HEIGHT, INSTRUCTION_GAP, SECTION_CHROME, SPELL_CHROME,
+    [font_digest(role) for role in sorted(FONT_FILES)],
+)).encode('utf-8')).hexdigest()[:12]
+
+_glyph_tables: Dict[str, GlyphTable] = {}
+
+def glyph_table(role: str) -> GlyphTable:
+    table = _glyph_tables.get(role)
+    if table is None:
+        table = _glyph_tables[role] = GlyphTable(role)
+    return table
+
+def text_width(text: str, role: str, size: float, letter_spacing: float = 0) -> float:
+    """Ширина строки в pt (сумма ширин глифов, без кернинга)"""
+    return sum(map(glyph_table(role).__getitem__, text)) * size / REFERENCE_SIZE + letter_spacing * len(text)
+
+@lru_cache(maxsize=16384)
+def word_widths(text: str, role: str, uppercase: bool, pre_line: bool) -> Tuple[Tuple[Tuple[float, int], ...], ...]:
+    """
+    Слова текста по абзацам: (ширина на REFERENCE_SIZE, число символов).
+    Считаются один раз на текст и начертание, для любого кегля ширины масштабируются
+    """
+    if uppercase:
+        text = text.upper()
+    table = glyph_table(role)
+    paragraphs = text.split('\n') if pre_line else [text]
+    return tuple(
+        tuple((sum(map(table.__getitem__, word)), len(word)) for word in paragraph.split())
+        for paragraph in paragraphs
+    )
+
+@lru_cache(maxsize=65536)
+def count_lines(text: str, box: TextBox, size: float) -> int:
+    """Сколько строк займёт текст в блоке при переносе по словам, как в браузере"""
+    scale = size / REFERENCE_SIZE
+    space = text_width(' ', box.role, size, box.letter_spacing)
+
+    lines = 0
+    for words in word_widths(text, box.role, box.uppercase, box.pre_line):
+        if not words:
+            lines += 1 if box.pre_line else 0
+            continue
+        lines += 1
+        line = 0.0
+        for reference_width, chars in words:
+            width = reference_width * scale + box.letter_spacing * chars
+            if line and line + space + width > box.width:
+                lines += 1
+                line = 0.0
+            if line:
+                line += space
+            line += width
+            # Слово шире блока браузер не переносит - оно вылезает; считаем лишние строки
+            while line > box.width:
+                lines += 1
+                line -= box.width
+    return lines
+
+def wrap_text(text: str, box: TextBox, size: float) -> List[str]:
+    """
+    Строки текста при переносе по словам - те же, что считает count_lines
+    (для вывода без браузера: SVG). Слово шире блока остаётся на своей строке
+    """
+    if box.uppercase:
+        text = text.upper()
+    space = text_width(' ', box.role, size, box.letter_spacing)
+
+    lines = []
+    for paragraph in text.split('\n') if box.pre_line else [text]:
+        words = paragraph.split()
+        if not words:
+            if box.pre_line:
+                lines.append('')
+            continue
+        line, line_width = [], 0.0
+        for word in words:
+            width = text_width(word, box.role, size, box.letter_spacing)
+            if line and line_width + space + width > box.width:
+                lines.append(' '.join(line))
+                line, line_width = [], 0.0
+            if line:
+                line_width += space
+            line.append(word)
+            line_width += width
+        lines.append(' '.join(line))
+    return lines
+
+@lru_cache(maxsize=65536)
+def fit_text(text: str, box: TextBox) -> Fit:
+    """Самый крупный вариант размера, при котором текст помещается в блок"""
+    for option in box.options:
+        lines = count_lines(text or '', box, option.font_size)
+        if not option.max_lines or lines <= option.max_lines:
+            return Fit(option.css_class, option.font_size, option.line_height, lines, True)
+    return Fit(option.css_class, option.font_size, option.line_height, lines, False)
+
+def size_option(box: TextBox, css_class: str) -> SizeOption:
+    """Вариант размера блока по CSS-классу из подбора (для вывода не в HTML)"""
+    for option in box.options:
+        if option.css_class == css_class:
+            return option
+    return box.options[0]
+
+def block_height(lines: int, option: SizeOption) -> float:
+    return lines * option.font_size * option.line_height
+
+class InstructionFit(NamedTuple):
+    description: Fit
+    practice: Fit
+    ritual: Fit
+    fits: bool
+
+@lru_cache(maxsize=16384)
+def fit_instruction(description: str, practice: str, ritual: str) -> InstructionFit:
+    """
+    Размеры разделов инструкции. Разделы делят одну высоту, поэтому уменьшаются
+    вместе: выбирается самая крупная ступень, на которой все разделы помещаются
+    """
+    sections = [
+        (description, INSTRUCTION_SECTION),
+        (practice, INSTRUCTION_SECTION),
+        (ritual, INSTRUCTION_SPELL),
+    ]
+    present = [(text, box) for text, box in sections if text]
+    steps = len(INSTRUCTION_SECTION.options)
+
+    for step in range(steps):
+        height = INSTRUCTION_GAP * max(len(present) - 1, 0)
+        for text, box in present:
+            option = box.options[step]
+            chrome = SPELL_CHROME if box is INSTRUCTION_SPELL else SECTION_CHROME
+            height += chrome + block_height(count_lines(text, box, option.font_size), option)
+        if height <= INSTRUCTION_CONTENT_HEIGHT:
+            break
+    fits = height <= INSTRUCTION_CONTENT_HEIGHT
+
+    fitted = []
+    for text, box in sections:
+        option = box.options[step]
+        lines = count_lines(text, box, option.font_size) if text else 0
+        fitted.append(Fit(option.css_class, option.font_size, option.line_height, lines, fits))
+    return InstructionFit(*fitted, fits)
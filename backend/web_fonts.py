@@ -0,0 +1,103 @@
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+from fontTools import subset
+from fontTools.ttLib import TTFont
+from fonts import font_file, is_fallback_font
+import label_templates as tpl
+import base64
+import hashlib
+import io
+
+# Шрифты для HTML-документов раздаются самим бэкендом (без fonts.googleapis.com):
+# печать не ждёт внешний сервер и не подменяет шрифт без сети.
+# Файлы те же, что для подбора текста и PDF (fonts.font_file), урезанные до нужных символов.
+# Запасной DejaVu под именем семейства дизайна не раздаётся: браузер подставит свой шрифт
+
+# Латиница и пунктуация ASCII, «», °, №, тире, кавычки, многоточие и вся кириллица
+SUBSET_UNICODES = (
+    list(range(0x20, 0x7F))
+    + list(range(0xA0, 0x100))
+    + list(range(0x400, 0x460))
+    + list(range(0x2010, 0x2027))
+    + [0x2030, 0x2039, 0x203A, 0x20BD, 0x2116]
+)
+
+# Начертания из LABELS_CSS: (роль в fonts.FONT_FILES, семейство, font-weight, font-style)
+FONT_FACES = [
+    ('serif-semibold', 'Cormorant Garamond', 600, 'normal'),
+    ('serif-bold', 'Cormorant Garamond', 700, 'normal'),
+    ('serif-italic', 'Cormorant Garamond', 500, 'italic'),
+    ('sans', 'Montserrat', 400, 'normal'),
+    ('sans-medium', 'Montserrat', 500, 'normal'),
+    ('sans-semibold', 'Montserrat', 600, 'normal'),
+    ('sans-italic', 'Montserrat', 500, 'italic'),
+]
+
+class WebFont(NamedTuple):
+    filename: str  # <роль>.<хэш содержимого>.woff
+    data: bytes
+
+@lru_cache(maxsize=None)
+def web_font(role: str) -> Optional[WebFont]:
+    """
+    Подмножество шрифта начертания role в WOFF (считается один раз на процесс);
+    None - шрифта дизайна нет (только запасной)
+    """
+    if is_fallback_font(role):
+        return None
+    path = font_file(role)
+
+    options = subset.Options()
+    options.flavor = 'woff'
+    options.layout_features = ['*']
+    options.hinting = False
+    # Служебная таблица FontForge в документе не нужна
+    options.drop_tables += ['FFTM']
+    # Без пересчёта времени изменения: одинаковый файл шрифта - одинаковые байты и URL
+    font = TTFont(path, recalcTimestamp=False)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(unicodes=SUBSET_UNICODES)
+    subsetter.subset(font)
+    buffer = io.BytesIO()
+    subset.save_font(font, buffer, options)
+
+    data = buffer.getvalue()
+    return WebFont(f"{role}.{hashlib.sha256(data).hexdigest()[:12]}.woff", data)
+
+def find_web_font(filename: str) -> Optional[WebFont]:
+    """Файл шрифта по имени из URL"""
+    for role, _, _, _ in FONT_FACES:
+        font = web_font(role)
+        if font and font.filename == filename:
+            return font
+    return None
+
+def font_faces_css(embed: bool = False) -> str:
+    """
+    Правила @font-face для документа. embed=True - шрифты встроены data URL (автономный файл),
+    иначе ссылки fonts/<файл> относительно файла стилей шрифтов
+    """
+    rules = []
+    for role, family, weight, style in FONT_FACES:
+        font = web_font(role)
+        if font is None:
+            continue
+        if embed:
+            url = f"data:font/woff;base64,{base64.b64encode(font.data).decode('ascii')}"
+        else:
+            url = f"fonts/{font.filename}"
+        rules.append(tpl.FONT_FACE.render(role=role, family=family, style=style, weight=weight, url=url))
+    return ''.join(rules)
+
+@lru_cache(maxsize=None)
+def fonts_stylesheet() -> Tuple[str, str]:
+    """Файл стилей шрифтов: (имя fonts.<хэш>.css, содержимое). Имя меняется вместе со шрифтами"""
+    css = font_faces_css()
+    return f"fonts.{hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]}.css", css
+
+@lru_cache(maxsize=None)
+def embedded_fonts_css(minify: bool = False) -> str:
+    """Встроенные шрифты - один раз на документ, строка собирается один раз на процесс"""
+    if minify:
+        return tpl.minify_css(embedded_fonts_css())
+    return font_faces_css(embed=True)
@@ -0,0 +1,2 @@
+-- Данные для генерации QR кода на сервере (ссылка на сайт или группу ВК)
+ALTER TABLE candles ADD COLUMN IF NOT EXISTS qr_data VARCHAR(500);
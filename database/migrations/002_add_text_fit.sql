@@ -0,0 +1,24 @@
+-- Подбор размеров текста, сохраняемый при записи свечи, и флаг переполнения
+-- для отчёта /api/candles/overflow-report. Значения заполняются backend при старте
+ALTER TABLE candles ADD COLUMN IF NOT EXISTS text_fit JSON;
+ALTER TABLE candles ADD COLUMN IF NOT EXISTS text_fit_version VARCHAR(20);
+ALTER TABLE candles ADD COLUMN IF NOT EXISTS has_overflow BOOLEAN DEFAULT false;
+CREATE INDEX IF NOT EXISTS idx_candles_text_fit_version ON candles(text_fit_version);
+CREATE INDEX IF NOT EXISTS idx_candles_has_overflow ON candles(has_overflow) WHERE has_overflow;
+
+-- Триггер для обновления updated_at и last_modified_at.
+-- Пересчёт подбора текста (text_fit, text_fit_version, has_overflow) свечу не меняет - даты остаются прежними
+CREATE OR REPLACE FUNCTION update_timestamps()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF to_jsonb(NEW) - ARRAY['text_fit', 'text_fit_version', 'has_overflow', 'updated_at', 'last_modified_at']
+       = to_jsonb(OLD) - ARRAY['text_fit', 'text_fit_version', 'has_overflow', 'updated_at', 'last_modified_at'] THEN
+        NEW.updated_at = OLD.updated_at;
+        NEW.last_modified_at = OLD.last_modified_at;
+        RETURN NEW;
+    END IF;
+    NEW.updated_at = CURRENT_TIMESTAMP;
+    NEW.last_modified_at = CURRENT_TIMESTAMP;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
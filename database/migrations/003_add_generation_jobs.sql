@@ -0,0 +1,17 @@
+-- Фоновые задачи генерации документов (/api/jobs/generate-labels).
+-- Невыполненные задачи продолжаются после перезапуска backend
+CREATE TABLE IF NOT EXISTS generation_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    request JSON NOT NULL,
+    stylesheet_url VARCHAR(500),
+    output_format VARCHAR(10) NOT NULL,
+    pages_done INTEGER DEFAULT 0,
+    pages_total INTEGER,
+    result_size INTEGER,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_generation_jobs_status ON generation_jobs(status);
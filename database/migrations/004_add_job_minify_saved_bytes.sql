@@ -0,0 +1,2 @@
+-- Экономия минифицированного HTML (minify) для выполненной задачи генерации, байт
+ALTER TABLE generation_jobs ADD COLUMN IF NOT EXISTS minify_saved_bytes INTEGER;
@@ -21,8 +21,12 @@ CREATE TABLE candles (
     brand_name VARCHAR(100) DEFAULT 'АРТ-СВЕЧИ',
     website VARCHAR(200) DEFAULT 'art-svechi.ligardi.ru',
     qr_image VARCHAR(500),
+    qr_data VARCHAR(500),
     logo_image VARCHAR(500),
     is_active BOOLEAN DEFAULT true,
+    text_fit JSON,
+    text_fit_version VARCHAR(20),
+    has_overflow BOOLEAN DEFAULT false,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_modified_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -46,16 +50,43 @@ CREATE TABLE label_set_candles (
     UNIQUE(label_set_id, candle_id)
 );
 
+-- Фоновые задачи генерации документов
+CREATE TABLE generation_jobs (
+    id VARCHAR(32) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued',
+    request JSON NOT NULL,
+    stylesheet_url VARCHAR(500),
+    output_format VARCHAR(10) NOT NULL,
+    pages_done INTEGER DEFAULT 0,
+    pages_total INTEGER,
+    result_size INTEGER,
+    minify_saved_bytes INTEGER,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
 -- Индексы для производительности
 CREATE INDEX idx_candles_category ON candles(category_id);
 CREATE INDEX idx_candles_active ON candles(is_active);
+CREATE INDEX idx_candles_text_fit_version ON candles(text_fit_version);
+CREATE INDEX idx_candles_has_overflow ON candles(has_overflow) WHERE has_overflow;
 CREATE INDEX idx_label_set_candles_set ON label_set_candles(label_set_id);
 CREATE INDEX idx_label_set_candles_candle ON label_set_candles(candle_id);
+CREATE INDEX idx_generation_jobs_status ON generation_jobs(status);
 
--- Триггер для обновления updated_at и last_modified_at
+-- Триггер для обновления updated_at и last_modified_at.
+-- Пересчёт подбора текста (text_fit, text_fit_version, has_overflow) свечу не меняет - даты остаются прежними
 CREATE OR REPLACE FUNCTION update_timestamps()
 RETURNS TRIGGER AS $$
 BEGIN
+    IF to_jsonb(NEW) - ARRAY['text_fit', 'text_fit_version', 'has_overflow', 'updated_at', 'last_modified_at']
+       = to_jsonb(OLD) - ARRAY['text_fit', 'text_fit_version', 'has_overflow', 'updated_at', 'last_modified_at'] THEN
+        NEW.updated_at = OLD.updated_at;
+        NEW.last_modified_at = OLD.last_modified_at;
+        RETURN NEW;
+    END IF;
     NEW.updated_at = CURRENT_TIMESTAMP;
     NEW.last_modified_at = CURRENT_TIMESTAMP;
     RETURN NEW;
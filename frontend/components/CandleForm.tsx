@@ -64,6 +64,7 @@ interface CandleFormData {
   brand_name: string;
   website: string;
   qr_image: string;
+  qr_data: string;
   logo_image: string;
   quantity: number;
   is_active: boolean;
@@ -83,6 +84,7 @@ export default function CandleForm({ candle, categories, onClose }: CandleFormPr
     brand_name: 'АРТ-СВЕЧИ',
     website: 'art-svechi.ligardi.ru',
     qr_image: '',
+    qr_data: '',
     logo_image: '',
     quantity: 1,
     is_active: true,
@@ -104,6 +106,7 @@ export default function CandleForm({ candle, categories, onClose }: CandleFormPr
         brand_name: candle.brand_name,
         website: candle.website,
         qr_image: candle.qr_image || '',
+        qr_data: candle.qr_data || '',
         logo_image: candle.logo_image || '',
         quantity: candle.quantity || 1,
         is_active: candle.is_active,
@@ -416,6 +419,17 @@ export default function CandleForm({ candle, categories, onClose }: CandleFormPr
             </div>
           </div>
 
+          <div>
+            <label className="block text-sm font-medium mb-1 text-gray-300">Данные QR кода</label>
+            <input
+              type="text"
+              value={formData.qr_data}
+              onChange={(e) => setFormData(prev => ({ ...prev, qr_data: e.target.value }))}
+              className="w-full bg-gray-700 border border-gray-600 text-gray-100 rounded-lg px-3 py-2 text-sm focus:border-purple-500 focus:ring-1 focus:ring-purple-500"
+              placeholder="Ссылка для QR кода (если заполнено, картинка QR не нужна)"
+            />
+          </div>
+
           <div className="flex items-center gap-2">
             <input
               type="checkbox"
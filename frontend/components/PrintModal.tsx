@@ -1,7 +1,7 @@
 'use client';
 
 import { useState } from 'react';
-import { X, Printer, Download } from 'lucide-react';
+import { X, Printer, Download, Eye } from 'lucide-react';
 import { labelApi } from '@/lib/api';
 
 interface PrintModalProps {
@@ -12,11 +12,14 @@ interface PrintModalProps {
 export default function PrintModal({ selectedCandles, onClose }: PrintModalProps) {
   const [isGenerating, setIsGenerating] = useState(false);
   const [printType, setPrintType] = useState<'labels' | 'instructions' | 'both'>('both');
+  const [fastPrint, setFastPrint] = useState(false);
+  const styleProfile = fastPrint ? 'print-fast' : 'standard';
 
   const handleGenerate = async () => {
     setIsGenerating(true);
     try {
-      const response = await labelApi.generate(selectedCandles, 'html', printType);
+      // Документ открывается только для печати - отдаём минифицированный HTML
+      const response = await labelApi.generate(selectedCandles, 'html', printType, { minify: true, style_profile: styleProfile });
 
       // Create a blob from HTML response
       const blob = new Blob([response], { type: 'text/html' });
@@ -39,10 +42,28 @@ export default function PrintModal({ selectedCandles, onClose }: PrintModalProps
     }
   };
 
+  const handlePreview = async () => {
+    setIsGenerating(true);
+    try {
+      // Лёгкий предпросмотр: листы подгружаются при прокрутке, большие тиражи не вешают вкладку
+      const response = await labelApi.generate(selectedCandles, 'html', printType, { preview: true, minify: true, style_profile: styleProfile });
+
+      const blob = new Blob([response], { type: 'text/html' });
+      const url = window.URL.createObjectURL(blob);
+      window.open(url, '_blank');
+    } catch (error) {
+      console.error('Preview failed:', error);
+      alert('Ошибка при открытии предпросмотра');
+    } finally {
+      setIsGenerating(false);
+    }
+  };
+
   const handleDownload = async () => {
     setIsGenerating(true);
     try {
-      const response = await labelApi.generate(selectedCandles, 'html', printType);
+      // Скачанный файл должен открываться без сети - стили встраиваем в документ
+      const response = await labelApi.generate(selectedCandles, 'html', printType, { inline_css: true, style_profile: styleProfile });
 
       // Create a blob and download
       const blob = new Blob([response], { type: 'text/html' });
@@ -132,6 +153,19 @@ export default function PrintModal({ selectedCandles, onClose }: PrintModalProps
             </div>
           </div>
 
+          <label className="mb-6 flex items-center gap-3 p-3 bg-gray-700 rounded-lg cursor-pointer hover:bg-gray-650">
+            <input
+              type="checkbox"
+              checked={fastPrint}
+              onChange={(e) => setFastPrint(e.target.checked)}
+              className="w-4 h-4 text-purple-600"
+            />
+            <div>
+              <span className="text-gray-100 font-medium">Быстрая печать</span>
+              <p className="text-xs text-gray-400">Та же раскладка без градиентов и теней - большие тиражи печатаются быстрее</p>
+            </div>
+          </label>
+
           <div className="space-y-3">
             <button
               onClick={handleGenerate}
@@ -142,6 +176,15 @@ export default function PrintModal({ selectedCandles, onClose }: PrintModalProps
               {isGenerating ? 'Генерация...' : 'Открыть для печати'}
             </button>
 
+            <button
+              onClick={handlePreview}
+              disabled={isGenerating}
+              className="w-full flex items-center justify-center gap-2 px-4 py-3 bg-gray-700 text-gray-100 rounded-lg hover:bg-gray-600 disabled:opacity-50"
+            >
+              <Eye size={20} />
+              {isGenerating ? 'Генерация...' : 'Предпросмотр'}
+            </button>
+
             <button
               onClick={handleDownload}
               disabled={isGenerating}
@@ -42,6 +42,7 @@ export interface Candle {
   brand_name: string;
   website: string;
   qr_image?: string;
+  qr_data?: string;
   logo_image?: string;
   quantity: number;
   is_active: boolean;
@@ -123,16 +124,114 @@ export const categoryApi = {
   },
 };
 
+export interface GenerateOptions {
+  inline_css?: boolean;
+  label_layout?: string;
+  instruction_layout?: string;
+  label_start_slot?: number;
+  instruction_start_slot?: number;
+  packing?: 'sequential' | 'compact';
+  style_profile?: 'standard' | 'print-fast';
+  preview?: boolean;
+  minify?: boolean;
+  dpi?: number;
+}
+
+export interface GenerationJob {
+  id: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  output_format: string;
+  pages_done: number;
+  pages_total?: number;
+  result_size?: number;
+  minify_saved_bytes?: number;
+  error?: string;
+  created_at: string;
+  started_at?: string;
+  finished_at?: string;
+}
+
+export interface RenderPlanPage {
+  kind: 'label' | 'instruction';
+  number: number;
+  layout: string;
+  slots: [string | null, number][];
+}
+
+export interface RenderPlan {
+  print_type: string;
+  layouts: Record<string, string>;
+  candle_count: number;
+  warnings: { name: string; warnings: string[] }[];
+  images: Record<string, { kind: 'logo' | 'qr'; path: string | null; qr_data: string | null }>;
+  cards: Record<string, Record<string, string | null>>;
+  pages: RenderPlanPage[];
+}
+
+export interface GenerationEstimate {
+  output_format: string;
+  candle_count: number;
+  card_count: number;
+  label_sheets?: number;
+  label_free_slots?: number;
+  instruction_sheets?: number;
+  instruction_free_slots?: number;
+  warnings: { id: number; sequence_number?: number; name: string; warnings: string[] }[];
+  estimated_bytes: number;
+  estimated_seconds: number;
+  timing_basis: 'jobs' | 'default';
+}
+
 export const labelApi = {
-  generate: async (candleIds: number[], format: string = 'html', printType: string = 'both') => {
+  generate: async (candleIds: number[], format: string = 'html', printType: string = 'both', options: GenerateOptions = {}) => {
     const response = await api.post('/generate-labels', {
       candle_ids: candleIds,
       format,
-      labels_per_page: 6,
       print_type: printType,
+      ...options,
     });
     return response.data;
   },
+
+  getPlan: async (candleIds: number[], printType: string = 'both', options: GenerateOptions = {}) => {
+    const response = await api.post('/render-plan', {
+      candle_ids: candleIds,
+      print_type: printType,
+      ...options,
+    });
+    return response.data as RenderPlan;
+  },
+
+  estimate: async (candleIds: number[], format: string = 'html', printType: string = 'both', options: GenerateOptions = {}) => {
+    const response = await api.post('/generate-labels/estimate', {
+      candle_ids: candleIds,
+      format,
+      print_type: printType,
+      ...options,
+    });
+    return response.data as GenerationEstimate;
+  },
+
+  // Фоновая генерация: задача, прогресс (листов готово / всего) и готовый документ
+  createJob: async (candleIds: number[], format: string = 'html', printType: string = 'both', options: GenerateOptions = {}) => {
+    const response = await api.post('/jobs/generate-labels', {
+      candle_ids: candleIds,
+      format,
+      print_type: printType,
+      ...options,
+    });
+    return response.data as GenerationJob;
+  },
+
+  getJob: async (jobId: string) => {
+    const response = await api.get(`/jobs/${jobId}`);
+    return response.data as GenerationJob;
+  },
+
+  getJobResult: async (jobId: string) => {
+    const response = await api.get(`/jobs/${jobId}/result`, { responseType: 'blob' });
+    return response.data as Blob;
+  },
 };
 
 export const uploadApi = {